@@ -0,0 +1,24 @@
+"""Add image renditions to posts
+
+Revision ID: 0a6c4e1f8b27
+Revises: f7d2a90b3c15
+Create Date: 2026-10-17 21:12:05.664318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a6c4e1f8b27'
+down_revision = 'f7d2a90b3c15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('media_renditions', sa.JSON(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('posts', 'media_renditions')
@@ -0,0 +1,42 @@
+"""Add media_objects content hash index
+
+Revision ID: 2c9e5b7d4a61
+Revises: 0a6c4e1f8b27
+Create Date: 2026-10-17 21:48:29.903714
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c9e5b7d4a61'
+down_revision = '0a6c4e1f8b27'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'media_objects',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('sha256', sa.String(length=64), nullable=False),
+        sa.Column('output_sha256', sa.String(length=64), nullable=False),
+        sa.Column('media_type', sa.String(length=50), nullable=False),
+        sa.Column('size', sa.BigInteger(), nullable=False),
+        sa.Column('media_url', sa.String(), nullable=False),
+        sa.Column('thumbnail_url', sa.String(), nullable=True),
+        sa.Column('playlist_url', sa.String(), nullable=True),
+        sa.Column('media_renditions', sa.JSON(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('sha256'),
+    )
+    op.create_index('ix_media_objects_output_sha256', 'media_objects', ['output_sha256'])
+    op.add_column('posts', sa.Column('media_sha256', sa.String(length=64), nullable=True))
+
+
+def downgrade():
+    op.drop_column('posts', 'media_sha256')
+    op.drop_index('ix_media_objects_output_sha256', table_name='media_objects')
+    op.drop_table('media_objects')
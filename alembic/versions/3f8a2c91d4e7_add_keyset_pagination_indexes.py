@@ -0,0 +1,41 @@
+"""Add keyset pagination indexes
+
+Revision ID: 3f8a2c91d4e7
+Revises: 460e394d03ea
+Create Date: 2026-10-17 09:12:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mssql
+
+# revision identifiers, used by Alembic.
+revision = '3f8a2c91d4e7'
+down_revision = '460e394d03ea'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # activities.username was VARCHAR(max), which SQL Server cannot index
+    op.alter_column('activities', 'username',
+               existing_type=mssql.VARCHAR(),
+               type_=sa.String(length=255),
+               existing_nullable=False)
+    op.create_index('ix_posts_created_at_id', 'posts', ['created_at', 'id'], unique=False)
+    op.create_index('ix_posts_author_id_created_at', 'posts', ['author_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_comments_post_id_created_at', 'comments', ['post_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_user_saved_posts_user_id_created_at', 'user_saved_posts', ['user_id', 'created_at', 'id'], unique=False)
+    op.create_index('ix_activities_username_timestamp', 'activities', ['username', 'timestamp', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_activities_username_timestamp', table_name='activities')
+    op.drop_index('ix_user_saved_posts_user_id_created_at', table_name='user_saved_posts')
+    op.drop_index('ix_comments_post_id_created_at', table_name='comments')
+    op.drop_index('ix_posts_author_id_created_at', table_name='posts')
+    op.drop_index('ix_posts_created_at_id', table_name='posts')
+    op.alter_column('activities', 'username',
+               existing_type=sa.String(length=255),
+               type_=mssql.VARCHAR(),
+               existing_nullable=False)
@@ -0,0 +1,26 @@
+"""Add processing claim to posts
+
+Revision ID: 5d1f8a3c9e70
+Revises: 2c9e5b7d4a61
+Create Date: 2026-10-18 10:12:44.518203
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d1f8a3c9e70'
+down_revision = '2c9e5b7d4a61'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('processing_claimed_by', sa.String(length=100), nullable=True))
+    op.add_column('posts', sa.Column('processing_claimed_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('posts', 'processing_claimed_at')
+    op.drop_column('posts', 'processing_claimed_by')
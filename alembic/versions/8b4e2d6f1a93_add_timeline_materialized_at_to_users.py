@@ -0,0 +1,26 @@
+"""Add timeline_materialized_at to users
+
+Revision ID: 8b4e2d6f1a93
+Revises: 5d1f8a3c9e70
+Create Date: 2026-10-18 10:41:07.226915
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b4e2d6f1a93'
+down_revision = '5d1f8a3c9e70'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # NULL for everyone: each timeline is rebuilt from the follow graph on its
+    # next read, including the ones that only hold rows fanned out since rollout
+    op.add_column('users', sa.Column('timeline_materialized_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('users', 'timeline_materialized_at')
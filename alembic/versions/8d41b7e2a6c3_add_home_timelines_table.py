@@ -0,0 +1,36 @@
+"""Add home_timelines table
+
+Revision ID: 8d41b7e2a6c3
+Revises: 3f8a2c91d4e7
+Create Date: 2026-10-17 11:40:21.093117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import mssql
+
+# revision identifiers, used by Alembic.
+revision = '8d41b7e2a6c3'
+down_revision = '3f8a2c91d4e7'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('home_timelines',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('post_id', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['post_id'], ['posts.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('user_id', 'post_id')
+    )
+    op.create_index('ix_home_timelines_user_id_created_at', 'home_timelines', ['user_id', 'created_at', 'post_id'], unique=False)
+    op.create_index(op.f('ix_home_timelines_author_id'), 'home_timelines', ['author_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_home_timelines_author_id'), table_name='home_timelines')
+    op.drop_index('ix_home_timelines_user_id_created_at', table_name='home_timelines')
+    op.drop_table('home_timelines')
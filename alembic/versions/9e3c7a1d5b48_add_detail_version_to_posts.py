@@ -0,0 +1,24 @@
+"""Add detail_version to posts
+
+Revision ID: 9e3c7a1d5b48
+Revises: 8b4e2d6f1a93
+Create Date: 2026-10-18 12:06:52.418337
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e3c7a1d5b48'
+down_revision = '8b4e2d6f1a93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('detail_version', sa.Integer(), nullable=False, server_default='0'))
+
+
+def downgrade():
+    op.drop_column('posts', 'detail_version')
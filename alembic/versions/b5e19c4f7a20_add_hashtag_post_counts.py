@@ -0,0 +1,40 @@
+"""Add post counts to hashtags
+
+Revision ID: b5e19c4f7a20
+Revises: 8d41b7e2a6c3
+Create Date: 2026-10-17 14:05:47.512336
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b5e19c4f7a20'
+down_revision = '8d41b7e2a6c3'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('hashtags', sa.Column('post_count', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('hashtags', sa.Column('public_post_count', sa.Integer(), server_default='0', nullable=False))
+
+    # backfill from the existing links
+    op.execute("""
+        UPDATE hashtags SET
+            post_count = (
+                SELECT COUNT(DISTINCT post_hashtags.post_id) FROM post_hashtags
+                WHERE post_hashtags.hashtag_id = hashtags.id
+            ),
+            public_post_count = (
+                SELECT COUNT(DISTINCT post_hashtags.post_id) FROM post_hashtags
+                JOIN posts ON posts.id = post_hashtags.post_id
+                WHERE post_hashtags.hashtag_id = hashtags.id AND posts.visibility = 'public'
+            )
+    """)
+
+
+def downgrade():
+    op.drop_column('hashtags', 'public_post_count', mssql_drop_default=True)
+    op.drop_column('hashtags', 'post_count', mssql_drop_default=True)
@@ -0,0 +1,24 @@
+"""Add processing_progress to posts
+
+Revision ID: c4a7e2f9d815
+Revises: 9e3c7a1d5b48
+Create Date: 2026-10-18 13:22:10.904716
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4a7e2f9d815'
+down_revision = '9e3c7a1d5b48'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('processing_progress', sa.Float(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('posts', 'processing_progress')
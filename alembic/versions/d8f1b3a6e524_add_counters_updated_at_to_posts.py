@@ -0,0 +1,24 @@
+"""Add counters_updated_at to posts
+
+Revision ID: d8f1b3a6e524
+Revises: c4a7e2f9d815
+Create Date: 2026-10-18 15:47:33.512096
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8f1b3a6e524'
+down_revision = 'c4a7e2f9d815'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('counters_updated_at', sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade():
+    op.drop_column('posts', 'counters_updated_at')
@@ -0,0 +1,32 @@
+"""Add processing status to posts
+
+Revision ID: e3a8c61d9f42
+Revises: b5e19c4f7a20
+Create Date: 2026-10-17 19:52:13.408217
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e3a8c61d9f42'
+down_revision = 'b5e19c4f7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # existing posts are already transcoded
+    op.add_column('posts', sa.Column('processing_status', sa.Enum('processing', 'ready', 'failed', name='processingstatusenum'), nullable=False, server_default='ready'))
+    op.add_column('posts', sa.Column('processing_attempts', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('posts', sa.Column('processing_error', sa.NVARCHAR(length=500), nullable=True))
+    # the pipeline picks up unfinished posts on startup
+    op.create_index('ix_posts_processing_status', 'posts', ['processing_status'])
+
+
+def downgrade():
+    op.drop_index('ix_posts_processing_status', table_name='posts')
+    op.drop_column('posts', 'processing_error')
+    op.drop_column('posts', 'processing_attempts', mssql_drop_default=True)
+    op.drop_column('posts', 'processing_status', mssql_drop_default=True)
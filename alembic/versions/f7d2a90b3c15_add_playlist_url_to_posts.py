@@ -0,0 +1,24 @@
+"""Add HLS playlist url to posts
+
+Revision ID: f7d2a90b3c15
+Revises: e3a8c61d9f42
+Create Date: 2026-10-17 20:31:40.117052
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f7d2a90b3c15'
+down_revision = 'e3a8c61d9f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('posts', sa.Column('playlist_url', sa.String(), nullable=True))
+
+
+def downgrade():
+    op.drop_column('posts', 'playlist_url')
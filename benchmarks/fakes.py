@@ -0,0 +1,76 @@
+import sys
+import types
+
+
+# In-process stand-ins for the external services, installed into sys.modules
+# before the app is imported so nothing talks to FCM or the SMS API. Media
+# storage doesn't need one, run with STORAGE_BACKEND=local (src/storage).
+
+class FakeBackends:
+    def __init__(self):
+        self.push_notifications = []
+        self.sms = []
+
+
+backends = FakeBackends()
+
+
+def _fake_notification_module():
+    module = types.ModuleType("src.notification_service")
+
+    async def send_push_notification(device_token: str, platform: str, title: str, message: str):
+        backends.push_notifications.append((device_token, platform, title, message))
+        return {"success": True}
+
+    module.send_push_notification = send_push_notification
+    return module
+
+
+def _fake_sms_module():
+    module = types.ModuleType("azure.communication.sms")
+
+    class SmsSendResult:
+        def __init__(self, to):
+            self.to = to
+            self.successful = True
+            self.message_id = f"fake-{len(backends.sms)}"
+
+    class SmsClient:
+        @classmethod
+        def from_connection_string(cls, connection_string):
+            return cls()
+
+        def send(self, from_, to, message, **kwargs):
+            recipients = to if isinstance(to, list) else [to]
+            backends.sms.extend((recipient, message) for recipient in recipients)
+            return [SmsSendResult(recipient) for recipient in recipients]
+
+    module.SmsClient = SmsClient
+    module.SmsSendResult = SmsSendResult
+    return module
+
+
+def _fake_config_module():
+    # src/config.py holds deployment secrets and is not in the repo
+    module = types.ModuleType("src.config")
+
+    class Settings:
+        SECRET_KEY = "benchmark-secret"
+        ALGORITHM = "HS256"
+        ACCESS_TOKEN_EXPIRE_MINUTES = 60 * 24
+        JWKS_URL = ""
+        CLIENT_ID = ""
+        ISSUER = ""
+
+    module.Settings = Settings
+    return module
+
+
+def install_fakes():
+    sys.modules["src.notification_service"] = _fake_notification_module()
+    sys.modules["azure.communication.sms"] = _fake_sms_module()
+    try:
+        import src.config  # noqa: F401
+    except ImportError:
+        sys.modules["src.config"] = _fake_config_module()
+    return backends
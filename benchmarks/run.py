@@ -0,0 +1,251 @@
+"""
+Endpoint benchmarks against a seeded local database.
+
+    python -m benchmarks.run                          # seed a fresh SQLite db and run
+    python -m benchmarks.run --users 5000 --requests 500
+    python -m benchmarks.run --save-baseline          # store results as the new baseline
+    python -m benchmarks.run --database-url mssql+pyodbc://...   # local SQL Server container
+
+The real FastAPI app is driven in-process through httpx's ASGI transport;
+media goes to the local filesystem storage backend (src/storage/local.py)
+and FCM and SMS are replaced by fakes (benchmarks/fakes.py).
+Results are compared against benchmarks/baseline.json when it exists.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the API endpoints against a seeded local database.")
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file in the temp dir")
+    parser.add_argument("--skip-seed", action="store_true", help="reuse the data already in --database-url")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--follows", type=int, default=30, help="follows per user")
+    parser.add_argument("--posts", type=int, default=10, help="posts per user")
+    parser.add_argument("--likes", type=int, default=8, help="likes per post (average)")
+    parser.add_argument("--comments", type=int, default=3, help="comments per post (average)")
+    parser.add_argument("--interactions", type=int, default=10, help="media interactions per post (average)")
+    parser.add_argument("--hashtags", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--requests", type=int, default=200, help="measured requests per endpoint")
+    parser.add_argument("--warmup", type=int, default=10, help="unmeasured requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=1)
+    parser.add_argument("--only", nargs="*", help="endpoint names to run")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed p95 / query regression vs baseline (0.2 = 20%%)")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    return parser.parse_args(argv)
+
+
+def configure_environment(args):
+    # must run before anything imports src.database
+    if not args.database_url:
+        path = os.path.join(tempfile.gettempdir(), "vreels_benchmark.db")
+        if os.path.exists(path) and not args.skip_seed:
+            os.remove(path)
+        args.database_url = f"sqlite:///{path}"
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.pop("ASYNC_DATABASE_URL", None)
+    os.environ.setdefault("DB_PROFILE", "production")
+    os.environ.setdefault("LOOP_MONITOR_DEBUG", "false")
+    os.environ.setdefault("QUERY_STATS_DEBUG", "false")
+    os.environ["STORAGE_BACKEND"] = "local"
+    os.environ.setdefault("LOCAL_STORAGE_ROOT", os.path.join(tempfile.gettempdir(), "vreels_benchmark_media"))
+    os.environ.setdefault("AZURE_IMAGE_CONTAINER", "images")
+    os.environ.setdefault("AZURE_VIDEO_CONTAINER", "videos")
+
+    from .fakes import install_fakes
+    install_fakes()
+
+
+def percentile(values: list, pct: float) -> float:
+    """Nearest-rank percentile of an unsorted list."""
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(1, min(len(ordered), round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[rank - 1]
+
+
+class Endpoint:
+    def __init__(self, name: str, build):
+        # build(rng) -> (method, url, params, json body, token user id)
+        self.name = name
+        self.build = build
+
+
+def endpoints(user_count: int, post_ids: list, public_post_ids: list) -> list:
+    from src.datagen import HASHTAG_WORDS
+
+    def user(rng):
+        return rng.randint(1, user_count)
+
+    def post(rng):
+        return rng.choice(post_ids)
+
+    def public_post(rng):
+        return rng.choice(public_post_ids)
+
+    return [
+        Endpoint("feed", lambda rng: ("GET", "/v1/posts/feed", {"limit": 10, "page": rng.randint(1, 5)}, None, user(rng))),
+        Endpoint("feed_cursor", lambda rng: ("GET", "/v1/posts/feed", {"limit": 10, "cursor": ""}, None, user(rng))),
+        Endpoint("feed_for_you", lambda rng: ("GET", "/v1/posts/feed", {"limit": 10, "mode": "for_you"}, None, user(rng))),
+        Endpoint("following_feed", lambda rng: ("GET", "/v1/posts/followingposts", {"limit": 10}, None, user(rng))),
+        Endpoint("post_detail", lambda rng: ("GET", "/v1/posts/", None, {"post_id": public_post(rng)}, user(rng))),
+        Endpoint("profile", lambda rng: (
+            "GET", "/v1/profile/user", None, {"username": f"user{user(rng)}", "requesting_username": f"user{user(rng)}"}, None
+        )),
+        Endpoint("search_users", lambda rng: ("GET", "/v1/posts/search/users", {"page": 1, "limit": 10, "query": f"user{rng.randint(1, 99)}"}, None, user(rng))),
+        Endpoint("search_hashtags", lambda rng: ("GET", "/v1/posts/search/hashtags", {"page": 1, "limit": 10, "query": rng.choice(HASHTAG_WORDS)[:3]}, None, None)),
+        Endpoint("like", lambda rng: ("POST", "/v1/posts/like", None, {"post_id": post(rng)}, user(rng))),
+        Endpoint("comment", lambda rng: ("POST", "/v1/posts/comment", None, {"post_id": post(rng), "content": "benchmark comment #bench"}, user(rng))),
+    ]
+
+
+async def run_endpoint(client, endpoint: Endpoint, tokens: dict, args, rng) -> dict:
+    from src.query_stats import capture_queries
+
+    latencies, queries, errors = [], [], 0
+
+    async def one(measure: bool):
+        nonlocal errors
+        method, url, params, body, user_id = endpoint.build(rng)
+        headers = {"Authorization": f"Bearer {tokens[user_id]}"} if user_id else {}
+        with capture_queries() as stats:
+            started = time.perf_counter()
+            response = await client.request(method, url, params=params, json=body, headers=headers)
+            elapsed = time.perf_counter() - started
+        if not measure:
+            return
+        if response.status_code >= 400:
+            errors += 1
+        latencies.append(elapsed * 1000)
+        queries.append(stats.count)
+
+    for _ in range(args.warmup):
+        await one(False)
+
+    remaining = args.requests
+
+    async def worker():
+        nonlocal remaining
+        while remaining > 0:
+            remaining -= 1
+            await one(True)
+
+    await asyncio.gather(*(worker() for _ in range(max(1, args.concurrency))))
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 50), 2),
+        "p95_ms": round(percentile(latencies, 95), 2),
+        "p99_ms": round(percentile(latencies, 99), 2),
+        "queries_per_request": round(sum(queries) / len(queries), 2) if queries else 0.0,
+    }
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> tuple:
+    """(report lines, regressed metrics) vs the baseline; regressions are marked with '!'."""
+    lines, regressions = [], []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if not before:
+            continue
+        for key in ("p95_ms", "queries_per_request"):
+            old, new = before.get(key) or 0.0, result[key]
+            change = (new - old) / old if old else 0.0
+            marker = "!" if change > tolerance else " "
+            if marker == "!":
+                regressions.append(f"{name} {key}")
+            lines.append(f"{marker} {name:<16} {key:<20} {old:>9.2f} -> {new:>9.2f} ({change:+.0%})")
+    return lines, regressions
+
+
+def print_table(results: dict):
+    print(f"{'endpoint':<16} {'n':>5} {'err':>4} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'queries':>8}")
+    for name, r in results.items():
+        print(f"{name:<16} {r['requests']:>5} {r['errors']:>4} {r['p50_ms']:>9.2f} {r['p95_ms']:>9.2f} {r['p99_ms']:>9.2f} {r['queries_per_request']:>8.2f}")
+
+
+async def benchmark(args) -> dict:
+    import httpx
+    from src.database import SessionLocal, engine, async_engine
+    from src.auth.service import create_access_token
+    from src.models.post import Post, VisibilityEnum
+    from src.models.user import User
+    from src.datagen import DataScale, generate
+
+    if not args.skip_seed:
+        started = time.perf_counter()
+        counts = generate(engine, DataScale(
+            users=args.users, follows_per_user=args.follows, posts_per_user=args.posts,
+            likes_per_post=args.likes, comments_per_post=args.comments,
+            interactions_per_post=args.interactions, hashtags=args.hashtags, seed=args.seed,
+        ), reset=True, log=lambda line: None)
+        print(f"Seeded in {time.perf_counter() - started:.1f}s: " + ", ".join(f"{k}={v}" for k, v in counts.items()))
+
+    db = SessionLocal()
+    try:
+        users = db.query(User.id, User.username).all()
+        post_ids = [post_id for post_id, in db.query(Post.id)]
+        public_post_ids = [post_id for post_id, in db.query(Post.id).filter(Post.visibility == VisibilityEnum.public)]
+    finally:
+        db.close()
+    tokens = {user_id: await create_access_token(username, user_id) for user_id, username in users}
+
+    from main import app
+
+    rng = random.Random(args.seed)
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        for endpoint in endpoints(len(users), post_ids, public_post_ids):
+            if args.only and endpoint.name not in args.only:
+                continue
+            # the app prints debug lines per request, keep them out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                results[endpoint.name] = await run_endpoint(client, endpoint, tokens, args, rng)
+    await async_engine.dispose()
+    return results
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    configure_environment(args)
+    results = asyncio.run(benchmark(args))
+    print_table(results)
+
+    status = 0
+    if os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        lines, regressions = compare(results, baseline.get("results", {}), args.tolerance)
+        print(f"\nvs baseline ({args.baseline}):")
+        print("\n".join(lines))
+        if regressions:
+            print(f"\nRegressions over {args.tolerance:.0%}: {', '.join(regressions)}")
+            if args.fail_on_regression:
+                status = 1
+
+    if args.save_baseline:
+        scale = {key: getattr(args, key) for key in ("users", "follows", "posts", "likes", "comments", "interactions", "hashtags", "seed", "requests", "concurrency")}
+        with open(args.baseline, "w") as f:
+            json.dump({"scale": scale, "results": results}, f, indent=2)
+        print(f"\nSaved baseline to {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
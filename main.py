@@ -1,6 +1,15 @@
 from fastapi import FastAPI
 from src.database import Base, engine
 from src.api import router
+from src.post.counters import run_counter_jobs, counter_buffer, COUNTER_BUFFER_ENABLED
+from src.database import SessionLocal, async_engine
+from src.metrics import router as metrics_router
+from src.loop_monitor import loop_monitor
+from src.query_stats import query_stats_middleware
+from src.uploads import upload_size_limit_middleware
+from src.post.processing import video_pipeline
+from src.storage import storage
+import asyncio
 import uvicorn
 import os
 
@@ -12,6 +21,33 @@ app = FastAPI(
     version="0.1",
 )
 app.include_router(router)
+app.include_router(metrics_router)
+app.middleware("http")(query_stats_middleware)
+app.middleware("http")(upload_size_limit_middleware)
+
+
+@app.on_event("startup")
+async def start_background_jobs():
+    app.state.counter_jobs = asyncio.create_task(run_counter_jobs())
+    app.state.loop_monitor = asyncio.create_task(loop_monitor.run())
+    app.state.video_pipeline = asyncio.create_task(video_pipeline.run())
+
+
+@app.on_event("shutdown")
+async def stop_background_jobs():
+    app.state.counter_jobs.cancel()
+    app.state.loop_monitor.cancel()
+    app.state.video_pipeline.cancel()
+    loop_monitor.stop()
+    # Don't lose buffered counter deltas on shutdown
+    if COUNTER_BUFFER_ENABLED:
+        db = SessionLocal()
+        try:
+            counter_buffer.flush(db)
+        finally:
+            db.close()
+    await storage.close()
+    await async_engine.dispose()
 
 if __name__ == "__main__":
     port = int(os.environ.get("PORT", 8000))  # Use Azure's dynamic port
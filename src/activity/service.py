@@ -1,21 +1,32 @@
+from typing import Optional, Union
 from sqlalchemy.orm import Session
 
 from ..models.activity import Activity
+from ..pagination import keyset_filter, keyset_order, keyset_page, cursor_response
 
 
 # get activity of a user by username
 
 
 async def get_activities_by_username(
-    db: Session, username: str, page: int = 1, limit: int = 10
-) -> list[Activity]:
+    db: Session, username: str, page: int = 1, limit: int = 10, cursor: Optional[str] = None
+) -> Union[list[Activity], dict]:
+    """A page of activities, or with `cursor` (even "") a cursor_response dict."""
+    query = db.query(Activity).filter(Activity.username == username)
+
+    if cursor is not None:
+        if cursor:
+            query = query.filter(keyset_filter(Activity.timestamp, Activity.id, cursor))
+        activities = query.order_by(*keyset_order(Activity.timestamp, Activity.id)).limit(limit + 1).all()
+        activities, next_cursor, has_more = keyset_page(activities, limit, lambda activity: (activity.timestamp, activity.id))
+        return cursor_response(limit, next_cursor, has_more, activities)
+
     offset = (page - 1) * limit
 
     return (
-        db.query(Activity)
-        .filter(Activity.username == username)
+        query
         .order_by(Activity.timestamp.desc())
         .offset(offset)
         .limit(limit)
         .all()
-    )
\ No newline at end of file
+    )
@@ -1,3 +1,4 @@
+from typing import Optional
 from fastapi import APIRouter, Depends, status
 from sqlalchemy.orm import Session
 from pydantic import BaseModel
@@ -11,6 +12,6 @@ class UserRequest(BaseModel):
 
 @router.get("/user")
 async def activity(
-    request: UserRequest, page: int = 1, limit: int = 10, db: Session = Depends(get_db)
+    request: UserRequest, page: int = 1, limit: int = 10, cursor: Optional[str] = None, db: Session = Depends(get_db)
 ):
-    return await get_activities_by_username(db, request.username, page, limit)
\ No newline at end of file
+    return await get_activities_by_username(db, request.username, page, limit, cursor)
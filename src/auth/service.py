@@ -4,16 +4,21 @@ import requests
 import json
 from typing import Optional
 from fastapi import Depends, HTTPException, Request, status
-from sqlalchemy import BigInteger, and_, desc
+from sqlalchemy import BigInteger, and_, desc, select
 from sqlalchemy.orm import Session
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from datetime import timedelta, datetime, timezone
-from src.database import get_db
+from sqlalchemy.ext.asyncio import AsyncSession
+from src.database import get_db, get_async_db, execute
 from ..models.user import User, BlockedUsers, OTP, Follow, UserDevice
-from ..models.post import Post, Like, Comment, UserSavedPosts, UserSharedPosts, post_hashtags,MediaInteraction
+from ..models.post import Post, Like, Comment, UserSavedPosts, UserSharedPosts, post_hashtags,MediaInteraction, HomeTimeline
 from ..models.activity import Activity
+from ..post.hashtags import uncount_posts_hashtags
+from ..profile.user_index import user_index
+from ..post.detail_cache import invalidate_post_details
+from ..post.headers import invalidate_post_headers
 from .schemas import UserCreate, UserUpdate
 from starlette.status import HTTP_401_UNAUTHORIZED, HTTP_404_NOT_FOUND, HTTP_503_SERVICE_UNAVAILABLE
 import random
@@ -130,6 +135,31 @@ async def get_current_user(db: Session = Depends(get_db), token: str = Depends(o
     Decode the JWT token, verify its validity, and return the user associated with the token.
     Returns None if the token is invalid or expired.
     """
+    user_id = decode_access_token(token)
+
+    # Fetch the user from the database
+    user = db.query(User).filter(User.id == user_id).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return user
+
+
+# Same as get_current_user, for the handlers running on the async session
+async def get_current_user_async(db: AsyncSession = Depends(get_async_db), token: str = Depends(oauth2_bearer)):
+    user_id = decode_access_token(token)
+
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    return user
+
+
+def decode_access_token(token: str) -> int:
+    """
+    Decode and validate the JWT token, returning the user ID it was issued for.
+    """
     print(f"Received token: {token}")  # Debugging line
     try:
         # Decode the JWT token
@@ -152,12 +182,7 @@ async def get_current_user(db: Session = Depends(get_db), token: str = Depends(o
         if username is None or user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        # Fetch the user from the database
-        user = db.query(User).filter(User.id == user_id).first()
-        if not user:
-            raise HTTPException(status_code=404, detail="User not found")
-
-        return user
+        return user_id
     
     except JWTError as e:
         print(f"JWT Decode Error: {str(e)}")  # Debugging line
@@ -175,9 +200,9 @@ async def get_user_from_user_id(db: Session, user_id: int):
 # Function to get a user by their user ID
 async def get_user_by_username(db: Session, username: str):
     """
-    Fetch a user from the database using their user ID.
+    Fetch a user from the database using their username.
     """
-    return db.query(User).filter(User.username == username).first()
+    return (await execute(db, select(User).where(User.username == username))).scalars().first()
 
 # Function to create a new user in the database
 async def create_user(db: Session, user: UserCreate):
@@ -200,6 +225,7 @@ async def create_user(db: Session, user: UserCreate):
     print('user data is:',db_user)
     db.add(db_user)
     db.commit()
+    user_index.upsert(db_user)
 
     return db_user
 
@@ -236,6 +262,7 @@ async def update_user(db: Session, db_user: User, user_update: UserUpdate):
 
     db.commit()
     db.refresh(db_user)  # Refresh the user instance to get updated data
+    user_index.upsert(db_user)
     return db.query(User).filter(User.id == db_user.id).first()
 
 async def block_user_svc(db, blocker_id, blocked_id):
@@ -425,8 +452,14 @@ async def delete_account_svc(db: Session, user_id: int) -> bool:
         # 4. Delete post hashtags before deleting posts
         post_ids = [post.id for post in db.query(Post).filter(Post.author_id == user_id).all()]
         if post_ids:
+            await uncount_posts_hashtags(db, post_ids)
             db.execute(post_hashtags.delete().where(post_hashtags.c.post_id.in_(post_ids)))
 
+        # 4b. Delete home timeline entries owned by or pointing at the user
+        db.query(HomeTimeline).filter(
+            (HomeTimeline.user_id == user_id) | (HomeTimeline.author_id == user_id)
+        ).delete(synchronize_session=False)
+
         # 5. Delete the user's posts
         db.query(Post).filter(Post.author_id == user_id).delete(synchronize_session=False)
 
@@ -455,6 +488,9 @@ async def delete_account_svc(db: Session, user_id: int) -> bool:
         
         # Commit changes to the database
         db.commit()
+        user_index.remove(user_id)
+        invalidate_post_details(post_ids)
+        invalidate_post_headers(post_ids)
 
         return True
 
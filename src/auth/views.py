@@ -1,5 +1,4 @@
 from fastapi import APIRouter, Depends, status, HTTPException, Form, UploadFile, File
-from azure.core.exceptions import ResourceNotFoundError
 from urllib.parse import urlparse, unquote, quote
 from fastapi.encoders import jsonable_encoder
 from fastapi.responses import RedirectResponse
@@ -11,7 +10,7 @@ from src.database import get_db
 from typing import List
 from datetime import timedelta, datetime, timezone
 from .enums import AccountTypeEnum, GenderEnum
-from ..azure_blob import upload_to_azure_blob,blob_service_client, AZURE_IMAGE_CONTAINER
+from ..azure_blob import upload_to_azure_blob, delete_blob_url
 
 from src.auth.service import (
     get_current_user,
@@ -155,9 +154,12 @@ async def update_profile(
     # Check if a new profile pic is uploaded
     if profile_pic:
         # Upload to Azure and get the URL
-        new_profile_pic_url, media_type, thumbnail_url = await upload_to_azure_blob(
-            profile_pic, current_user.username, str(current_user.id)
-        )
+        try:
+            new_profile_pic_url, media_type, thumbnail_url = await upload_to_azure_blob(
+                profile_pic, current_user.username, str(current_user.id)
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
         # Set new profile pic URL to update
         user_update.profile_pic = new_profile_pic_url
 
@@ -175,16 +177,8 @@ async def remove_profile_pic(
         raise HTTPException(status_code=400, detail="No profile picture found to remove.")
 
     try:
-        parsed_url = urlparse(current_user.profile_pic)
-        blob_path = parsed_url.path.lstrip('/') 
-
-        container_client = blob_service_client.get_container_client(AZURE_IMAGE_CONTAINER)
-        blob_client = container_client.get_blob_client(blob_path)
-
-        try:
-            blob_client.delete_blob()
-        except ResourceNotFoundError:
-            pass  
+        # missing blobs are ignored
+        await delete_blob_url(current_user.profile_pic)
 
         current_user.profile_pic = ""
         db.commit()
@@ -1,209 +1,302 @@
-from azure.storage.blob import BlobServiceClient
 from datetime import datetime, timezone
 import os
 from fastapi import UploadFile
 
-from moviepy import VideoFileClip
-from PIL import Image
-from time import sleep
-from io import BytesIO
 import tempfile
+import asyncio
+import shutil
 
-import uuid
-import subprocess
 from dotenv import load_dotenv
+from .storage import storage
+from .uploads import SpooledUpload, spool_upload, file_sha256
+from .image_renditions import render_renditions, VIDEO_POSTER_RENDITIONS
+from .transcoder import run_ffmpeg, TranscodeError, probe, ladder_for, hls_ladder_args, thumbnail_offset, extract_frame
 
 # Load environment variables from .env file
 load_dotenv()
 
-# Azure Blob Storage Configuration
-AZURE_CONNECTION_STRING = os.getenv(
-    "AZURE_CONNECTION_STRING",
-    "DefaultEndpointsProtocol=https;AccountName=vreelsstorage;AccountKey=YkdFdR/UTuWKJnB4nmYJPV+NaqgsP9Vy3LVHIJ2R6m10jWM4v2a141Fh0HA+95BNs5PH6k/OTO2X+AStlUmb6Q==;EndpointSuffix=core.windows.net"
-)
+# Containers in the storage backend (src/storage, Azure Blob Storage by default)
 AZURE_IMAGE_CONTAINER = os.getenv("AZURE_IMAGE_CONTAINER")
 AZURE_VIDEO_CONTAINER = os.getenv("AZURE_VIDEO_CONTAINER")
 
-CDN_BASE_URL = os.getenv("CDN_BASE_URL", "https://vreelspostscdn-fmedgweqdkc6fah5.z01.azurefd.net")
-
-# Initialize BlobServiceClient
-blob_service_client = BlobServiceClient.from_connection_string(AZURE_CONNECTION_STRING)
+# parallel blob uploads for the many small files of an HLS ladder
+HLS_UPLOAD_CONCURRENCY = int(os.getenv("HLS_UPLOAD_CONCURRENCY", 8))
 
 # Define file extensions for images and videos
 IMAGE_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "bmp", "tiff", "webp"}
 VIDEO_EXTENSIONS = {"mp4", "mov", "avi", "mkv", "wmv", "flv", "webm"}
 
-FFMPEG = os.getenv("FFMPEG_PATH") or r"C:\ffmpeg\ffmpeg-7.1.1-essentials_build\bin\ffmpeg.exe"
 
-async def upload_to_azure_blob(file: UploadFile, username: str, user_id: str) -> tuple:
-    now = datetime.now(timezone.utc)
-    year, month, day = now.strftime("%Y"), now.strftime("%m"), now.strftime("%d")
-    timestamp_str = now.strftime("%Y%m%d_%H%M%S")
-    
-    file_extension = file.filename.split(".")[-1].lower()
-    unique_filename = f"{user_id}_{timestamp_str}.{file_extension}"
-    
+# served with the right type so browsers / players accept them from the CDN
+CONTENT_TYPES = {
+    "m3u8": "application/vnd.apple.mpegurl",
+    "ts": "video/mp2t",
+    "mp4": "video/mp4",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+}
+
+
+async def upload_blob_from_path(container_name: str, blob_name: str, path: str):
+    # streamed from the file in blocks, memory stays flat whatever the file size
+    content_type = CONTENT_TYPES.get(path.rsplit(".", 1)[-1].lower())
+    await storage.put_file(container_name, blob_name, path, content_type=content_type)
+
+
+async def upload_directory(container_name: str, prefix: str, directory: str, last: str = None) -> list:
+    """
+    Upload every file under `directory` to `prefix/<relative path>`, HLS_UPLOAD_CONCURRENCY
+    at a time. `last` (a path under `directory`) goes up once everything else is
+    stored, so its blob existing means the whole folder is there.
+    """
+    files = [
+        os.path.join(root, name)
+        for root, _, names in os.walk(directory)
+        for name in names
+    ]
+    if last:
+        files.remove(last)
+    slots = asyncio.Semaphore(HLS_UPLOAD_CONCURRENCY)
+    uploaded = []
+
+    async def upload(path: str):
+        blob_name = f"{prefix}/{os.path.relpath(path, directory).replace(os.sep, '/')}"
+        async with slots:
+            await upload_blob_from_path(container_name, blob_name, path)
+        uploaded.append(blob_name)
+
     try:
-        if file_extension in IMAGE_EXTENSIONS:
-            container_name = AZURE_IMAGE_CONTAINER
-            media_type = "image"
-        elif file_extension in VIDEO_EXTENSIONS:
-            container_name = AZURE_VIDEO_CONTAINER
-            media_type = "video"
-        else:
-            raise ValueError("Unsupported file type. Please upload an image or a video.")
-        
-        container_client = blob_service_client.get_container_client(container_name)
-        blob_name = f"{username}/{year}/{month}/{day}/{unique_filename}"
-        blob_client = container_client.get_blob_client(blob_name)
+        await asyncio.gather(*(upload(path) for path in files))
+        if last:
+            await upload(last)
+    except Exception:
+        # don't leave half a ladder behind
+        await asyncio.gather(*(storage.delete(container_name, name) for name in uploaded), return_exceptions=True)
+        raise
+    return uploaded
 
-        # Save file to temp for further processing
-        temp_video = tempfile.NamedTemporaryFile(delete=False, suffix=f".{file_extension}")
-        contents = await file.read()
-        temp_video.write(contents)
-        temp_video.close()
 
-        # Upload the media
-        blob_client.upload_blob(contents, overwrite=True)
-        media_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{container_name}/{blob_name}"
+async def blob_exists(container_name: str, blob_name: str) -> bool:
+    return await storage.exists(container_name, blob_name)
 
-        thumbnail_url = None
-        if media_type == "video":
-            # Generate thumbnail
-            clip = VideoFileClip(temp_video.name)
-            frame = clip.get_frame(3)  # Get frame at 3 seconds
-            thumbnail_image = Image.fromarray(frame)
-            temp_thumb = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-            thumbnail_image.save(temp_thumb.name)
-            clip.close()
 
-            # Upload thumbnail
-            thumb_blob_name = f"{username}/{year}/{month}/{day}/thumbnails/{user_id}_{timestamp_str}.jpg"
-            thumb_container_client = blob_service_client.get_container_client(AZURE_IMAGE_CONTAINER)
-            thumb_blob_client = thumb_container_client.get_blob_client(thumb_blob_name)
+def content_path(sha256: str) -> str:
+    # content-addressed folder, fanned out on the first byte of the hash
+    return f"{sha256[:2]}/{sha256}"
 
-            with open(temp_thumb.name, "rb") as thumb_file:
-                thumb_blob_client.upload_blob(thumb_file, overwrite=True)
 
-            thumbnail_url = f"https://{blob_service_client.account_name}.blob.core.windows.net/{AZURE_IMAGE_CONTAINER}/{thumb_blob_name}"
+def blob_url(container_name: str, blob_name: str) -> str:
+    return storage.url_for(container_name, blob_name)
 
-            os.remove(temp_thumb.name)
-        
-        os.remove(temp_video.name)
 
-        return media_url, media_type, thumbnail_url
+def cdn_url(container_name: str, blob_name: str) -> str:
+    return storage.url_for(container_name, blob_name, cdn=True)
 
-    except Exception as e:
-        raise Exception(f"Error uploading to Azure Blob: {e}")
 
+def parse_blob_url(url: str) -> tuple:
+    """(container, blob name) from a blob or CDN url."""
+    return storage.parse_url(url)
 
-async def upload_and_compress(file: UploadFile, username: str, user_id: str) -> tuple:
-    now = datetime.now(timezone.utc)
-    timestamp_str = now.strftime("%Y%m%d_%H%M%S")
-    file_ext = file.filename.split('.')[-1].lower()
-    unique_name = f"{user_id}_{timestamp_str}.{file_ext}"
-
-    if file_ext in IMAGE_EXTENSIONS:
-        media_type = "image"
-        container = AZURE_IMAGE_CONTAINER
-        compressed_path = await compress_image(file)
-    elif file_ext in VIDEO_EXTENSIONS:
-        media_type = "video"
-        container = AZURE_VIDEO_CONTAINER
-        compressed_path = await compress_video(file)
-    else:
-        raise ValueError("Unsupported file type")
 
-    # Upload to blob
-    blob_path = f"{username}/{now.year}/{now.month}/{now.day}/{unique_name}"
-    blob_client = blob_service_client.get_container_client(container).get_blob_client(blob_path)
+async def download_blob_to_path(url: str, path: str):
+    await storage.get_to_path(*parse_blob_url(url), path)
 
-    with open(compressed_path, "rb") as data:
-        blob_client.upload_blob(data, overwrite=True)
 
-    os.remove(compressed_path)
+async def delete_blob_url(url: str):
+    await storage.delete(*parse_blob_url(url))
 
-    media_url = f"{CDN_BASE_URL}/{container}/{blob_path}"
-    return media_url, media_type, None
 
-async def compress_image(file: UploadFile) -> str:
-    contents = await file.read()
-    original_size = len(contents)  # in bytes
+async def delete_blob_prefix_url(url: str):
+    """Delete every blob under a folder url (e.g. an HLS ladder)."""
+    container_name, prefix = parse_blob_url(url)
+    await storage.delete_prefix(container_name, prefix.rstrip("/") + "/")
 
+
+async def upload_raw_video(upload: SpooledUpload) -> str:
+    """
+    Store the untouched upload so the post can exist before it is transcoded.
+    Named by the upload's hash, a retried upload of the same file isn't sent twice.
+    """
+    blob_name = f"raw/{content_path(upload.sha256)}.{upload.extension}"
+    if not await blob_exists(AZURE_VIDEO_CONTAINER, blob_name):
+        await upload_blob_from_path(AZURE_VIDEO_CONTAINER, blob_name, upload.path)
+    return blob_url(AZURE_VIDEO_CONTAINER, blob_name)
+
+
+async def render_video_posters(video_path: str, info, out_dir: str) -> dict:
+    """
+    Poster / thumbnail renditions (VIDEO_POSTER_RENDITIONS) from one keyframe
+    at a duration-relative offset, falling back to the first frame.
+    """
+    frame_path = os.path.join(out_dir, "frame.jpg")
+    for offset in dict.fromkeys((thumbnail_offset(info), 0.0)):
+        try:
+            await extract_frame(video_path, frame_path, offset)
+        except TranscodeError as e:
+            print(f"Poster frame at {offset}s failed: {e}")
+            continue
+        if os.path.exists(frame_path) and os.path.getsize(frame_path) > 0:
+            break
+    else:
+        raise Exception("Could not extract a poster frame")
+
+    poster_dir = os.path.join(out_dir, "posters")
+    os.makedirs(poster_dir)
+    loop = asyncio.get_running_loop()
     try:
-        img = Image.open(BytesIO(contents))
-    except Exception as e:
-        raise Exception("Invalid image file. " + str(e))
+        return await loop.run_in_executor(None, render_renditions, frame_path, poster_dir, VIDEO_POSTER_RENDITIONS)
+    finally:
+        os.remove(frame_path)
+
+
+def _rendition_urls(base_url: str, renditions: dict) -> dict:
+    return {
+        name: {
+            "width": info["width"],
+            "height": info["height"],
+            "webp": f"{base_url}/{os.path.basename(info['webp'])}",
+            "jpeg": f"{base_url}/{os.path.basename(info['jpeg'])}",
+        }
+        for name, info in renditions.items()
+    }
+
+
+async def publish_video(upload: SpooledUpload, on_progress=None) -> tuple:
+    """
+    Transcode a spooled video into the HLS ladder plus an MP4 fallback and
+    upload everything with poster renditions, under a folder named by the
+    MP4's hash. When that folder is already complete nothing is uploaded.
+    Returns (media_url, thumbnail_url, playlist_url, poster renditions, mp4 sha256).
+    """
+    info = await probe(upload.path)
+    rungs = ladder_for(info)
+    work_dir = tempfile.mkdtemp(prefix="hls_")
+    hls_dir = os.path.join(work_dir, "hls")
+    for rung in rungs:
+        os.makedirs(os.path.join(hls_dir, rung.name))
+    mp4_path = os.path.join(work_dir, "video.mp4")
+    try:
+        try:
+            await run_ffmpeg(hls_ladder_args(upload.path, hls_dir, mp4_path, info, rungs), on_progress=on_progress)
+        except TranscodeError as e:
+            raise Exception(f"Video transcoding failed: {str(e)}")
+        print(f"🎞️ HLS ladder {', '.join(rung.name for rung in rungs)} for a {info.duration:.1f}s video, "
+              f"MP4 {os.path.getsize(mp4_path) / (1024*1024):.2f} MB (original {upload.size / (1024*1024):.2f} MB)")
+
+        # from the source, the poster doesn't have to wait for the ladder's quality
+        posters = await render_video_posters(upload.path, info, work_dir)
+
+        loop = asyncio.get_running_loop()
+        output_sha256 = await loop.run_in_executor(None, file_sha256, mp4_path)
+        base_path = content_path(output_sha256)
+        blob_path = f"{base_path}/video.mp4"
+        hls_prefix = f"{base_path}/hls"
+        poster_prefix = f"posters/{base_path}"
+
+        # video.mp4 goes up last and marks the folder complete
+        if await blob_exists(AZURE_VIDEO_CONTAINER, blob_path):
+            print(f"♻️ Video output {output_sha256[:12]} already stored, skipping upload")
+        else:
+            # segments, playlists and the posters go up in parallel
+            await asyncio.gather(
+                upload_directory(AZURE_VIDEO_CONTAINER, hls_prefix, hls_dir),
+                upload_directory(AZURE_IMAGE_CONTAINER, poster_prefix, os.path.join(work_dir, "posters")),
+            )
+            await upload_blob_from_path(AZURE_VIDEO_CONTAINER, blob_path, mp4_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    posters = _rendition_urls(cdn_url(AZURE_IMAGE_CONTAINER, poster_prefix), posters)
+    # post.thumbnail is also the player poster, use the largest
+    return (
+        cdn_url(AZURE_VIDEO_CONTAINER, blob_path),
+        max(posters.values(), key=lambda poster: poster["width"])["jpeg"],
+        cdn_url(AZURE_VIDEO_CONTAINER, f"{hls_prefix}/master.m3u8"),
+        posters,
+        output_sha256,
+    )
+
+
+async def upload_to_azure_blob(file: UploadFile, username: str, user_id: str) -> tuple:
+    now = datetime.now(timezone.utc)
+    year, month, day = now.strftime("%Y"), now.strftime("%m"), now.strftime("%d")
+    timestamp_str = now.strftime("%Y%m%d_%H%M%S")
+
+    # raises ValueError for unsupported / oversized files
+    upload = await spool_upload(file)
 
-    temp_path = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg").name
-    img = img.convert("RGB")
-    img.save(temp_path, format="JPEG", optimize=True, quality=85)
+    try:
+        if upload.media_type == "image":
+            container_name = AZURE_IMAGE_CONTAINER
+        else:
+            container_name = AZURE_VIDEO_CONTAINER
+        media_type = upload.media_type
 
-    compressed_size = os.path.getsize(temp_path)  # in bytes
+        unique_filename = f"{user_id}_{timestamp_str}.{upload.extension}"
+        blob_name = f"{username}/{year}/{month}/{day}/{unique_filename}"
 
-    print(f"🧾 Original: {original_size / 1024:.2f} KB | Compressed: {compressed_size / 1024:.2f} KB")
-    return temp_path
+        # Upload the media straight from the spooled file
+        await upload_blob_from_path(container_name, blob_name, upload.path)
+        media_url = blob_url(container_name, blob_name)
 
+        thumbnail_url = None
+        if media_type == "video":
+            # Poster from a single keyframe, no full decode
+            thumb_prefix = f"{username}/{year}/{month}/{day}/thumbnails/{user_id}_{timestamp_str}"
+            work_dir = tempfile.mkdtemp(prefix="thumb_")
+            try:
+                posters = await render_video_posters(upload.path, await probe(upload.path), work_dir)
+                await upload_directory(AZURE_IMAGE_CONTAINER, thumb_prefix, os.path.join(work_dir, "posters"))
+            finally:
+                shutil.rmtree(work_dir, ignore_errors=True)
+            largest = max(posters.values(), key=lambda poster: poster["width"])
+            thumbnail_url = blob_url(AZURE_IMAGE_CONTAINER, f"{thumb_prefix}/{os.path.basename(largest['jpeg'])}")
 
-async def compress_video(file: UploadFile) -> str:
-    """Optimized video compression with proper file handling."""
-    # Create temp files with unique names
-    raw_path = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
-    compressed_path = tempfile.NamedTemporaryFile(delete=False, suffix=".mp4").name
-    
-    # Write the uploaded file content
-    content = await file.read()
-    with open(raw_path, "wb") as f:
-        f.write(content)
-    
-    original_size = os.path.getsize(raw_path)
-    print(f"📦 Original video size: {original_size / (1024*1024):.2f} MB") 
+        return media_url, media_type, thumbnail_url
 
+    except Exception as e:
+        raise Exception(f"Error uploading to Azure Blob: {e}")
+    finally:
+        upload.cleanup()
+
+
+async def publish_image(upload: SpooledUpload) -> tuple:
+    """
+    Render the sized WebP/JPEG renditions of a spooled image and upload them
+    under a folder named by the hash of the largest JPEG. When that folder is
+    already complete nothing is uploaded.
+    Returns ({name: {"width", "height", "webp": url, "jpeg": url}}, output sha256).
+    """
+    work_dir = tempfile.mkdtemp(prefix="img_")
     try:
-        # First pass - video only (faster)
-        subprocess.run([
-            FFMPEG, "-y",
-            "-i", raw_path,
-            "-c:v", "libx264",
-            "-preset", "ultrafast",
-            "-crf", "30",
-            "-movflags", "+faststart",
-            "-threads", "4",
-            "-x264-params", "ref=1:bframes=0",
-            "-an",  # No audio in first pass
-            compressed_path
-        ], check=True)
-
-        # Second pass - add audio
-        with tempfile.NamedTemporaryFile(delete=False, suffix=".mp4") as temp_file:
-            final_path = temp_file.name
-        
-        subprocess.run([
-            FFMPEG, "-y",
-            "-i", compressed_path,  # Compressed video
-            "-i", raw_path,         # Original audio
-            "-c:v", "copy",         # Copy compressed video
-            "-c:a", "aac", "-b:a", "128k",
-            "-movflags", "+faststart",
-            final_path
-        ], check=True)
-
-        
-        # Get final compressed size
-        final_size = os.path.getsize(final_path)
-        print(f"✅ Final compressed size: {final_size / (1024*1024):.2f} MB")
-        print(f"🔽 Final compression ratio: {final_size/original_size:.2%}")
-        print(f"💾 Space saved: {(original_size - final_size) / (1024*1024):.2f} MB")
-
-        # Clean up intermediate files
-        os.remove(compressed_path)
-        os.remove(raw_path)
-
-        return final_path
-
-    except subprocess.CalledProcessError as e:
-        # Clean up any remaining files on error
-        for path in [raw_path, compressed_path, final_path]:
-            if path and os.path.exists(path):
-                os.remove(path)
-        raise Exception(f"Video compression failed: {str(e)}")
+        # Pillow is CPU bound, keep it off the event loop
+        loop = asyncio.get_running_loop()
+        renditions = await loop.run_in_executor(None, render_renditions, upload.path, work_dir)
+        largest = max(renditions.values(), key=lambda info: info["width"] * info["height"])["jpeg"]
+        output_sha256 = await loop.run_in_executor(None, file_sha256, largest)
+        prefix = content_path(output_sha256)
+
+        # the largest JPEG goes up last and marks the folder complete
+        marker = f"{prefix}/{os.path.basename(largest)}"
+        if await blob_exists(AZURE_IMAGE_CONTAINER, marker):
+            print(f"♻️ Image output {output_sha256[:12]} already stored, skipping upload")
+        else:
+            await upload_directory(AZURE_IMAGE_CONTAINER, prefix, work_dir, last=largest)
+        print(f"🧾 Original: {upload.size / 1024:.2f} KB | " + " | ".join(
+            f"{name} {info['width']}x{info['height']}: {os.path.getsize(info['webp']) / 1024:.1f} KB webp"
+            for name, info in renditions.items()
+        ))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return _rendition_urls(cdn_url(AZURE_IMAGE_CONTAINER, prefix), renditions), output_sha256
+
+
+def primary_urls(renditions: dict) -> tuple:
+    """(media url, thumbnail url) for clients that only read post.media / post.thumbnail."""
+    largest = max(renditions.values(), key=lambda info: info["width"] * info["height"])
+    smallest = min(renditions.values(), key=lambda info: info["width"] * info["height"])
+    return largest["jpeg"], smallest["jpeg"]
+
@@ -1,22 +1,204 @@
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy import create_engine
+from sqlalchemy import NVARCHAR, create_engine, event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+import inspect
 import os
+import time
 from dotenv import load_dotenv
+from .metrics import Counter, Gauge, Histogram
 
 # Load environment variables from .env file
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
-engine = create_engine(DATABASE_URL, pool_pre_ping=True, echo=True)
+# Engine profile: production (the default) has no statement logging or
+# per-checkout ping and sizes the pool for gunicorn workers; set
+# DB_PROFILE=development locally for both. Each value can still be
+# overridden on its own (DB_POOL_SIZE, DB_ECHO, ...).
+DB_PROFILES = {
+    "development": {
+        "echo": "true",
+        "pool_pre_ping": "true",
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": -1,
+        "fast_executemany": "false",
+    },
+    "production": {
+        "echo": "false",
+        "pool_pre_ping": "false",
+        "pool_size": 10,
+        "max_overflow": 10,
+        "pool_timeout": 10,
+        # below the idle timeout of the Azure SQL gateway
+        "pool_recycle": 1800,
+        "fast_executemany": "true",
+    },
+}
+DB_PROFILE = os.getenv("DB_PROFILE", "production")
+
+
+def _setting(name: str):
+    return os.getenv("DB_" + name.upper(), DB_PROFILES[DB_PROFILE][name])
+
+
+def _flag(name: str) -> bool:
+    return str(_setting(name)).lower() == "true"
+
+
+def engine_options(url: str, is_async: bool = False) -> dict:
+    # echo: false, true (statements) or debug (statements and rows)
+    echo = str(_setting("echo")).lower()
+    options = {
+        "echo": "debug" if echo == "debug" else echo == "true",
+        "pool_pre_ping": _flag("pool_pre_ping"),
+    }
+    dialect = url.split("://")[0]
+    if not dialect.startswith("sqlite"):
+        options.update(
+            pool_size=int(_setting("pool_size")),
+            max_overflow=int(_setting("max_overflow")),
+            pool_timeout=float(_setting("pool_timeout")),
+            pool_recycle=int(_setting("pool_recycle")),
+            poolclass=_instrumented_pool(AsyncAdaptedQueuePool if is_async else QueuePool, "async" if is_async else "sync"),
+        )
+    if dialect == "mssql+pyodbc" and _flag("fast_executemany"):
+        options["fast_executemany"] = True
+    return options
+
+
+# Pool metrics: time spent waiting for a connection, checkout timeouts, new
+# connections opened, and how full each pool is (read from the pool at
+# scrape time).
+pool_wait = Histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pooled connection",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 10.0, 30.0),
+)
+pool_timeouts = Counter("db_pool_checkout_timeouts_total", "Checkouts that gave up after pool_timeout")
+pool_connects = Counter("db_pool_connects_total", "New database connections opened by the pool")
+
+
+def _instrumented_pool(pool_class, label: str):
+    # the pool has no event before a checkout starts waiting, so wrap connect()
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return pool_class.connect(self)
+        except PoolTimeoutError:
+            pool_timeouts.inc(engine=label)
+            raise
+        finally:
+            pool_wait.observe(time.perf_counter() - started, engine=label)
+
+    return type(pool_class.__name__, (pool_class,), {"connect": connect})
+
+
+def _count_connects(engine_, label: str):
+    event.listen(engine_.pool, "connect", lambda dbapi_connection, connection_record: pool_connects.inc(engine=label))
+
+
+def _pool_stats():
+    max_overflow = max(int(_setting("max_overflow")), 0)
+    for label, pool in (("sync", engine.pool), ("async", async_engine.pool)):
+        if not isinstance(pool, QueuePool):
+            continue
+        checked_out = pool.checkedout()
+        capacity = pool.size() + max_overflow
+        yield {"engine": label, "state": "checked_out"}, checked_out
+        yield {"engine": label, "state": "idle"}, pool.checkedin()
+        yield {"engine": label, "state": "overflow"}, max(pool.overflow(), 0)
+        yield {"engine": label, "state": "capacity"}, capacity
+        yield {"engine": label, "state": "saturation"}, checked_out / capacity if capacity > 0 else 0.0
+
+
+Gauge("db_pool_connections", "Connection pool state per engine; saturation is checked_out / capacity", collect=lambda: list(_pool_stats()))
+
+engine = create_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+_count_connects(engine, "sync")
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+
+# NVARCHAR("max") is SQL Server only; local SQLite databases (benchmarks,
+# generated test data) get a plain NVARCHAR column instead
+@compiles(NVARCHAR, "sqlite")
+def _sqlite_nvarchar(type_, compiler, **kw):
+    return "NVARCHAR"
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# Async engine for the hot handlers, so a slow query only waits on its own
+# request instead of blocking the event loop for the whole worker.
+# Same database as DATABASE_URL unless ASYNC_DATABASE_URL is set.
+_ASYNC_DRIVERS = {
+    "mssql": "mssql+aioodbc",
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    dialect = scheme.split("+")[0]
+    if dialect in _ASYNC_DRIVERS:
+        return _ASYNC_DRIVERS[dialect] + sep + rest
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL") or async_database_url(DATABASE_URL)
+
+async_engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, is_async=True))
+_count_connects(async_engine.sync_engine, "async")
+
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+# Helpers for code shared by sync and async handlers: the services take
+# either a Session or an AsyncSession and await these instead of calling
+# db.execute / db.commit directly.
+async def _maybe_await(result):
+    if inspect.isawaitable(result):
+        return await result
+    return result
+
+
+async def execute(db, statement, *args, **kwargs):
+    return await _maybe_await(db.execute(statement, *args, **kwargs))
+
+
+async def commit(db):
+    await _maybe_await(db.commit())
+
+
+async def flush(db):
+    await _maybe_await(db.flush())
+
+
+async def rollback(db):
+    await _maybe_await(db.rollback())
+
+
+async def refresh(db, instance):
+    await _maybe_await(db.refresh(instance))
+
+
+async def delete_object(db, instance):
+    await _maybe_await(db.delete(instance))
@@ -0,0 +1,333 @@
+"""
+Synthetic bulk data for load testing, written straight into the database.
+
+    python -m src.datagen --users 100000 --seed 7
+    python -m src.datagen --database-url sqlite:////tmp/load.db --reset --users 20000
+
+Follows, post popularity, likes and hashtags follow power-law / Zipf
+distributions, so a few accounts and posts get most of the traffic like in
+production. The same --seed always produces the same dataset. Rows are
+inserted in chunks with executemany (fast_executemany on SQL Server), and
+the denormalized counters are computed up front, so nothing is updated
+afterwards. Home timelines are left empty and users unmaterialized
+(timeline_materialized_at unset), so each is rebuilt on its first read.
+
+Expects empty tables; --reset drops and recreates the schema first.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+import numpy as np
+
+CHUNK_SIZE = int(os.getenv("DATAGEN_CHUNK_SIZE", 10000))
+
+HASHTAG_WORDS = [
+    "travel", "food", "music", "fitness", "art", "style", "pets", "nature", "tech", "fun",
+    "photo", "dance", "funny", "love", "beauty", "sports", "gaming", "diy", "family", "summer",
+]
+
+
+class DataScale:
+    """Dataset size; the per-user / per-post values are averages."""
+
+    def __init__(self, users: int = 10000, follows_per_user: int = 50, posts_per_user: int = 5,
+                 likes_per_post: int = 20, comments_per_post: int = 3, interactions_per_post: int = 30,
+                 hashtags: int = 2000, tags_per_post: float = 2.0, days: int = 90,
+                 private_share: float = 0.1, friends_share: float = 0.1, seed: int = 1):
+        self.users = users
+        self.follows_per_user = follows_per_user
+        self.posts_per_user = posts_per_user
+        self.likes_per_post = likes_per_post
+        self.comments_per_post = comments_per_post
+        self.interactions_per_post = interactions_per_post
+        self.hashtags = hashtags
+        self.tags_per_post = tags_per_post
+        self.days = days
+        self.private_share = private_share
+        self.friends_share = friends_share
+        self.seed = seed
+
+
+def zipf_weights(n: int, exponent: float, rng: np.random.Generator) -> np.ndarray:
+    """Zipf weights over a random permutation of n items (rank 1 gets the most)."""
+    if n <= 0:
+        return np.zeros(0)
+    weights = 1.0 / (rng.permutation(n) + 1.0) ** exponent
+    return weights / weights.sum()
+
+
+def _pick(rng: np.random.Generator, weights: np.ndarray, size: int) -> np.ndarray:
+    """1-based ids drawn with the given weights."""
+    return rng.choice(len(weights), size=size, p=weights) + 1
+
+
+def _unique_pairs(a: np.ndarray, b: np.ndarray, base: int):
+    keys = np.unique(a.astype(np.int64) * base + b)
+    return keys // base, keys % base
+
+
+def _hashtag_names(count: int) -> list:
+    return [f"{HASHTAG_WORDS[i % len(HASHTAG_WORDS)]}{i // len(HASHTAG_WORDS) or ''}" for i in range(count)]
+
+
+class _Writer:
+    """Chunked executemany inserts on one connection, with progress output."""
+
+    def __init__(self, conn, chunk_size: int, log):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.log = log
+        self.counts = {}
+
+    def insert(self, table, size: int, columns: dict, explicit_ids: bool = False):
+        """
+        `columns` maps column name -> numpy array / list of length `size`, a
+        scalar, or a callable(start, stop) returning that slice as a list.
+        """
+        from sqlalchemy import insert
+
+        started = time.perf_counter()
+        mssql_identity = explicit_ids and self.conn.dialect.name == "mssql"
+        if mssql_identity:
+            self.conn.exec_driver_sql(f"SET IDENTITY_INSERT {table.name} ON")
+
+        names = list(columns)
+        for start in range(0, size, self.chunk_size):
+            stop = min(start + self.chunk_size, size)
+            values = []
+            for name in names:
+                column = columns[name]
+                if callable(column):
+                    values.append(column(start, stop))
+                elif isinstance(column, (np.ndarray, list)):
+                    chunk = column[start:stop]
+                    values.append(chunk.tolist() if isinstance(chunk, np.ndarray) else chunk)
+                else:
+                    values.append([column] * (stop - start))
+            self.conn.execute(insert(table), [dict(zip(names, row)) for row in zip(*values)])
+            self.conn.commit()
+
+        if mssql_identity:
+            self.conn.exec_driver_sql(f"SET IDENTITY_INSERT {table.name} OFF")
+            self.conn.commit()
+
+        elapsed = time.perf_counter() - started
+        self.counts[table.name] = self.counts.get(table.name, 0) + size
+        self.log(f"{table.name}: {size} rows in {elapsed:.1f}s ({size / elapsed if elapsed else 0:,.0f} rows/s)")
+
+
+def generate(engine, scale: DataScale, chunk_size: int = CHUNK_SIZE, reset: bool = False, log=print) -> dict:
+    """Generate the dataset into `engine`; returns rows written per table."""
+    # models import src.database, so they are loaded once DATABASE_URL is set
+    from sqlalchemy import func, select
+    from .database import Base
+    from .auth.enums import AccountTypeEnum
+    from .models.post import Post, Like, Comment, Hashtag, MediaInteraction, post_likes, post_hashtags, MediaTypeEnum
+    from .models.user import User, Follow, UserDevice
+
+    if reset:
+        Base.metadata.drop_all(bind=engine)
+    Base.metadata.create_all(bind=engine)
+    with engine.connect() as conn:
+        existing = conn.execute(select(func.count()).select_from(User.__table__)).scalar()
+    if existing:
+        raise RuntimeError(f"users table already has {existing} rows, run with --reset to start from an empty schema")
+
+    rng = np.random.default_rng(scale.seed)
+    now = datetime.now(timezone.utc)
+    user_count = scale.users
+
+    # how much each user does (likes, comments, posts) and how followed they are
+    activity = zipf_weights(user_count, 0.8, rng)
+    popularity = zipf_weights(user_count, 1.1, rng)
+
+    # follow graph: active users follow, popular users get followed
+    edges = user_count * scale.follows_per_user
+    followers, followees = _pick(rng, activity, edges), _pick(rng, popularity, edges)
+    keep = followers != followees
+    followers, followees = _unique_pairs(followers[keep], followees[keep], user_count + 1)
+    followers_count = np.bincount(followees, minlength=user_count + 1)
+    following_count = np.bincount(followers, minlength=user_count + 1)
+
+    # posts, numbered in creation order
+    post_count = user_count * scale.posts_per_user
+    authors = _pick(rng, activity, post_count)
+    post_age = np.sort(rng.uniform(0, scale.days * 86400, post_count))[::-1]
+    roll = rng.random(post_count)
+    visibility = np.where(
+        roll < scale.private_share, "private",
+        np.where(roll < scale.private_share + scale.friends_share, "friends", "public"),
+    )
+    is_video = rng.random(post_count) < 0.5
+
+    # post popularity: Zipf over posts, boosted by how popular the author is
+    post_weights = zipf_weights(post_count, 1.0, rng) * np.sqrt(popularity[authors - 1] * user_count)
+    post_weights /= post_weights.sum()
+
+    like_posts, like_users = _unique_pairs(
+        _pick(rng, post_weights, post_count * scale.likes_per_post),
+        _pick(rng, activity, post_count * scale.likes_per_post),
+        user_count + 1,
+    )
+    comment_total = post_count * scale.comments_per_post
+    comment_posts = _pick(rng, post_weights, comment_total)
+    comment_users = _pick(rng, activity, comment_total)
+    interaction_total = post_count * scale.interactions_per_post
+    interaction_posts = _pick(rng, post_weights, interaction_total)
+    interaction_users = _pick(rng, activity, interaction_total)
+
+    # hashtags: Zipf popularity, a Poisson number of distinct tags per post
+    hashtag_names = _hashtag_names(scale.hashtags)
+    tags_per_post = np.minimum(rng.poisson(scale.tags_per_post, post_count), 5) if scale.hashtags else np.zeros(post_count, dtype=np.int64)
+    tag_posts = np.repeat(np.arange(1, post_count + 1), tags_per_post)
+    tag_ids = _pick(rng, zipf_weights(scale.hashtags, 1.1, rng), len(tag_posts)) if scale.hashtags else np.zeros(0, dtype=np.int64)
+    tag_posts, tag_ids = _unique_pairs(tag_posts, tag_ids, scale.hashtags + 1)
+    public_tags = visibility[tag_posts - 1] == "public"
+
+    post_created = [now - timedelta(seconds=float(age)) for age in post_age]
+
+    # tag_posts is sorted, so each post's tags are one slice
+    tag_offsets = np.searchsorted(tag_posts, np.arange(1, post_count + 2))
+
+    def post_content(start, stop):
+        return [
+            f"post {post_id} " + " ".join("#" + hashtag_names[t - 1] for t in tag_ids[tag_offsets[post_id - 1]:tag_offsets[post_id]].tolist())
+            for post_id in range(start + 1, stop + 1)
+        ]
+
+    video_length = np.where(is_video[interaction_posts - 1], rng.integers(5, 61, interaction_total), 0)
+    watched = np.where(
+        video_length > 0, (video_length * rng.beta(2, 2, interaction_total)).astype(np.int64), rng.integers(1, 10, interaction_total)
+    )
+    skipped = np.where(video_length > 0, watched < 0.2 * video_length, rng.random(interaction_total) < 0.2)
+
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            conn.exec_driver_sql("PRAGMA synchronous = OFF")
+            conn.exec_driver_sql("PRAGMA journal_mode = MEMORY")
+
+        writer = _Writer(conn, chunk_size, log)
+        user_ids = np.arange(1, user_count + 1)
+        writer.insert(User.__table__, user_count, {
+            "id": user_ids,
+            "username": lambda start, stop: [f"user{i}" for i in range(start + 1, stop + 1)],
+            "name": lambda start, stop: [f"User {i}" for i in range(start + 1, stop + 1)],
+            "phone_number": user_ids + 10_000_000_000,
+            "account_type": [AccountTypeEnum.PRIVATE if private else AccountTypeEnum.PUBLIC for private in (rng.random(user_count) < 0.1)],
+            "is_active": True,
+            "is_verified": True,
+            "report_count": 0,
+            "followers_count": followers_count[1:],
+            "following_count": following_count[1:],
+            "created_at": now - timedelta(days=scale.days),
+        }, explicit_ids=True)
+        writer.insert(UserDevice.__table__, user_count, {
+            "user_id": user_ids,
+            "device_id": lambda start, stop: [f"datagen-{i}" for i in range(start + 1, stop + 1)],
+            "device_token": lambda start, stop: [f"token-{i}" for i in range(start + 1, stop + 1)],
+            "platform": np.where(rng.random(user_count) < 0.6, "android", "ios"),
+        })
+        writer.insert(Follow.__table__, len(followers), {"follower_id": followers, "following_id": followees})
+
+        hashtag_total = np.bincount(tag_ids, minlength=scale.hashtags + 1)
+        hashtag_public = np.bincount(tag_ids[public_tags], minlength=scale.hashtags + 1)
+        writer.insert(Hashtag.__table__, scale.hashtags, {
+            "id": np.arange(1, scale.hashtags + 1),
+            "name": hashtag_names,
+            "post_count": hashtag_total[1:],
+            "public_post_count": hashtag_public[1:],
+        }, explicit_ids=True)
+
+        writer.insert(Post.__table__, post_count, {
+            "id": np.arange(1, post_count + 1),
+            "author_id": authors,
+            "content": post_content,
+            "media": lambda start, stop: [
+                f"https://cdn.example.com/{authors[i]}/{i + 1}.{'mp4' if is_video[i] else 'jpg'}" for i in range(start, stop)
+            ],
+            "media_type": np.where(is_video, "video", "image"),
+            "visibility": visibility,
+            "created_at": lambda start, stop: post_created[start:stop],
+            "likes_count": np.bincount(like_posts, minlength=post_count + 1)[1:],
+            "comments_count": np.bincount(comment_posts, minlength=post_count + 1)[1:],
+            "views_count": np.bincount(interaction_posts, minlength=post_count + 1)[1:],
+            "save_count": 0,
+            "share_count": 0,
+            "report_count": 0,
+        }, explicit_ids=True)
+        writer.insert(post_hashtags, len(tag_posts), {"post_id": tag_posts, "hashtag_id": tag_ids})
+
+        def after_post(posts, spread_seconds):
+            offsets = rng.exponential(spread_seconds, len(posts))
+            ages = np.maximum(post_age[posts - 1] - offsets, 0)
+            return lambda start, stop: [now - timedelta(seconds=float(age)) for age in ages[start:stop]]
+
+        writer.insert(post_likes, len(like_posts), {"post_id": like_posts, "user_id": like_users})
+        writer.insert(Like.__table__, len(like_posts), {
+            "post_id": like_posts, "user_id": like_users, "created_at": after_post(like_posts, 6 * 3600),
+        })
+        writer.insert(Comment.__table__, comment_total, {
+            "post_id": comment_posts,
+            "user_id": comment_users,
+            "content": lambda start, stop: [f"comment {i}" for i in range(start + 1, stop + 1)],
+            "created_at": after_post(comment_posts, 12 * 3600),
+            "report_count": 0,
+        })
+        writer.insert(MediaInteraction.__table__, interaction_total, {
+            "post_id": interaction_posts,
+            "user_id": interaction_users,
+            "media_type": [MediaTypeEnum.video if video else MediaTypeEnum.image for video in is_video[interaction_posts - 1]],
+            "video_length": video_length,
+            "watched_time": watched,
+            "skipped": skipped,
+            "created_at": after_post(interaction_posts, 24 * 3600),
+        })
+
+    return writer.counts
+
+
+def parse_args(argv=None):
+    defaults = DataScale()
+    parser = argparse.ArgumentParser(description="Generate a synthetic dataset for load testing.")
+    parser.add_argument("--database-url", help="defaults to DATABASE_URL")
+    parser.add_argument("--reset", action="store_true", help="drop and recreate all tables first")
+    parser.add_argument("--users", type=int, default=defaults.users)
+    parser.add_argument("--follows", type=int, default=defaults.follows_per_user, help="follows per user (average)")
+    parser.add_argument("--posts", type=int, default=defaults.posts_per_user, help="posts per user (average)")
+    parser.add_argument("--likes", type=int, default=defaults.likes_per_post, help="likes per post (average)")
+    parser.add_argument("--comments", type=int, default=defaults.comments_per_post, help="comments per post (average)")
+    parser.add_argument("--interactions", type=int, default=defaults.interactions_per_post, help="media interactions per post (average)")
+    parser.add_argument("--hashtags", type=int, default=defaults.hashtags)
+    parser.add_argument("--tags-per-post", type=float, default=defaults.tags_per_post)
+    parser.add_argument("--days", type=int, default=defaults.days, help="spread post dates over this many days")
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    return parser.parse_args(argv)
+
+
+def scale_from_args(args) -> DataScale:
+    return DataScale(
+        users=args.users, follows_per_user=args.follows, posts_per_user=args.posts,
+        likes_per_post=args.likes, comments_per_post=args.comments,
+        interactions_per_post=args.interactions, hashtags=args.hashtags,
+        tags_per_post=args.tags_per_post, days=args.days, seed=args.seed,
+    )
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.database_url:
+        os.environ["DATABASE_URL"] = args.database_url
+    # bulk load settings: no statement logging, fast_executemany on pyodbc
+    os.environ.setdefault("DB_PROFILE", "production")
+    from .database import engine
+
+    started = time.perf_counter()
+    counts = generate(engine, scale_from_args(args), chunk_size=args.chunk_size, reset=args.reset)
+    print(f"Generated {sum(counts.values())} rows in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
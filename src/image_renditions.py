@@ -0,0 +1,86 @@
+import os
+from PIL import Image, ImageOps
+
+
+# Sized renditions of an uploaded image, each as WebP plus a JPEG fallback.
+# Sizes are the long edge in pixels and never upscale. Decoding starts with
+# draft() so JPEGs are DCT-scaled while decoding (a 12 MP photo decodes at
+# 1/2..1/8 size when only small renditions are needed), then each smaller
+# rendition is derived from the previous one with reduce() + a short resize.
+
+def _parse_sizes(spec: str) -> list:
+    # "thumb:320,feed:1080,full:2048"
+    sizes = []
+    for item in spec.split(","):
+        name, size = item.strip().split(":")
+        sizes.append((name, int(size)))
+    return sorted(sizes, key=lambda item: item[1], reverse=True)
+
+
+IMAGE_RENDITIONS = _parse_sizes(os.getenv("IMAGE_RENDITIONS", "thumb:320,feed:1080,full:2048"))
+# video posters are cut from a single extracted frame, see azure_blob.render_video_posters
+VIDEO_POSTER_RENDITIONS = _parse_sizes(os.getenv("VIDEO_POSTER_RENDITIONS", "thumb:320,poster:1280"))
+WEBP_QUALITY = int(os.getenv("WEBP_QUALITY", 80))
+JPEG_QUALITY = int(os.getenv("JPEG_QUALITY", 85))
+MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 80_000_000))
+
+
+def _fit(size: tuple, long_edge: int) -> tuple:
+    width, height = size
+    scale = min(1.0, long_edge / max(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _downscale(img: Image.Image, target: tuple) -> Image.Image:
+    if img.size == target:
+        return img
+    # integer box reduce does the bulk of the work cheaply, resize finishes
+    factor = min(img.width // target[0], img.height // target[1])
+    if factor >= 2:
+        img = img.reduce(factor)
+    return img.resize(target, Image.LANCZOS)
+
+
+def _flatten(img: Image.Image) -> Image.Image:
+    # JPEG has no alpha, put transparent images on white instead of black
+    if img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.getchannel("A"))
+        return background
+    return img.convert("RGB")
+
+
+def render_renditions(source_path: str, out_dir: str, sizes: list = None) -> dict:
+    """
+    Write <name>.webp and <name>.jpg for every size in `sizes` (IMAGE_RENDITIONS
+    by default) into out_dir. Returns {name: {"width", "height", "webp": path, "jpeg": path}}.
+    Raises ValueError for files Pillow can't decode. CPU bound, run it in an executor.
+    """
+    sizes = sizes or IMAGE_RENDITIONS
+    try:
+        img = Image.open(source_path)
+        if img.width * img.height > MAX_IMAGE_PIXELS:
+            raise ValueError(f"Image too large ({img.width}x{img.height}).")
+        # EXIF rotation swaps the edges, draft on the largest edge either way
+        largest = sizes[0][1]
+        img.draft("RGB", (largest, largest))
+        img.load()
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError("Invalid image file. " + str(e))
+
+    img = ImageOps.exif_transpose(img)
+    has_alpha = img.mode in ("RGBA", "LA") or (img.mode == "P" and "transparency" in img.info)
+    img = img.convert("RGBA" if has_alpha else "RGB")
+
+    renditions = {}
+    for name, long_edge in sizes:
+        img = _downscale(img, _fit(img.size, long_edge))
+        webp_path = os.path.join(out_dir, f"{name}.webp")
+        jpeg_path = os.path.join(out_dir, f"{name}.jpg")
+        img.save(webp_path, format="WEBP", quality=WEBP_QUALITY, method=4)
+        _flatten(img).save(jpeg_path, format="JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+        renditions[name] = {"width": img.width, "height": img.height, "webp": webp_path, "jpeg": jpeg_path}
+    return renditions
@@ -0,0 +1,88 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from .metrics import Counter, Gauge, Histogram
+
+
+# Event-loop lag monitor.
+# A background task sleeps for LOOP_LAG_INTERVAL and measures how late it
+# wakes up: anything past the interval is time the loop spent running some
+# other callback without yielding (sync db calls, Pillow, ffmpeg, requests...).
+#
+# With LOOP_MONITOR_DEBUG=true a watchdog thread also checks the task's
+# heartbeat; when the loop has been stuck for LOOP_BLOCK_THRESHOLD it prints
+# the loop thread's stack, which names the handler and the call holding it.
+# The probe then beats every LOOP_BLOCK_THRESHOLD / 2 (not LOOP_LAG_INTERVAL),
+# so any callback holding the loop for the threshold is caught while it runs.
+
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL", 0.5))
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD", 0.1))
+LOOP_MONITOR_DEBUG = os.getenv("LOOP_MONITOR_DEBUG", "false").lower() == "true"
+
+loop_lag = Histogram(
+    "event_loop_lag_seconds",
+    "How late the event loop woke the lag probe",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+loop_lag_last = Gauge("event_loop_lag_last_seconds", "Lag measured by the latest probe")
+loop_blocked = Counter("event_loop_blocked_total", "Probes that saw the loop blocked past LOOP_BLOCK_THRESHOLD")
+
+
+class LoopMonitor:
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, threshold: float = LOOP_BLOCK_THRESHOLD, debug: bool = LOOP_MONITOR_DEBUG):
+        self.interval = interval
+        self.threshold = threshold
+        self.debug = debug
+        # a beat can't be longer than half the threshold or short blocks slip between beats
+        self.beat = min(interval, threshold / 2) if debug else interval
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id = None
+        self._stopped = threading.Event()
+        self._watchdog = None
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        if self.debug and self._watchdog is None:
+            self._stopped.clear()
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.beat)
+            self._heartbeat = time.monotonic()
+            lag = max(0.0, loop.time() - started - self.beat)
+            loop_lag.observe(lag)
+            loop_lag_last.set(lag)
+            if lag >= self.threshold:
+                loop_blocked.inc()
+                print(f"Event loop blocked for {lag * 1000:.0f} ms")
+
+    def stop(self):
+        self._stopped.set()
+        self._watchdog = None
+
+    # watchdog thread: dump the loop thread's stack once per stall
+    def _watch(self):
+        reported = None
+        while not self._stopped.wait(self.threshold / 4):
+            heartbeat = self._heartbeat
+            # from the last beat: with beats every threshold/2 the loop only
+            # misses one for this long when a callback is holding it
+            stalled = time.monotonic() - heartbeat
+            if stalled < self.threshold or heartbeat == reported:
+                continue
+            frame = sys._current_frames().get(self._loop_thread_id)
+            if frame is None:
+                continue
+            reported = heartbeat
+            stack = "".join(traceback.format_stack(frame))
+            print(f"Event loop blocked for over {stalled * 1000:.0f} ms, loop thread is at:\n{stack}")
+
+
+loop_monitor = LoopMonitor()
@@ -0,0 +1,59 @@
+from typing import Optional
+from sqlalchemy import select, insert
+from sqlalchemy.exc import IntegrityError
+from .database import execute, commit, rollback
+from .metrics import Counter
+from .models.media import MediaObject
+
+
+# Content-addressed media. Every processed upload is recorded under the
+# SHA-256 of its raw bytes (hashed while it is spooled, see uploads.py) with
+# the URLs of what it produced. An upload whose hash is already known reuses
+# those URLs straight away: no rendering, no ffmpeg, no blob upload. Outputs
+# themselves live under folders named by their own hash (azure_blob.content_path),
+# so two different uploads that normalize to the same bytes share storage too.
+# Blobs are shared between posts this way, so deleting a post never deletes media.
+#
+# Works with both the sync and the async sessions (database.execute etc.).
+
+media_lookups = Counter("media_index_lookups_total", "Media index lookups by result")
+
+
+async def find_media(db, sha256: str) -> Optional[MediaObject]:
+    if not sha256:
+        return None
+    media = (await execute(
+        db,
+        select(MediaObject).where(MediaObject.sha256 == sha256)
+    )).scalars().first()
+    media_lookups.inc(result="hit" if media else "miss")
+    return media
+
+
+async def register_media(
+    db,
+    sha256: str,
+    output_sha256: str,
+    media_type: str,
+    size: int,
+    media_url: str,
+    thumbnail_url: Optional[str] = None,
+    playlist_url: Optional[str] = None,
+    media_renditions: Optional[dict] = None,
+):
+    """Record a processed upload. Commits; a concurrent insert of the same hash wins quietly."""
+    try:
+        await execute(db, insert(MediaObject).values(
+            sha256=sha256,
+            output_sha256=output_sha256,
+            media_type=media_type,
+            size=size,
+            media_url=media_url,
+            thumbnail_url=thumbnail_url,
+            playlist_url=playlist_url,
+            media_renditions=media_renditions,
+        ))
+        await commit(db)
+    except IntegrityError:
+        # same file processed twice at once, both results are identical
+        await rollback(db)
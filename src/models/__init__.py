@@ -3,4 +3,5 @@ from src.database import Base
 from .user import User,Follow
 from .post import post_likes, post_hashtags, Like, Comment, Post, Hashtag
 from .activity import Activity
+from .media import MediaObject
 # Import other models as needed
\ No newline at end of file
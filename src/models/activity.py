@@ -1,13 +1,16 @@
-from sqlalchemy import Column, Integer, String, DateTime
+from sqlalchemy import Column, Integer, String, DateTime, Index
 from datetime import datetime, timezone
 from src.database import Base
 
 class Activity(Base):
     __tablename__ = "activities"
+    __table_args__ = (
+        Index("ix_activities_username_timestamp", "username", "timestamp", "id"),
+    )
 
     id = Column(Integer, primary_key=True)
-    username = Column(String, nullable=False)  
-    timestamp = Column(DateTime, nullable=False, default=datetime.now(timezone.utc))
+    username = Column(String(255), nullable=False)
+    timestamp = Column(DateTime, nullable=False, default=lambda: datetime.now(timezone.utc))
 
     liked_post_id = Column(Integer)   # ID of liked post (if applicable)
     commented_post_id = Column(Integer)   # ID of commented post (if applicable)
@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, JSON, Index
+from datetime import datetime, timezone
+from src.database import Base
+
+# Index of processed uploads by content hash (see media_index.py).
+# A new upload whose raw bytes hash to a known sha256 reuses the row's
+# renditions instead of being transcoded and stored again.
+class MediaObject(Base):
+    __tablename__ = "media_objects"
+    __table_args__ = (
+        Index("ix_media_objects_output_sha256", "output_sha256"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    sha256 = Column(String(64), nullable=False, unique=True)  # raw upload bytes
+    output_sha256 = Column(String(64), nullable=False)  # normalized output (full JPEG / MP4)
+    media_type = Column(String(50), nullable=False)
+    size = Column(BigInteger, nullable=False, default=0)
+    media_url = Column(String, nullable=False)
+    thumbnail_url = Column(String, nullable=True)
+    playlist_url = Column(String, nullable=True)
+    media_renditions = Column(JSON, nullable=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
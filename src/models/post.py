@@ -1,9 +1,9 @@
 from requests import Session
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Table, func, Enum, Interval, Boolean, UniqueConstraint, NVARCHAR
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Text, Table, func, Enum, Interval, Boolean, UniqueConstraint, NVARCHAR, Index, JSON, Float
 from sqlalchemy.orm import relationship, backref
 from datetime import datetime, timezone, timedelta
 from src.database import Base
-from ..post.enums import VisibilityEnum, MediaTypeEnum
+from ..post.enums import VisibilityEnum, MediaTypeEnum, ProcessingStatusEnum
 
 # Many-to-Many Association Table (users ↔ Liked posts)
 post_likes = Table(
@@ -36,6 +36,9 @@ class Like(Base):
 # Comment Model
 class Comment(Base):
     __tablename__ = "comments"
+    __table_args__ = (
+        Index("ix_comments_post_id_created_at", "post_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     content = Column(NVARCHAR("max"))
@@ -51,6 +54,11 @@ class Comment(Base):
 # Post Model
 class Post(Base):
     __tablename__ = "posts"
+    __table_args__ = (
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        Index("ix_posts_author_id_created_at", "author_id", "created_at", "id"),
+        Index("ix_posts_processing_status", "processing_status"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     content = Column(NVARCHAR("max"))
@@ -62,12 +70,27 @@ class Post(Base):
     report_count = Column(Integer, default=0)
     views_count = Column(Integer, default=0)  # NEW
     save_count = Column(Integer, default=0)   # NEW
+    counters_updated_at = Column(DateTime(timezone=True), nullable=True)  # last counter increment, see post/counters.py
     category_of_content = Column(NVARCHAR(100), nullable=True)  # NEW
     media_type = Column(String(50), nullable=True)  # NEW
     author_id = Column(Integer, ForeignKey("users.id"))
     author = relationship("User", back_populates="posts")
     visibility = Column(Enum(VisibilityEnum), nullable=False, default="public")
     thumbnail = Column(String, nullable=True)
+    playlist_url = Column(String, nullable=True)  # HLS master playlist, videos only
+    # {"thumb" | "feed" | "full" (images) or "thumb" | "poster" (videos): {"width", "height", "webp", "jpeg"}}
+    media_renditions = Column(JSON, nullable=True)
+    media_sha256 = Column(String(64), nullable=True)  # raw upload hash, key into media_objects
+    # Videos are transcoded in the background (see post/processing.py)
+    processing_status = Column(Enum(ProcessingStatusEnum), nullable=False, default="ready", server_default="ready")
+    processing_attempts = Column(Integer, nullable=False, default=0, server_default="0")
+    processing_error = Column(NVARCHAR(500), nullable=True)
+    # the worker process transcoding it, so each app worker doesn't redo it
+    processing_claimed_by = Column(String(100), nullable=True)
+    processing_claimed_at = Column(DateTime(timezone=True), nullable=True)
+    processing_progress = Column(Float, nullable=True)  # 0..1 while transcoding, written by the claiming worker
+    # bumped by writes that change the cached post detail (see post/detail_cache.py)
+    detail_version = Column(Integer, nullable=False, default=0, server_default="0")
     # Many-to-Many Relationships
     liked_by_users = relationship("User", secondary="post_likes", back_populates="liked_posts")
     hashtags = relationship("Hashtag", secondary="post_hashtags", back_populates="posts")
@@ -79,14 +102,6 @@ class Post(Base):
     saved_by_users = relationship("UserSavedPosts", back_populates="post", cascade="all, delete")
     shared_by_users = relationship("UserSharedPosts", back_populates="post", cascade="all, delete")
     interactions = relationship("MediaInteraction", back_populates="media", cascade="all, delete-orphan")
-    def update_likes_and_comments_count(self, db: Session):
-        """Update likes_count and comments_count for the post."""
-        self.likes_count = (
-            db.query(func.count(Like.id)).filter(Like.post_id == self.id).scalar() or 0
-        )
-        self.comments_count = (
-            db.query(func.count(Comment.id)).filter(Comment.post_id == self.id).scalar() or 0
-        )
 
 # Hashtag Model
 class Hashtag(Base):
@@ -94,11 +109,30 @@ class Hashtag(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(NVARCHAR(255), unique=True)
+    # Maintained on post create / edit / delete (see post/hashtags.py)
+    post_count = Column(Integer, nullable=False, default=0, server_default="0")
+    public_post_count = Column(Integer, nullable=False, default=0, server_default="0")
 
     posts = relationship("Post", secondary="post_hashtags", back_populates="hashtags")
 
+# Materialized home timeline (fan-out on write).
+# One row per (follower, post) so the following feed is a range scan on user_id.
+class HomeTimeline(Base):
+    __tablename__ = "home_timelines"
+    __table_args__ = (
+        Index("ix_home_timelines_user_id_created_at", "user_id", "created_at", "post_id"),
+    )
+
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    post_id = Column(Integer, ForeignKey("posts.id", ondelete="CASCADE"), primary_key=True)
+    author_id = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
 class UserSavedPosts(Base):
     __tablename__ = "user_saved_posts"
+    __table_args__ = (
+        Index("ix_user_saved_posts_user_id_created_at", "user_id", "created_at", "id"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
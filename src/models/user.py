@@ -49,6 +49,8 @@ class User(Base):
 
     followers_count = Column(BigInteger, default=0)
     following_count = Column(BigInteger, default=0)
+    # set once the home timeline was built from the follow graph (post/timeline.py)
+    timeline_materialized_at = Column(DateTime(timezone=True), nullable=True)
     saved_posts = relationship("UserSavedPosts", back_populates="user", cascade="all, delete")
     # Relationship for sent shares (user who is sharing)
     shared_posts_sent = relationship("UserSharedPosts", foreign_keys="[UserSharedPosts.sender_user_id]", back_populates="sender", cascade="all, delete")
@@ -0,0 +1,128 @@
+import base64
+import enum
+import inspect
+import json
+import os
+from datetime import datetime
+from typing import Callable, Hashable, Optional
+from fastapi import HTTPException, status
+from sqlalchemy import and_, or_
+from .cache import TTLCache
+
+
+# Keyset (cursor) pagination on (created_at, id).
+# The cursor is an opaque token of the last row's sort key; the next page
+# seeks past it instead of OFFSET-ing and never needs a COUNT.
+
+def encode_cursor(created_at: datetime, row_id: int) -> str:
+    raw = json.dumps([created_at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return datetime.fromisoformat(created_at), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+
+def keyset_filter(created_column, id_column, cursor: str):
+    """Rows strictly after ``cursor`` in (created_at DESC, id DESC) order."""
+    created_at, row_id = decode_cursor(cursor)
+    return or_(
+        created_column < created_at,
+        and_(created_column == created_at, id_column < row_id),
+    )
+
+
+def keyset_order(created_column, id_column):
+    return created_column.desc(), id_column.desc()
+
+
+def keyset_page(rows: list, limit: int, key) -> tuple:
+    """
+    Trim a ``limit + 1`` fetch to one page.
+    ``key`` maps a row to its (created_at, id) sort key.
+    Returns (rows, next_cursor, has_more).
+    """
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    next_cursor = encode_cursor(*key(rows[-1])) if has_more and rows else None
+    return rows, next_cursor, has_more
+
+
+def cursor_response(limit: int, next_cursor: Optional[str], has_more: bool, data: list, data_key: str = "data") -> dict:
+    return {
+        "limit": limit,
+        "next_cursor": next_cursor,
+        "has_more": has_more,
+        data_key: data,
+    }
+
+
+# Total counts for offset-paginated responses.
+# count=estimate (default) answers from a TTL cache keyed by query shape and
+# viewer, count=exact runs the COUNT and refreshes the cache, count=none skips
+# it and returns null totals (infinite scroll does not need them).
+
+class CountModeEnum(str, enum.Enum):
+    estimate = "estimate"
+    exact = "exact"
+    none = "none"
+
+
+COUNT_CACHE_TTL = float(os.getenv("COUNT_CACHE_TTL", 30))
+COUNT_CACHE_SIZE = int(os.getenv("COUNT_CACHE_SIZE", 10000))
+
+
+class CountProvider:
+    def __init__(self, ttl: float = COUNT_CACHE_TTL, maxsize: int = COUNT_CACHE_SIZE):
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def count(self, shape: str, context: Hashable, compute: Callable, mode: CountModeEnum = CountModeEnum.estimate) -> Optional[int]:
+        """
+        Total for the query ``shape`` (e.g. "hashtag_posts") as seen by ``context``
+        (hashtag, viewer id, ...). ``compute`` runs the real COUNT, it may be a coroutine function.
+        """
+        mode = CountModeEnum(mode)
+        if mode == CountModeEnum.none:
+            return None
+        key = (shape, context)
+        if mode == CountModeEnum.estimate:
+            cached = self._cache.get(key)
+            if cached is not None:
+                return cached
+        total = compute()
+        if inspect.isawaitable(total):
+            total = await total
+        total = total or 0
+        self._cache.set(key, total)
+        return total
+
+    def invalidate(self, shape: str, context: Hashable = None):
+        if context is None:
+            self._cache.delete_where(lambda key: key[0] == shape)
+        else:
+            self._cache.delete((shape, context))
+
+    def invalidate_where(self, shape: str, predicate: Callable):
+        """Drop the ``shape`` totals whose context matches ``predicate``."""
+        self._cache.delete_where(lambda key: key[0] == shape and predicate(key[1]))
+
+
+count_provider = CountProvider()
+
+
+def page_count(total_count: Optional[int], limit: int) -> Optional[int]:
+    if total_count is None:
+        return None
+    return (total_count + limit - 1) // limit
+
+
+def past_last_page(total_count: Optional[int], offset: int, mode: CountModeEnum) -> bool:
+    """
+    Only trusted for an exact total. An estimate may be stale (a new post, like
+    or follow since it was cached), so the page query answers it instead.
+    """
+    return CountModeEnum(mode) == CountModeEnum.exact and total_count is not None and offset >= total_count
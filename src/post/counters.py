@@ -0,0 +1,206 @@
+import asyncio
+import os
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import and_, case, func, or_, select, update
+from sqlalchemy.orm import Session
+from ..database import SessionLocal, execute
+from ..models.post import Post, Like, Comment, UserSavedPosts, UserSharedPosts, MediaInteraction
+from ..models.report import ReportPost
+
+
+# Post counters are only ever changed by atomic SQL increments on write
+# (UPDATE posts SET likes_count = likes_count + 1), never recounted on read.
+# Concurrent likes on the same post can no longer lose updates.
+
+POST_COUNTERS = ("likes_count", "comments_count", "save_count", "share_count", "report_count", "views_count")
+
+# Optional in-memory delta buffer for hot posts
+COUNTER_BUFFER_ENABLED = os.getenv("POST_COUNTER_BUFFER", "false").lower() == "true"
+# Writes per post within one flush window before it is treated as hot
+HOT_POST_THRESHOLD = int(os.getenv("POST_COUNTER_HOT_THRESHOLD", 20))
+COUNTER_FLUSH_SECONDS = float(os.getenv("POST_COUNTER_FLUSH_SECONDS", 5))
+# In-app reconciliation interval, off by default: every gunicorn worker would
+# run it. Schedule `python -m src.post.counters` (cron) once per deployment
+# instead, or set this on a single-worker deployment.
+COUNTER_RECONCILE_SECONDS = float(os.getenv("POST_COUNTER_RECONCILE_SECONDS", 0))
+RECONCILE_BATCH_SIZE = 1000
+
+
+def bumped(column, delta: int):
+    """column + delta, never going below zero."""
+    value = func.coalesce(column, 0) + delta
+    if delta >= 0:
+        return value
+    return case((value < 0, 0), else_=value)
+
+
+def _counter_update(post_id: int, deltas: dict):
+    values = {field: bumped(getattr(Post, field), delta) for field, delta in deltas.items() if delta}
+    if values:
+        values["counters_updated_at"] = datetime.now(timezone.utc)
+        return update(Post).where(Post.id == post_id).values(values)
+
+
+def apply_post_counter_deltas(db: Session, post_id: int, deltas: dict):
+    statement = _counter_update(post_id, deltas)
+    if statement is not None:
+        db.execute(statement, execution_options={"synchronize_session": False})
+
+
+class PostCounterBuffer:
+    """
+    Accumulates counter deltas for hot posts in memory and applies them in
+    one UPDATE per post on flush. Posts below HOT_POST_THRESHOLD writes per
+    window are written through immediately.
+    """
+
+    def __init__(self, hot_threshold: int = HOT_POST_THRESHOLD):
+        self.hot_threshold = hot_threshold
+        self._lock = threading.Lock()
+        self._writes = defaultdict(int)
+        self._deltas = defaultdict(lambda: defaultdict(int))
+
+    def add(self, post_id: int, field: str, delta: int) -> bool:
+        """Buffer the delta if the post is hot. Returns False if the caller should write through."""
+        with self._lock:
+            self._writes[post_id] += 1
+            if self._writes[post_id] <= self.hot_threshold:
+                return False
+            self._deltas[post_id][field] += delta
+            return True
+
+    def drain(self) -> dict:
+        with self._lock:
+            deltas, self._deltas = self._deltas, defaultdict(lambda: defaultdict(int))
+            self._writes.clear()
+        return deltas
+
+    def flush(self, db: Session) -> int:
+        deltas = self.drain()
+        try:
+            for post_id, fields in deltas.items():
+                apply_post_counter_deltas(db, post_id, fields)
+            db.commit()
+        except Exception:
+            db.rollback()
+            # put the deltas back so the next flush retries them
+            with self._lock:
+                for post_id, fields in deltas.items():
+                    for field, delta in fields.items():
+                        self._deltas[post_id][field] += delta
+            raise
+        return len(deltas)
+
+
+counter_buffer = PostCounterBuffer()
+
+
+# increment / decrement a post counter (atomic, or buffered for hot posts)
+async def bump_post_counter(db: Session, post_id: int, field: str, delta: int = 1):
+    if field not in POST_COUNTERS:
+        raise ValueError(f"Unknown post counter: {field}")
+    if COUNTER_BUFFER_ENABLED and counter_buffer.add(post_id, field, delta):
+        return
+    statement = _counter_update(post_id, {field: delta})
+    if statement is not None:
+        await execute(db, statement, execution_options={"synchronize_session": False})
+
+
+def _count_of(column, post_id_column):
+    return (
+        select(func.count())
+        .select_from(column.table)
+        .where(post_id_column == Post.id)
+        .correlate(Post)
+        .scalar_subquery()
+    )
+
+
+def reconcile_post_counters(db: Session, post_ids: list[int] = None) -> int:
+    """
+    Recompute likes/comments/saves/shares/reports/views from their source
+    tables (views: one per media interaction, nothing else counts them), in
+    id-range batches so no single UPDATE holds locks on the whole table.
+    Only posts whose stored counts drifted are written. Returns how many.
+
+    Posts whose counters changed in the last two flush windows are skipped:
+    app workers may still hold buffered deltas for them (POST_COUNTER_BUFFER),
+    which would land on top of the recount. The next run picks them up.
+    """
+    values = {
+        "likes_count": _count_of(Like.id, Like.post_id),
+        "comments_count": _count_of(Comment.id, Comment.post_id),
+        "save_count": _count_of(UserSavedPosts.id, UserSavedPosts.saved_post_id),
+        "share_count": _count_of(UserSharedPosts.id, UserSharedPosts.post_id),
+        "report_count": _count_of(ReportPost.id, ReportPost.post_id),
+        "views_count": _count_of(MediaInteraction.id, MediaInteraction.post_id),
+    }
+    settled_before = datetime.now(timezone.utc) - timedelta(seconds=2 * COUNTER_FLUSH_SECONDS)
+    drifted = and_(
+        or_(Post.counters_updated_at.is_(None), Post.counters_updated_at < settled_before),
+        or_(*(func.coalesce(getattr(Post, field), -1) != count for field, count in values.items())),
+    )
+
+    if post_ids is not None:
+        result = db.execute(
+            update(Post).where(Post.id.in_(post_ids), drifted).values(values),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+        return result.rowcount
+
+    fixed = 0
+    max_id = db.execute(select(func.max(Post.id))).scalar() or 0
+    for start in range(0, max_id + 1, RECONCILE_BATCH_SIZE):
+        result = db.execute(
+            update(Post)
+            .where(Post.id >= start, Post.id < start + RECONCILE_BATCH_SIZE, drifted)
+            .values(values),
+            execution_options={"synchronize_session": False},
+        )
+        db.commit()
+        fixed += result.rowcount
+    return fixed
+
+
+def _flush_counter_buffer():
+    db = SessionLocal()
+    try:
+        counter_buffer.flush(db)
+    finally:
+        db.close()
+
+
+def _reconcile_all() -> int:
+    db = SessionLocal()
+    try:
+        # apply pending deltas first so they are not counted twice afterwards
+        if COUNTER_BUFFER_ENABLED:
+            counter_buffer.flush(db)
+        return reconcile_post_counters(db)
+    finally:
+        db.close()
+
+
+# background loop started with the app: flushes hot-post deltas and reconciles drift
+async def run_counter_jobs():
+    loop = asyncio.get_event_loop()
+    since_reconcile = 0.0
+    while True:
+        await asyncio.sleep(COUNTER_FLUSH_SECONDS)
+        since_reconcile += COUNTER_FLUSH_SECONDS
+        try:
+            if COUNTER_BUFFER_ENABLED:
+                await loop.run_in_executor(None, _flush_counter_buffer)
+            if COUNTER_RECONCILE_SECONDS and since_reconcile >= COUNTER_RECONCILE_SECONDS:
+                since_reconcile = 0.0
+                await loop.run_in_executor(None, _reconcile_all)
+        except Exception as e:
+            print(f"Post counter job failed: {e}")
+
+
+if __name__ == "__main__":
+    # python -m src.post.counters  -> one-off full reconciliation (the cron entry)
+    print(f"Reconciled post counters: {_reconcile_all()} posts corrected")
@@ -0,0 +1,111 @@
+import os
+import time
+from typing import Optional
+from sqlalchemy import select, update
+from ..cache import TTLCache
+from ..database import execute
+from ..models.post import Post
+from .enums import VisibilityEnum
+
+
+# Cache for the shared part of the post detail response (post body, counters,
+# first likes/comments pages). Viewer flags (is_liked / is_saved) are not
+# cached, they are layered on top per request.
+#
+# Every app worker has its own copy, so a hit is checked against the posts
+# row (one primary key lookup instead of the three queries of a rebuild):
+# - writes that change what the detail shows (comments, edits, processing)
+#   bump posts.detail_version in their transaction, a different version or
+#   a missing / no longer public row drops the entry
+# - counter-only events (likes, saves, shares, reports) just show up as
+#   different counters: the entry is marked dirty and keeps being served with
+#   the fresh counters for POST_DETAIL_DIRTY_GRACE seconds, so a viral post
+#   getting liked every few milliseconds is rebuilt at most once per grace
+#   period
+# invalidate_post_detail is the same-process fast path on top of that.
+
+POST_DETAIL_CACHE_SIZE = int(os.getenv("POST_DETAIL_CACHE_SIZE", 5000))
+POST_DETAIL_CACHE_TTL = float(os.getenv("POST_DETAIL_CACHE_TTL", 60))
+POST_DETAIL_DIRTY_GRACE = float(os.getenv("POST_DETAIL_DIRTY_GRACE", 2))
+
+
+# the columns a cached detail is checked against, besides detail_version
+_COUNTERS = ("likes_count", "comments_count", "share_count", "save_count", "views_count", "report_count")
+
+
+class _Entry:
+    __slots__ = ("pages", "version", "counters", "built_at", "dirty_since")
+
+    def __init__(self, version: int, counters: tuple):
+        self.pages = {}
+        self.version = version
+        self.counters = counters
+        self.built_at = time.monotonic()
+        self.dirty_since = None
+
+
+# post_id -> _Entry holding every cached (page, limit) of that post
+_details = TTLCache(maxsize=POST_DETAIL_CACHE_SIZE, ttl=POST_DETAIL_CACHE_TTL)
+
+
+def _counters(detail: dict) -> tuple:
+    return tuple(detail[name] for name in _COUNTERS)
+
+
+async def get_cached_detail(db, post_id: int, page: int, limit: int) -> Optional[dict]:
+    entry = _details.get(post_id)
+    if entry is None:
+        return None
+    if entry.dirty_since is not None and time.monotonic() - entry.dirty_since > POST_DETAIL_DIRTY_GRACE:
+        _details.delete(post_id)
+        return None
+    detail = entry.pages.get((page, limit))
+    if detail is None:
+        return None
+
+    row = (await execute(
+        db,
+        select(Post.detail_version, *(getattr(Post, name) for name in _COUNTERS))
+        .where(Post.id == post_id, Post.visibility == VisibilityEnum.public)
+    )).first()
+    if row is None or row[0] != entry.version:
+        _details.delete(post_id)
+        return None
+    counters = tuple(row[1:])
+    if counters != entry.counters:
+        if entry.dirty_since is None:
+            entry.dirty_since = time.monotonic()
+        detail = {**detail, **dict(zip(_COUNTERS, counters))}
+    return detail
+
+
+def cache_detail(post_id: int, page: int, limit: int, detail: dict, version: int):
+    entry = _details.get(post_id)
+    if entry is None or entry.dirty_since is not None or entry.version != version or entry.counters != _counters(detail):
+        entry = _Entry(version, _counters(detail))
+        _details.set(post_id, entry)
+    entry.pages[(page, limit)] = detail
+
+
+async def bump_detail_version(db, post_id: int):
+    """In the transaction that changes what the post detail shows, so every worker rebuilds it."""
+    await execute(
+        db,
+        update(Post).where(Post.id == post_id).values(detail_version=Post.detail_version + 1),
+        execution_options={"synchronize_session": False},
+    )
+
+
+# call after the commit that changed the post
+def invalidate_post_detail(post_id: int, counters_only: bool = False):
+    if not counters_only:
+        _details.delete(post_id)
+        return
+    entry = _details.get(post_id)
+    if entry is not None and entry.dirty_since is None:
+        entry.dirty_since = time.monotonic()
+
+
+def invalidate_post_details(post_ids):
+    for post_id in post_ids:
+        _details.delete(post_id)
@@ -7,4 +7,13 @@ class VisibilityEnum(str, enum.Enum):
 
 class MediaTypeEnum(str, enum.Enum):
     image = "image"
-    video = "video"
\ No newline at end of file
+    video = "video"
+
+class ProcessingStatusEnum(str, enum.Enum):
+    processing = "processing"  # raw upload stored, waiting for the media pipeline
+    ready = "ready"
+    failed = "failed"
+
+class FeedModeEnum(str, enum.Enum):
+    latest = "latest"  # chronological
+    for_you = "for_you"  # engagement ranked, see post/ranking.py
@@ -0,0 +1,240 @@
+import bisect
+import heapq
+import os
+import re
+import threading
+import time
+from typing import Optional
+from sqlalchemy import bindparam, case, event, func, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from ..cache import TTLCache
+from ..models.post import Post, Hashtag, post_hashtags, VisibilityEnum
+from .counters import bumped
+
+
+# Hashtag statistics and search.
+# Hashtag.post_count / public_post_count are kept up to date on post
+# create / edit / delete, and search-as-you-type is answered from an
+# in-memory sorted prefix index over the names instead of ILIKE + joins.
+# Count changes reach the index once the session that made them commits.
+
+# Reload the index from the hashtags table after this many seconds, so
+# writes made by other worker processes show up
+HASHTAG_INDEX_TTL = float(os.getenv("HASHTAG_INDEX_TTL", 300))
+
+HASHTAG_REGEX = re.compile(r"#(\w+)")
+# Hashtags are never deleted, so a name -> id mapping stays valid
+_hashtag_ids = TTLCache(maxsize=int(os.getenv("HASHTAG_ID_CACHE_SIZE", 50000)), ttl=3600)
+
+
+def _is_public(visibility) -> bool:
+    return visibility is not None and VisibilityEnum(visibility) == VisibilityEnum.public
+
+
+class HashtagPrefixIndex:
+    """
+    Sorted (lowercase name, name) keys of every hashtag with public posts.
+    A prefix lookup is two bisects; the matches are ranked by public post count.
+    """
+
+    def __init__(self, ttl: float = HASHTAG_INDEX_TTL):
+        self.ttl = ttl
+        self._keys = []
+        self._counts = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def load(self, db: Session):
+        rows = db.execute(
+            select(Hashtag.name, Hashtag.public_post_count).where(Hashtag.public_post_count > 0)
+        ).all()
+        keys = sorted((name.lower(), name) for name, _ in rows)
+        counts = {name: count for name, count in rows}
+        with self._lock:
+            self._keys, self._counts = keys, counts
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.load(db)
+
+    def adjust(self, name: str, public_delta: int):
+        with self._lock:
+            if self._loaded_at is None or not public_delta:
+                return  # picked up by the first load
+            count = self._counts.get(name, 0) + public_delta
+            key = (name.lower(), name)
+            if count > 0:
+                if name not in self._counts:
+                    bisect.insort(self._keys, key)
+                self._counts[name] = count
+            elif name in self._counts:
+                del self._counts[name]
+                index = bisect.bisect_left(self._keys, key)
+                if index < len(self._keys) and self._keys[index] == key:
+                    del self._keys[index]
+
+    def search(self, prefix: str, offset: int, limit: int) -> tuple:
+        """Returns (total matches, [(name, public_post_count), ...]) for one page."""
+        prefix = prefix.lower()
+        with self._lock:
+            lo = bisect.bisect_left(self._keys, (prefix,))
+            hi = bisect.bisect_left(self._keys, (prefix + chr(0x10FFFF),))
+            counts = self._counts
+            top = heapq.nsmallest(
+                offset + limit, self._keys[lo:hi], key=lambda key: (-counts[key[1]], key)
+            )
+            return hi - lo, [(name, counts[name]) for _, name in top[offset:]]
+
+
+hashtag_index = HashtagPrefixIndex()
+
+_PENDING_ADJUSTMENTS = "hashtag_index_adjustments"
+
+
+def _adjust_index_after_commit(db: Session, adjustments):
+    """Queue (name, public_delta) index changes on the session until its commit."""
+    session = getattr(db, "sync_session", db)
+    session.info.setdefault(_PENDING_ADJUSTMENTS, []).extend(adjustments)
+
+
+@event.listens_for(Session, "after_commit")
+def _apply_index_adjustments(session):
+    # savepoint commits fire this too, wait for the real one
+    if session.in_nested_transaction():
+        return
+    for name, public_delta in session.info.pop(_PENDING_ADJUSTMENTS, ()):
+        hashtag_index.adjust(name, public_delta)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_index_adjustments(session, transaction):
+    # rolled back or closed without a commit
+    if transaction.parent is None:
+        session.info.pop(_PENDING_ADJUSTMENTS, None)
+
+
+def extract_hashtags(content: Optional[str]) -> list[str]:
+    """Lowercased, de-duplicated tag names in order of appearance."""
+    if not content:
+        return []
+    return list(dict.fromkeys(match.lower() for match in HASHTAG_REGEX.findall(content)))
+
+
+def _select_hashtag_ids(db: Session, names: list[str]) -> dict:
+    rows = db.execute(select(Hashtag.id, Hashtag.name).where(Hashtag.name.in_(names))).all()
+    return {name.lower(): hashtag_id for hashtag_id, name in rows}
+
+
+# name -> id for every tag, inserting the missing ones in one batch
+def resolve_hashtags(db: Session, names: list[str]) -> dict:
+    ids = {}
+    missing = []
+    for name in names:
+        hashtag_id = _hashtag_ids.get(name)
+        if hashtag_id is None:
+            missing.append(name)
+        else:
+            ids[name] = hashtag_id
+    if not missing:
+        return ids
+
+    found = _select_hashtag_ids(db, missing)
+    # only cache rows that were already there, ours are not committed yet
+    for name, hashtag_id in found.items():
+        _hashtag_ids.set(name, hashtag_id)
+    ids.update(found)
+
+    for _ in range(3):
+        new_names = [name for name in missing if name not in ids]
+        if not new_names:
+            break
+        try:
+            with db.begin_nested():
+                db.execute(insert(Hashtag), [{"name": name} for name in new_names])
+        except IntegrityError:
+            # another request inserted some of them first, pick those up and retry the rest
+            pass
+        ids.update(_select_hashtag_ids(db, new_names))
+    return ids
+
+
+async def adjust_hashtag_counts(db: Session, hashtags: dict, total_delta: int, public_delta: int):
+    """``hashtags`` maps hashtag id -> name."""
+    values = {}
+    if total_delta:
+        values["post_count"] = bumped(Hashtag.post_count, total_delta)
+    if public_delta:
+        values["public_post_count"] = bumped(Hashtag.public_post_count, public_delta)
+    if not hashtags or not values:
+        return
+
+    db.execute(
+        update(Hashtag).where(Hashtag.id.in_(list(hashtags))).values(values),
+        execution_options={"synchronize_session": False},
+    )
+    if public_delta:
+        _adjust_index_after_commit(db, [(name, public_delta) for name in hashtags.values()])
+
+
+# link a new (flushed) post to its hashtags and count it, without committing
+async def link_post_hashtags(db: Session, post: Post):
+    ids = resolve_hashtags(db, extract_hashtags(post.content))
+    if not ids:
+        return
+    db.execute(post_hashtags.insert(), [{"post_id": post.id, "hashtag_id": hashtag_id} for hashtag_id in ids.values()])
+    public_delta = 1 if _is_public(post.visibility) else 0
+    await adjust_hashtag_counts(db, {hashtag_id: name for name, hashtag_id in ids.items()}, 1, public_delta)
+
+
+# a post and its hashtags were created (delta=1) or are being deleted (delta=-1)
+async def count_post_hashtags(db: Session, post: Post, delta: int):
+    public_delta = delta if _is_public(post.visibility) else 0
+    await adjust_hashtag_counts(db, {hashtag.id: hashtag.name for hashtag in post.hashtags}, delta, public_delta)
+
+
+# public counts follow the post's visibility when it is edited
+async def sync_hashtag_visibility(db: Session, post: Post, old_visibility):
+    was_public, is_public = _is_public(old_visibility), _is_public(post.visibility)
+    if was_public != is_public:
+        await adjust_hashtag_counts(db, {hashtag.id: hashtag.name for hashtag in post.hashtags}, 0, 1 if is_public else -1)
+
+
+# bulk version for deleting many posts at once (account deletion)
+async def uncount_posts_hashtags(db: Session, post_ids: list[int]):
+    if not post_ids:
+        return
+    rows = db.execute(
+        select(
+            Hashtag.id,
+            Hashtag.name,
+            func.count(func.distinct(post_hashtags.c.post_id)),
+            func.count(func.distinct(case((Post.visibility == VisibilityEnum.public, Post.id)))),
+        )
+        .join(post_hashtags, post_hashtags.c.hashtag_id == Hashtag.id)
+        .join(Post, Post.id == post_hashtags.c.post_id)
+        .where(post_hashtags.c.post_id.in_(post_ids))
+        .group_by(Hashtag.id, Hashtag.name)
+    ).all()
+    if not rows:
+        return
+
+    hashtags = Hashtag.__table__
+    total = hashtags.c.post_count - bindparam("b_total")
+    public = hashtags.c.public_post_count - bindparam("b_public")
+    db.execute(
+        hashtags.update()
+        .where(hashtags.c.id == bindparam("b_id"))
+        .values(
+            post_count=case((total < 0, 0), else_=total),
+            public_post_count=case((public < 0, 0), else_=public),
+        ),
+        [{"b_id": hashtag_id, "b_total": total_count, "b_public": public_count} for hashtag_id, _, total_count, public_count in rows],
+    )
+    _adjust_index_after_commit(db, [(name, -public_count) for _, name, _, public_count in rows])
+
+
+def search_hashtags(db: Session, query: str, offset: int, limit: int) -> tuple:
+    hashtag_index.ensure_loaded(db)
+    return hashtag_index.search(query.strip().lstrip("#"), offset, limit)
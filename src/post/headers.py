@@ -0,0 +1,70 @@
+import os
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..cache import TTLCache
+from ..database import execute
+from ..models.post import Post
+from ..models.user import User
+
+
+# Compact post headers for the write paths (like, comment, deletes).
+# Authorization and notifications only need the author and a few columns,
+# not the full detail payload, so those are served from a bounded LRU.
+# Every app worker has its own copy, so a hit is checked against the posts
+# row (posts.detail_version, bumped by edits and processing, see
+# detail_cache.py): a deleted post is a miss and a changed one is reloaded.
+
+POST_HEADER_CACHE_SIZE = int(os.getenv("POST_HEADER_CACHE_SIZE", 50000))
+POST_HEADER_CACHE_TTL = float(os.getenv("POST_HEADER_CACHE_TTL", 600))
+
+
+class PostHeader:
+    __slots__ = ("id", "author_id", "author_username", "visibility", "media", "thumbnail", "created_at", "version")
+
+    def __init__(self, id: int, author_id: Optional[int], author_username: Optional[str], visibility, media: Optional[str], thumbnail: Optional[str], created_at: Optional[datetime], version: int = 0):
+        self.id = id
+        self.author_id = author_id
+        self.author_username = author_username
+        self.visibility = visibility
+        self.media = media
+        self.thumbnail = thumbnail
+        self.created_at = created_at
+        self.version = version
+
+
+_headers = TTLCache(maxsize=POST_HEADER_CACHE_SIZE, ttl=POST_HEADER_CACHE_TTL)
+
+
+async def get_post_header(db: Session, post_id: int) -> Optional[PostHeader]:
+    header = _headers.get(post_id)
+    if header is not None:
+        version = (await execute(db, select(Post.detail_version).where(Post.id == post_id))).scalar()
+        if version == header.version:
+            return header
+        _headers.delete(post_id)
+        if version is None:
+            return None
+
+    row = (await execute(
+        db,
+        select(Post.id, Post.author_id, User.username, Post.visibility, Post.media, Post.thumbnail, Post.created_at, Post.detail_version)
+        .outerjoin(User, User.id == Post.author_id)
+        .where(Post.id == post_id)
+    )).first()
+    if row is None:
+        return None
+    header = PostHeader(*row)
+    _headers.set(post_id, header)
+    return header
+
+
+# call after the commit that edited or deleted the post
+def invalidate_post_header(post_id: int):
+    _headers.delete(post_id)
+
+
+def invalidate_post_headers(post_ids):
+    for post_id in post_ids:
+        _headers.delete(post_id)
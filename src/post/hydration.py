@@ -0,0 +1,71 @@
+from typing import Iterable, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..database import execute
+from ..models.post import Post, Hashtag, post_hashtags, Like, UserSavedPosts
+from ..models.user import User
+
+
+# Shared hydration stage for every post listing.
+# Takes one page of posts plus the viewer and answers username, hashtags
+# and is_liked / is_saved with a fixed number of IN (...) queries,
+# whatever the page size.
+
+def post_to_dict(post: Post) -> dict:
+    """Column values of a post, without ORM state or lazy relationships."""
+    return {column.key: getattr(post, column.key) for column in Post.__table__.columns}
+
+
+async def hydrate_posts(db: Session, posts: Iterable[Post], viewer_id: Optional[int] = None) -> list[dict]:
+    posts = list(posts)
+    if not posts:
+        return []
+
+    post_ids = [post.id for post in posts]
+    author_ids = {post.author_id for post in posts if post.author_id is not None}
+
+    usernames = {}
+    if author_ids:
+        usernames = dict((await execute(
+            db, select(User.id, User.username).where(User.id.in_(author_ids))
+        )).all())
+
+    hashtags = {post_id: [] for post_id in post_ids}
+    for post_id, name in (await execute(
+        db,
+        select(post_hashtags.c.post_id, Hashtag.name)
+        .join(Hashtag, Hashtag.id == post_hashtags.c.hashtag_id)
+        .where(post_hashtags.c.post_id.in_(post_ids))
+    )).all():
+        hashtags[post_id].append(name)
+
+    liked_ids, saved_ids = set(), set()
+    if viewer_id is not None:
+        liked_ids = set((await execute(
+            db, select(Like.post_id).where(Like.user_id == viewer_id, Like.post_id.in_(post_ids))
+        )).scalars())
+        saved_ids = set((await execute(
+            db,
+            select(UserSavedPosts.saved_post_id).where(
+                UserSavedPosts.user_id == viewer_id,
+                UserSavedPosts.saved_post_id.in_(post_ids),
+            )
+        )).scalars())
+
+    result = []
+    for post in posts:
+        post_dict = post_to_dict(post)
+        post_dict["username"] = usernames.get(post.author_id)
+        post_dict["hashtags"] = hashtags[post.id]
+        post_dict["is_liked"] = post.id in liked_ids
+        post_dict["is_saved"] = post.id in saved_ids
+        result.append(post_dict)
+    return result
+
+
+async def hydrate_post_ids(db: Session, post_ids: list[int], viewer_id: Optional[int] = None) -> list[dict]:
+    """Load and hydrate posts by id, keeping the order of ``post_ids``."""
+    if not post_ids:
+        return []
+    posts = {post.id: post for post in (await execute(db, select(Post).where(Post.id.in_(post_ids)))).scalars()}
+    return await hydrate_posts(db, [posts[post_id] for post_id in post_ids if post_id in posts], viewer_id)
@@ -0,0 +1,40 @@
+from ..pagination import count_provider
+
+
+# Cached listing totals (pagination.count_provider) affected by each write,
+# dropped after the write commits so the next count=estimate recounts.
+# Totals seen by many viewers (hashtag pages, followers' timelines) are
+# dropped for the whole shape, the next read of each recounts once.
+
+def invalidate_author_counts(author_id: int):
+    """A post was created, deleted or changed visibility."""
+    count_provider.invalidate("user_posts", (author_id, True))
+    count_provider.invalidate("user_posts", (author_id, False))
+    count_provider.invalidate("public_posts", author_id)
+    count_provider.invalidate("private_posts", author_id)
+    count_provider.invalidate("all_posts")
+    count_provider.invalidate("visibility_posts")
+    count_provider.invalidate("hashtag_posts")
+    count_provider.invalidate("friends_posts")
+    count_provider.invalidate("home_timeline")
+
+
+def invalidate_like_counts(post_id: int, user_id: int):
+    count_provider.invalidate("post_likes", post_id)
+    count_provider.invalidate("liked_posts", user_id)
+
+
+def invalidate_comment_counts(post_id: int):
+    count_provider.invalidate("post_comments", post_id)
+
+
+def invalidate_save_counts(user_id: int):
+    count_provider.invalidate("saved_posts", user_id)
+
+
+def invalidate_follow_counts(follower_id: int):
+    """The follower's view of friends-only posts and their timeline changed."""
+    count_provider.invalidate("home_timeline", follower_id)
+    count_provider.invalidate("friends_posts", follower_id)
+    count_provider.invalidate("visibility_posts", ("friends", follower_id))
+    count_provider.invalidate_where("hashtag_posts", lambda context: context[1] == follower_id)
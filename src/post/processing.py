@@ -0,0 +1,320 @@
+import asyncio
+import os
+import socket
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from sqlalchemy import select, update, or_
+from ..database import AsyncSessionLocal, execute, commit
+from ..metrics import Counter, Gauge, Histogram
+from ..models.post import Post
+from ..uploads import SpooledUpload, file_sha256
+from ..media_index import find_media, register_media
+from ..transcoder import TRANSCODE_TIMEOUT
+from .enums import ProcessingStatusEnum
+from .detail_cache import invalidate_post_detail
+from .headers import invalidate_post_header
+from .. import azure_blob
+
+
+# Video posts are created straight away in the `processing` state with the raw
+# upload stored in blob storage (post.media points at it meanwhile). A fixed
+# pool of workers transcodes, makes the thumbnail, uploads the results and
+# flips the post to `ready`. Failed jobs are retried with backoff and end up
+# `failed` after VIDEO_MAX_ATTEMPTS. Posts still `processing` at startup
+# (e.g. after a deploy) are picked up again from the raw blob.
+# Before transcoding, the raw upload's hash is looked up in the media index;
+# a video that was already processed is reused without running ffmpeg.
+# Every app worker runs a pipeline and recovers the same posts, so a job is
+# claimed in the posts row first (processing_claimed_by/_at) and only the
+# claiming worker transcodes it or changes its status. A claim older than
+# VIDEO_CLAIM_SECONDS is from a worker that died and can be taken over.
+# Transcode progress is written to processing_progress at most every
+# VIDEO_PROGRESS_SECONDS so /posts/status can read it from any worker.
+
+VIDEO_WORKERS = int(os.getenv("VIDEO_WORKERS", 2))
+VIDEO_MAX_ATTEMPTS = int(os.getenv("VIDEO_MAX_ATTEMPTS", 3))
+VIDEO_RETRY_SECONDS = float(os.getenv("VIDEO_RETRY_SECONDS", 30))
+VIDEO_CLAIM_SECONDS = float(os.getenv("VIDEO_CLAIM_SECONDS", max(1800, 2 * TRANSCODE_TIMEOUT)))
+VIDEO_PROGRESS_SECONDS = float(os.getenv("VIDEO_PROGRESS_SECONDS", 2))
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+jobs_total = Counter("video_jobs_total", "Finished video processing attempts by result")
+job_seconds = Histogram(
+    "video_job_seconds",
+    "Time to transcode and upload one video",
+    buckets=(5, 10, 30, 60, 120, 300, 600, 1200),
+)
+
+
+class VideoJob:
+    def __init__(self, post_id: int, raw_url: str, path: Optional[str] = None, size: int = 0, extension: str = "mp4", sha256: Optional[str] = None):
+        self.post_id = post_id
+        self.raw_url = raw_url
+        # local copy of the raw upload, if this process still has it
+        self.path = path
+        self.size = size
+        self.extension = extension
+        self.sha256 = sha256
+        self.progress_written_at = 0.0
+        self.progress_write: Optional[asyncio.Task] = None
+
+    def cleanup(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+        self.path = None
+
+
+class VideoPipeline:
+    def __init__(self, workers: int = VIDEO_WORKERS, max_attempts: int = VIDEO_MAX_ATTEMPTS, retry_seconds: float = VIDEO_RETRY_SECONDS):
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_seconds = retry_seconds
+        self.queue: Optional[asyncio.Queue] = None
+        self.active = 0
+        self.pending = set()  # post ids queued, running or waiting to retry
+        self._retries = set()
+        self._hash_locks = {}  # raw sha256 -> [lock, jobs using it], one transcode per distinct video at a time
+        Gauge("video_jobs_queued", "Video jobs waiting for a worker", collect=lambda: [({}, self.queue.qsize() if self.queue else 0)])
+        Gauge("video_jobs_active", "Video jobs being processed", collect=lambda: [({}, self.active)])
+
+    def submit(self, job: VideoJob):
+        if self.queue is None:
+            # pipeline not running (e.g. scripts), recovery picks it up on the next start
+            print(f"Video pipeline not running, post {job.post_id} stays processing")
+            job.cleanup()
+            return
+        if job.post_id in self.pending:
+            job.cleanup()
+            return
+        self.pending.add(job.post_id)
+        self.queue.put_nowait(job)
+
+    async def run(self):
+        """Started with the app; runs until cancelled."""
+        self.queue = asyncio.Queue()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        try:
+            await self._recover()
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers + list(self._retries):
+                task.cancel()
+            self.queue = None
+            self.pending.clear()
+
+    async def _recover(self):
+        async with AsyncSessionLocal() as db:
+            rows = (await execute(
+                db,
+                select(Post.id, Post.media, Post.media_sha256).where(Post.processing_status == ProcessingStatusEnum.processing)
+            )).all()
+        for post_id, raw_url, sha256 in rows:
+            if raw_url:
+                self.submit(VideoJob(post_id, raw_url, extension=raw_url.rsplit(".", 1)[-1], sha256=sha256))
+        if rows:
+            print(f"Video pipeline: resumed {len(rows)} unfinished posts")
+
+    async def _worker(self):
+        while True:
+            job = await self.queue.get()
+            self.active += 1
+            try:
+                if not await self._attempt(job):
+                    self.pending.discard(job.post_id)
+            except Exception as e:
+                print(f"Video pipeline: unexpected error on post {job.post_id}: {e}")
+                job.cleanup()
+                self.pending.discard(job.post_id)
+            finally:
+                self.active -= 1
+                self.queue.task_done()
+
+    async def _attempt(self, job: VideoJob) -> bool:
+        """One try at the job; True when it was scheduled for a retry."""
+        if not job.sha256:
+            return await self._process(job)
+        entry = self._hash_locks.setdefault(job.sha256, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            # an identical upload being transcoded right now is reused once it's done
+            async with entry[0]:
+                return await self._process(job)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._hash_locks[job.sha256]
+
+    async def _claim(self, post_id: int) -> bool:
+        now = datetime.now(timezone.utc)
+        async with AsyncSessionLocal() as db:
+            result = await execute(
+                db,
+                update(Post)
+                .where(
+                    Post.id == post_id,
+                    Post.processing_status == ProcessingStatusEnum.processing,
+                    or_(
+                        Post.processing_claimed_by == WORKER_ID,
+                        Post.processing_claimed_at.is_(None),
+                        Post.processing_claimed_at < now - timedelta(seconds=VIDEO_CLAIM_SECONDS),
+                    ),
+                )
+                .values(processing_claimed_by=WORKER_ID, processing_claimed_at=now, processing_progress=0.0)
+            )
+            await commit(db)
+        return result.rowcount > 0
+
+    def _report_progress(self, job: VideoJob, fraction: float):
+        # called for every ffmpeg progress block, only some become a write
+        now = time.monotonic()
+        if now - job.progress_written_at < VIDEO_PROGRESS_SECONDS or (job.progress_write and not job.progress_write.done()):
+            return
+        job.progress_written_at = now
+        job.progress_write = asyncio.create_task(self._write_progress(job.post_id, fraction))
+
+    async def _write_progress(self, post_id: int, fraction: float):
+        try:
+            async with AsyncSessionLocal() as db:
+                await execute(
+                    db,
+                    update(Post)
+                    .where(
+                        Post.id == post_id,
+                        Post.processing_status == ProcessingStatusEnum.processing,
+                        Post.processing_claimed_by == WORKER_ID,
+                    )
+                    .values(processing_progress=round(fraction, 3))
+                )
+                await commit(db)
+        except Exception as e:
+            print(f"Video pipeline: progress update for post {post_id} failed: {e}")
+
+    async def _process(self, job: VideoJob) -> bool:
+        claimed = await self._claim(job.post_id)
+        async with AsyncSessionLocal() as db:
+            attempts = (await execute(
+                db, select(Post.processing_attempts).where(Post.id == job.post_id)
+            )).scalar()
+            media = await find_media(db, job.sha256) if claimed else None
+        if attempts is None:
+            # post deleted while waiting
+            job.cleanup()
+            await self._delete_raw(job.raw_url)
+            return False
+        if not claimed:
+            # done already, or another worker has it
+            job.cleanup()
+            return False
+        if media:
+            # the same video was processed meanwhile (or for another post)
+            return await self._finish(job, attempts, media.media_url, media.thumbnail_url, media.playlist_url, media.media_renditions)
+
+        started = time.perf_counter()
+        try:
+            if not job.path:
+                job.path = tempfile.NamedTemporaryFile(delete=False, suffix=f".{job.extension}").name
+                await azure_blob.download_blob_to_path(job.raw_url, job.path)
+                job.size = os.path.getsize(job.path)
+            if not job.sha256:
+                # posts from before the media index
+                loop = asyncio.get_running_loop()
+                job.sha256 = await loop.run_in_executor(None, file_sha256, job.path)
+            upload = SpooledUpload(job.path, "video", job.extension, job.size, "", job.sha256)
+            media_url, thumbnail_url, playlist_url, posters, output_sha256 = await azure_blob.publish_video(
+                upload,
+                on_progress=lambda fraction, speed: self._report_progress(job, fraction),
+            )
+        except Exception as e:
+            attempts += 1
+            jobs_total.inc(result="error")
+            failed = attempts >= self.max_attempts
+            await self._set_status(
+                job.post_id,
+                ProcessingStatusEnum.failed if failed else ProcessingStatusEnum.processing,
+                processing_attempts=attempts,
+                processing_error=str(e)[:500],
+                # kept while waiting to retry, the claim is refreshed then
+                **({"processing_claimed_by": None, "processing_claimed_at": None, "processing_progress": None} if failed else {}),
+            )
+            if failed:
+                print(f"Video pipeline: post {job.post_id} failed after {attempts} attempts: {e}")
+                job.cleanup()
+                return False
+            delay = self.retry_seconds * 2 ** (attempts - 1)
+            print(f"Video pipeline: post {job.post_id} attempt {attempts} failed, retrying in {delay:.0f}s: {e}")
+            self._retry_later(job, delay)
+            return True
+
+        job_seconds.observe(time.perf_counter() - started)
+        async with AsyncSessionLocal() as db:
+            await register_media(
+                db, job.sha256, output_sha256, "video", job.size,
+                media_url, thumbnail_url, playlist_url, posters,
+            )
+        return await self._finish(job, attempts, media_url, thumbnail_url, playlist_url, posters)
+
+    async def _finish(self, job: VideoJob, attempts: int, media_url: str, thumbnail_url: str, playlist_url: str, posters: dict) -> bool:
+        jobs_total.inc(result="ready")
+        # outputs are shared through the media index, kept even if the post is gone
+        await self._set_status(
+            job.post_id,
+            ProcessingStatusEnum.ready,
+            media=media_url,
+            thumbnail=thumbnail_url,
+            playlist_url=playlist_url,
+            media_renditions=posters,
+            media_sha256=job.sha256,
+            processing_attempts=attempts + 1,
+            processing_error=None,
+            processing_claimed_by=None,
+            processing_claimed_at=None,
+            processing_progress=None,
+        )
+        job.cleanup()
+        await self._delete_raw(job.raw_url)
+        return False
+
+    async def _delete_raw(self, raw_url: str):
+        # raw blobs are content-addressed, another post may still be waiting on the same one
+        async with AsyncSessionLocal() as db:
+            waiting = (await execute(
+                db,
+                select(Post.id).where(Post.media == raw_url, Post.processing_status == ProcessingStatusEnum.processing).limit(1)
+            )).first()
+        if waiting is None:
+            await azure_blob.delete_blob_url(raw_url)
+
+    async def _set_status(self, post_id: int, status: ProcessingStatusEnum, **values) -> bool:
+        """Only from `processing` and only by the claiming worker; False when that no longer holds."""
+        async with AsyncSessionLocal() as db:
+            result = await execute(
+                db,
+                update(Post)
+                .where(
+                    Post.id == post_id,
+                    Post.processing_status == ProcessingStatusEnum.processing,
+                    Post.processing_claimed_by == WORKER_ID,
+                )
+                .values(processing_status=status, detail_version=Post.detail_version + 1, **values)
+            )
+            await commit(db)
+        invalidate_post_detail(post_id)
+        invalidate_post_header(post_id)
+        return result.rowcount > 0
+
+    def _retry_later(self, job: VideoJob, delay: float):
+        async def retry():
+            await asyncio.sleep(delay)
+            if self.queue is not None:
+                self.queue.put_nowait(job)
+            else:
+                job.cleanup()
+
+        task = asyncio.create_task(retry())
+        self._retries.add(task)
+        task.add_done_callback(self._retries.discard)
+
+
+video_pipeline = VideoPipeline()
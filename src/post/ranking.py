@@ -0,0 +1,253 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import numpy as np
+from sqlalchemy import case, func, select
+from sqlalchemy.orm import Session
+from ..cache import TTLCache
+from ..database import execute
+from ..models.post import Post, MediaInteraction, post_likes, VisibilityEnum
+from ..models.user import Follow
+
+
+# "For You" feed ranking.
+# A candidate pool of recent public posts is loaded once into NumPy arrays
+# (counters + aggregated media_interactions) and cached; each viewer's feed
+# is then scored in one vectorized pass with their follow/like affinity.
+
+# Candidate pool: newest public posts within the window
+FOR_YOU_POOL_SIZE = int(os.getenv("FOR_YOU_POOL_SIZE", 5000))
+FOR_YOU_POOL_DAYS = int(os.getenv("FOR_YOU_POOL_DAYS", 14))
+FOR_YOU_POOL_TTL = float(os.getenv("FOR_YOU_POOL_TTL", 120))
+# Ranked feed per viewer, so paging through it stays stable
+FOR_YOU_RANK_TTL = float(os.getenv("FOR_YOU_RANK_TTL", 60))
+
+# Scoring weights
+RECENCY_HALF_LIFE_HOURS = float(os.getenv("FOR_YOU_HALF_LIFE_HOURS", 24))
+LIKE_WEIGHT = 1.0
+COMMENT_WEIGHT = 2.0
+SAVE_WEIGHT = 3.0
+SHARE_WEIGHT = 3.0
+COMPLETION_WEIGHT = 1.5
+SKIP_WEIGHT = 1.0
+FOLLOW_BOOST = 1.0
+LIKED_AUTHOR_BOOST = 0.3
+# Each further post by the same author in the feed keeps this share of its score
+DIVERSITY_DECAY = 0.7
+# Posts the viewer already skipped keep this share of their score
+SELF_SKIP_PENALTY = 0.2
+
+# Smoothing so new posts with a handful of views are not all 0% or 100%
+VIEWS_PRIOR = 20
+INTERACTIONS_PRIOR = 5
+COMPLETION_PRIOR = 0.5
+SKIP_PRIOR = 0.2
+
+
+class CandidatePool:
+    """Column arrays for the candidate posts, aligned by index."""
+
+    def __init__(self, rows: list, interactions: dict):
+        size = len(rows)
+        self.post_ids = np.fromiter((row.id for row in rows), dtype=np.int64, count=size)
+        self.author_ids = np.fromiter((row.author_id or 0 for row in rows), dtype=np.int64, count=size)
+        self.created_ts = np.fromiter((_timestamp(row.created_at) for row in rows), dtype=np.float64, count=size)
+
+        def counter(name):
+            return np.fromiter((getattr(row, name) or 0 for row in rows), dtype=np.float64, count=size)
+
+        views = counter("views_count")
+        # every interaction is at least one view, even if views_count lags behind
+        plays = np.zeros(size)
+        watched = np.zeros(size)
+        length = np.zeros(size)
+        skipped = np.zeros(size)
+        for i, post_id in enumerate(self.post_ids.tolist()):
+            stats = interactions.get(post_id)
+            if stats:
+                plays[i], watched[i], length[i], skipped[i] = stats
+        impressions = np.maximum(views, plays) + VIEWS_PRIOR
+
+        self.like_rate = counter("likes_count") / impressions
+        self.comment_rate = counter("comments_count") / impressions
+        self.save_rate = counter("save_count") / impressions
+        self.share_rate = counter("share_count") / impressions
+
+        completion = np.clip(np.divide(watched, length, out=np.zeros(size), where=length > 0), 0.0, 1.0)
+        self.completion = (completion * plays + COMPLETION_PRIOR * INTERACTIONS_PRIOR) / (plays + INTERACTIONS_PRIOR)
+        self.skip_rate = (skipped + SKIP_PRIOR * INTERACTIONS_PRIOR) / (plays + INTERACTIONS_PRIOR)
+
+        self.built_at = time.time()
+
+    def __len__(self) -> int:
+        return len(self.post_ids)
+
+
+def _timestamp(value: Optional[datetime]) -> float:
+    if value is None:
+        return 0.0
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+
+async def build_candidate_pool(db: Session) -> CandidatePool:
+    since = datetime.now(timezone.utc) - timedelta(days=FOR_YOU_POOL_DAYS)
+    rows = (await execute(
+        db,
+        select(
+            Post.id, Post.author_id, Post.created_at, Post.views_count, Post.likes_count,
+            Post.comments_count, Post.save_count, Post.share_count,
+        )
+        .where(Post.visibility == VisibilityEnum.public, Post.created_at >= since)
+        .order_by(Post.created_at.desc())
+        .limit(FOR_YOU_POOL_SIZE)
+    )).all()
+
+    interactions = {}
+    if rows:
+        post_ids = [row.id for row in rows]
+        for i in range(0, len(post_ids), 1000):
+            for post_id, plays, watched, length, skipped in (await execute(
+                db,
+                select(
+                    MediaInteraction.post_id,
+                    func.count(),
+                    func.sum(func.coalesce(MediaInteraction.watched_time, 0)),
+                    func.sum(func.coalesce(MediaInteraction.video_length, 0)),
+                    func.sum(case((MediaInteraction.skipped == True, 1), else_=0)),
+                )
+                .where(MediaInteraction.post_id.in_(post_ids[i:i + 1000]))
+                .group_by(MediaInteraction.post_id)
+            )).all():
+                interactions[post_id] = (plays, watched or 0, length or 0, skipped or 0)
+
+    return CandidatePool(rows, interactions)
+
+
+_pool_cache = TTLCache(maxsize=1, ttl=FOR_YOU_POOL_TTL)
+_pool_lock = None
+_ranked_cache = TTLCache(maxsize=10000, ttl=FOR_YOU_RANK_TTL)
+
+
+async def get_candidate_pool(db: Session) -> CandidatePool:
+    global _pool_lock
+    pool = _pool_cache.get("pool")
+    if pool is None:
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            # another request may have rebuilt it while we waited
+            pool = _pool_cache.get("pool")
+            if pool is None:
+                pool = await build_candidate_pool(db)
+                _pool_cache.set("pool", pool)
+    return pool
+
+
+async def _viewer_affinity(db: Session, viewer_id: int):
+    followed = np.array(
+        (await execute(db, select(Follow.following_id).where(Follow.follower_id == viewer_id))).scalars().all(),
+        dtype=np.int64,
+    )
+    liked_authors = (await execute(
+        db,
+        select(Post.author_id, func.count())
+        .join(post_likes, post_likes.c.post_id == Post.id)
+        .where(post_likes.c.user_id == viewer_id)
+        .group_by(Post.author_id)
+    )).all()
+    skipped = np.array(
+        (await execute(
+            db,
+            select(MediaInteraction.post_id)
+            .where(MediaInteraction.user_id == viewer_id, MediaInteraction.skipped == True)
+            .distinct()
+        )).scalars().all(),
+        dtype=np.int64,
+    )
+    return followed, dict(liked_authors), skipped
+
+
+def diversify(scores: np.ndarray, author_ids: np.ndarray) -> np.ndarray:
+    """Decay each author's n-th best post by DIVERSITY_DECAY ** n."""
+    if not len(scores):
+        return scores
+    order = np.lexsort((-scores, author_ids))  # by author, best first
+    sorted_authors = author_ids[order]
+    group_start = np.r_[True, sorted_authors[1:] != sorted_authors[:-1]]
+    start_index = np.maximum.accumulate(np.where(group_start, np.arange(len(order)), 0))
+    occurrence = np.empty(len(order), dtype=np.int64)
+    occurrence[order] = np.arange(len(order)) - start_index
+    return scores * DIVERSITY_DECAY ** occurrence
+
+
+def score_pool(pool: CandidatePool, viewer_id: int, followed: np.ndarray, liked_authors: dict, skipped: np.ndarray, now: float = None) -> np.ndarray:
+    now = time.time() if now is None else now
+    age_hours = np.maximum(now - pool.created_ts, 0.0) / 3600.0
+    recency = np.exp2(-age_hours / RECENCY_HALF_LIFE_HOURS)
+
+    quality = (
+        1.0
+        + LIKE_WEIGHT * pool.like_rate
+        + COMMENT_WEIGHT * pool.comment_rate
+        + SAVE_WEIGHT * pool.save_rate
+        + SHARE_WEIGHT * pool.share_rate
+        + COMPLETION_WEIGHT * pool.completion
+        - SKIP_WEIGHT * pool.skip_rate
+    )
+    quality = np.maximum(quality, 0.05)
+
+    affinity = FOLLOW_BOOST * np.isin(pool.author_ids, followed)
+    if liked_authors:
+        authors = np.fromiter(liked_authors.keys(), dtype=np.int64)
+        like_counts = np.fromiter(liked_authors.values(), dtype=np.float64)
+        order = np.argsort(authors)
+        authors, like_counts = authors[order], like_counts[order]
+        position = np.clip(np.searchsorted(authors, pool.author_ids), 0, len(authors) - 1)
+        matched = authors[position] == pool.author_ids
+        affinity = affinity + LIKED_AUTHOR_BOOST * np.log1p(np.where(matched, like_counts[position], 0.0))
+
+    scores = recency * quality * (1.0 + affinity)
+    scores = np.where(np.isin(pool.post_ids, skipped), scores * SELF_SKIP_PENALTY, scores)
+    # own posts are not recommended back
+    scores = np.where(pool.author_ids == viewer_id, -np.inf, scores)
+    return diversify(scores, pool.author_ids)
+
+
+async def rank_for_viewer(db: Session, viewer_id: int) -> list[int]:
+    """Ranked post ids for the viewer, cached for FOR_YOU_RANK_TTL."""
+    ranked = _ranked_cache.get(viewer_id)
+    if ranked is not None:
+        return ranked
+
+    pool = await get_candidate_pool(db)
+    if not len(pool):
+        return []
+    scores = score_pool(pool, viewer_id, *await _viewer_affinity(db, viewer_id))
+    order = np.argsort(-scores, kind="stable")
+    order = order[np.isfinite(scores[order])]
+    ranked = pool.post_ids[order].tolist()
+    _ranked_cache.set(viewer_id, ranked)
+    return ranked
+
+
+async def prune_ranking(db: Session, ranked: list, post_ids: list) -> int:
+    """
+    Remove those of ``post_ids`` that went private or were deleted since the
+    pool was built from ``ranked`` (in place, so the cached ranking keeps the
+    change and later pages stay consistent). Returns how many were removed.
+    """
+    post_ids = list(post_ids)
+    public = set()
+    for i in range(0, len(post_ids), 1000):
+        public.update((await execute(
+            db,
+            select(Post.id).where(Post.id.in_(post_ids[i:i + 1000]), Post.visibility == VisibilityEnum.public)
+        )).scalars())
+    gone = set(post_ids) - public
+    if gone:
+        ranked[:] = [post_id for post_id in ranked if post_id not in gone]
+    return len(gone)
@@ -1,7 +1,7 @@
 from pydantic import BaseModel
 from typing import List, Optional, Union
 from datetime import datetime
-from .enums import VisibilityEnum, MediaTypeEnum
+from .enums import VisibilityEnum, MediaTypeEnum, ProcessingStatusEnum
 
 class PaginationMetadata(BaseModel):
     total_count: int
@@ -59,6 +59,10 @@ class PostCreate(BaseModel):
     category_of_content: Optional[str]
     media_type: Optional[str]
     thumbnail: Optional[str]
+    media_renditions: Optional[dict] = None
+    playlist_url: Optional[str] = None
+    media_sha256: Optional[str] = None
+    processing_status: ProcessingStatusEnum = ProcessingStatusEnum.ready
 
     class Config:
         orm_mode = True
@@ -99,6 +103,7 @@ class MediaInteractionRequest(BaseModel):
     watched_time: int  # in seconds
     media_type: MediaTypeEnum
     video_length: Optional[int] = 0  # nullable for images
+    skipped: Optional[bool] = False
     
 class PostResponse(BaseModel):
     id: int
@@ -110,6 +115,9 @@ class PostResponse(BaseModel):
     category_of_content: Optional[str]
     media_type: Optional[str]
     thumbnail: Optional[str]
+    playlist_url: Optional[str]
+    media_renditions: Optional[dict]
+    processing_status: str = "ready"
     author_id: int
     likes_count: int
     comments_count: int
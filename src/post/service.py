@@ -1,37 +1,38 @@
 from sqlalchemy.orm import Session, joinedload, aliased
 from sqlalchemy.sql import case
-import re
 import math
 from typing import Union, Optional
-from sqlalchemy import desc, func, select
+from sqlalchemy import desc, exists, func, select
 from fastapi import HTTPException
 from .schemas import PostCreate, Post as PostSchema, Hashtag as HashtagSchema, SharePostRequest
-from ..models.post import Post, Hashtag, post_hashtags, Comment, UserSavedPosts, UserSharedPosts, Like, post_likes
+from ..models.post import Post, Hashtag, post_hashtags, Comment, UserSavedPosts, UserSharedPosts, Like, post_likes, HomeTimeline
 from ..models.user import User, Follow
 from ..auth.schemas import User as UserSchema
 from ..models.post import VisibilityEnum
 from ..models.activity import Activity
+from .hydration import hydrate_posts, hydrate_post_ids
+from .counters import bump_post_counter
+from .ranking import rank_for_viewer, prune_ranking
+from .hashtags import count_post_hashtags, link_post_hashtags, search_hashtags
+from .detail_cache import get_cached_detail, cache_detail, invalidate_post_detail, bump_detail_version
+from .headers import get_post_header, invalidate_post_header
+from .list_counts import invalidate_author_counts, invalidate_like_counts, invalidate_comment_counts, invalidate_save_counts
+from ..database import execute, commit, delete_object
+from ..profile.user_index import user_index
+from .enums import FeedModeEnum
+from .timeline import fan_out_post, remove_post, prepare_timeline, timeline_count_query, timeline_page_query
+from ..pagination import (
+    keyset_filter, keyset_order, keyset_page, cursor_response,
+    CountModeEnum, count_provider, page_count, past_last_page,
+)
 from sqlalchemy.exc import SQLAlchemyError
 from datetime import datetime
 
 # create hashtag from posts' content
 # hey #fun
 async def create_hashtags_svc(db: Session, post: Post):
-    if post.content:
-        regex = r"#\w+"
-        matches = re.findall(regex, post.content)
-
-        for match in matches:
-            name = match[1:]
-
-            hashtag = db.query(Hashtag).filter(Hashtag.name == name).first()
-            if not hashtag:
-                hashtag = Hashtag(name=name)
-                db.add(hashtag)
-                db.commit()
-            post.hashtags.append(hashtag)
-    else:
-        matches = []
+    # one IN lookup + one batch insert for new tags, links written in the post's transaction
+    await link_post_hashtags(db, post)
 
 
 # create post
@@ -45,17 +46,21 @@ async def create_post_svc(db: Session, post: PostCreate, user_id: int, file_url:
         visibility=post.visibility,
         category_of_content=post.category_of_content,
         media_type=post.media_type,
-        thumbnail= post.thumbnail
+        thumbnail= post.thumbnail,
+        media_renditions=post.media_renditions,
+        playlist_url=post.playlist_url,
+        media_sha256=post.media_sha256,
+        processing_status=post.processing_status,
     )
 
+    db.add(db_post)
+    db.flush()  # get the post id, everything below shares the post's transaction
     await create_hashtags_svc(db, db_post)
+    await fan_out_post(db, db_post)  # Push into followers' home timelines
 
-    db.add(db_post)
     db.commit()
+    invalidate_author_counts(user_id)
     db.refresh(db_post)  # Refresh to get the updated post instance with generated id and relationships
-    db_post.update_likes_and_comments_count(db)  # Update likes and comments count for the post
-
-    db.commit()  # Commit after updating the counts
     return db_post
 
 
@@ -65,7 +70,8 @@ async def get_user_posts_svc(
     user_id: int,
     current_user: Optional[User],
     page: int,
-    limit: int
+    limit: int,
+    count: CountModeEnum = CountModeEnum.estimate,
 ) -> dict:
     # Calculate the offset for pagination
     offset = (page - 1) * limit
@@ -78,16 +84,17 @@ async def get_user_posts_svc(
         # If the current user is not the owner, show only public posts
         posts_query = posts_query.filter(Post.visibility == "public")
 
-    # Count total posts after applying visibility filters
-    total_count = posts_query.count()
+    # Count total posts after applying visibility filters (cached per owner / viewer-is-owner)
+    is_owner = bool(current_user and current_user.id == user_id)
+    total_count = await count_provider.count("user_posts", (user_id, is_owner), posts_query.count, count)
 
     # Handle case where offset exceeds total count
-    if offset >= total_count:
+    if past_last_page(total_count, offset, count):
         return {
             "total_count": total_count,
             "page": page,
             "limit": limit,
-            "total_pages": (total_count + limit - 1) // limit,
+            "total_pages": page_count(total_count, limit),
             "data": [],
         }
 
@@ -100,40 +107,14 @@ async def get_user_posts_svc(
         .all()
     )
 
-    result = []
-    for post in posts:
-        #Get dynamic attributes like 'username'. 'hashtgas', and check likes/saves
-        post_dict = post.__dict__.copy()  # Get all fields dynamically
-        # Add dynamic relationships like 'username' (author) and 'hashtags'
-        post_dict["username"] = post.author.username if post.author else None
-        post_dict["hashtags"] = [hashtag.name for hashtag in post.hashtags] if post.hashtags else []
-
-        # Update likes and comments count dynamically
-        post.update_likes_and_comments_count(db)
-
-        # Check if the current user liked or saved the post
-        if current_user:
-            post_dict["is_liked"] = db.query(Like).filter(
-                Like.user_id == current_user.id,
-                Like.post_id == post.id
-            ).first() is not None
-        
-     # Check if the user saved the post
-            post_dict["is_saved"] = db.query(UserSavedPosts).filter(
-                UserSavedPosts.user_id == current_user.id,
-                UserSavedPosts.saved_post_id == post.id
-            ).first() is not None
-        else:
-            post_dict["is_liked"] = False
-            post_dict["is_saved"] = False
+    result = await hydrate_posts(db, posts, current_user.id if current_user else None)
 
-        result.append(post_dict)
-        #Return the final paginated result
+    #Return the final paginated result
     return {
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,
+        "total_pages": page_count(total_count, limit),
         "data": result,
     }
 
@@ -141,7 +122,8 @@ async def get_user_posts_svc(
 
 # get posts from a hashtag
 async def get_posts_from_hashtag_svc(
-    current_user: User, db: Session, page: int, limit: int, hashtag_name: str
+    current_user: User, db: Session, page: int, limit: int, hashtag_name: str,
+    count: CountModeEnum = CountModeEnum.estimate,
 ):
     hashtag = db.query(Hashtag).filter_by(name=hashtag_name).first()
     if not hashtag:
@@ -169,14 +151,14 @@ async def get_posts_from_hashtag_svc(
         )
     )
 
-    total_count = base_query.count()
+    total_count = await count_provider.count("hashtag_posts", (hashtag_name, current_user.id), base_query.count, count)
 
-    if offset >= total_count:
+    if past_last_page(total_count, offset, count):
         return {
             "total_count": total_count,
             "page": page,
             "limit": limit,
-            "total_pages": (total_count + limit - 1) // limit,
+            "total_pages": page_count(total_count, limit),
             "data": [],
         }
 
@@ -188,31 +170,13 @@ async def get_posts_from_hashtag_svc(
         .all()
     )
 
-    result = []
-    for post in posts:
-        post_dict = post.__dict__.copy()
-
-        post_dict["username"] = post.author.username if post.author else "Unknown"
-        post_dict["hashtags"] = [tag.name for tag in post.hashtags] if post.hashtags else []
-
-        post_dict["is_liked"] = db.query(Like).filter(
-            Like.user_id == current_user.id, Like.post_id == post.id
-        ).first() is not None
-
-        post_dict["is_saved"] = db.query(UserSavedPosts).filter(
-            UserSavedPosts.user_id == current_user.id,
-            UserSavedPosts.saved_post_id == post.id,
-        ).first() is not None
-
-        post.update_likes_and_comments_count(db)
-
-        result.append(post_dict)
+    result = await hydrate_posts(db, posts, current_user.id)
 
     return {
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,
+        "total_pages": page_count(total_count, limit),
         "data": result,
     }
 
@@ -220,123 +184,164 @@ async def get_posts_from_hashtag_svc(
 # get random posts for feed
 # return latest posts of all users
 async def get_random_posts_svc(
-    current_user: User, db: Session, page: int, limit: int, hashtag: str = None
+    current_user: User, db: Session, page: int, limit: int, hashtag: str = None, cursor: Optional[str] = None,
+    count: CountModeEnum = CountModeEnum.estimate, mode: FeedModeEnum = FeedModeEnum.latest,
 ):
-    total_count = db.query(Post).count()
-
-    offset = (page - 1) * limit
-    if offset >= total_count:
-        return []
+    if mode == FeedModeEnum.for_you and not hashtag:
+        if cursor is not None:
+            raise HTTPException(status_code=400, detail="mode=for_you is paged by page, not cursor")
+        return await get_for_you_posts_svc(current_user, db, page, limit, count)
 
     # Alias for Follow table
     FollowerAlias = aliased(Follow)
 
+    # select()-style so it runs on both the sync and the async session
     posts_query = (
-        db.query(Post, User.username)
-        .join(User, Post.author_id == User.id)
+        select(Post)
         .outerjoin(FollowerAlias, (FollowerAlias.following_id == Post.author_id) & (FollowerAlias.follower_id == current_user.id))  # Check if user follows the author
-        .order_by(desc(Post.created_at))
     )
 
     if hashtag:
-        posts_query = posts_query.join(post_hashtags).join(Hashtag).filter(Hashtag.name == hashtag)
+        posts_query = posts_query.join(post_hashtags).join(Hashtag).where(Hashtag.name == hashtag)
 
     # Apply visibility filters
-    posts_query = posts_query.filter(
+    posts_query = posts_query.where(
         (Post.visibility != "private") | (Post.author_id == current_user.id)  # Include private only if it's the user's post
-    ).filter(
+    ).where(
         (Post.visibility != "friends") | (FollowerAlias.follower_id != None)  # Include friends only if the user follows the author
     )
 
-    posts = posts_query.offset(offset).limit(limit).all()
-
-    result = []
-    for post, username in posts:
-        post_dict = post.__dict__.copy()
-        post_dict["username"] = username
-        hashtags = (
-            db.query(Hashtag)
-            .join(post_hashtags)
-            .filter(post_hashtags.c.post_id == post.id)
-            .all()
-        )
-        post_dict["hashtags"] = [hashtag.name for hashtag in hashtags]
-        
-        liked_post = db.query(Like).filter(Like.user_id == current_user.id, Like.post_id == post.id).first()
-        post_dict["is_liked"] = liked_post is not None
+    # Cursor mode: seek past the last seen (created_at, id), no COUNT
+    if cursor is not None:
+        if cursor:
+            posts_query = posts_query.where(keyset_filter(Post.created_at, Post.id, cursor))
+        posts = (await execute(db, posts_query.order_by(*keyset_order(Post.created_at, Post.id)).limit(limit + 1))).scalars().all()
+        posts, next_cursor, has_more = keyset_page(posts, limit, lambda post: (post.created_at, post.id))
+        return cursor_response(limit, next_cursor, has_more, await hydrate_posts(db, posts, current_user.id))
 
-        # Check if the current user has saved the post
-        saved_post = db.query(UserSavedPosts).filter(UserSavedPosts.user_id == current_user.id, UserSavedPosts.saved_post_id == post.id).first()
-        post_dict["is_saved"] = saved_post is not None
-        
-        post.update_likes_and_comments_count(db)  # Update likes and comments count for each post
-        result.append(post_dict)
+    async def count_all_posts():
+        return (await execute(db, select(func.count()).select_from(Post))).scalar()
+
+    total_count = await count_provider.count("all_posts", None, count_all_posts, count)
+
+    offset = (page - 1) * limit
+    if past_last_page(total_count, offset, count):
+        return {
+            "total_count": total_count,
+            "page": page,
+            "limit": limit,
+            "total_pages": page_count(total_count, limit),
+            "data": [],
+        }
+
+    posts = (await execute(db, posts_query.order_by(desc(Post.created_at)).offset(offset).limit(limit))).scalars().all()
+
+    result = await hydrate_posts(db, posts, current_user.id)
 
     return {
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,  # To calculate total pages
+        "total_pages": page_count(total_count, limit),
         "data": result,
     }
 
 
+# ranked "For You" feed, paged over the viewer's cached ranking
+async def get_for_you_posts_svc(current_user: User, db: Session, page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate):
+    ranked = await rank_for_viewer(db, current_user.id)
+    offset = (page - 1) * limit
+
+    # the ranking is cached for a minute, drop posts that went private or were
+    # deleted since: all of them for an exact total, else until the page is full
+    if count == CountModeEnum.exact:
+        await prune_ranking(db, ranked, ranked)
+    while await prune_ranking(db, ranked, ranked[offset:offset + limit]):
+        pass
+
+    data = await hydrate_post_ids(db, ranked[offset:offset + limit], current_user.id)
+    total_count = None if count == CountModeEnum.none else len(ranked)
+
+    return {
+        "total_count": total_count,
+        "page": page,
+        "limit": limit,
+        "total_pages": page_count(total_count, limit),
+        "data": data,
+    }
+
+
 # get post by post id
 import math
 
 async def get_post_from_post_id_svc(db: Session, current_user: User, post_id: int, page: int = 1, limit: int = 6) -> dict:
+    # Shared part comes from the detail cache, only the viewer flags hit the db
+    detail = await get_cached_detail(db, post_id, page, limit)
+    if detail is None:
+        built = await _build_post_detail(db, post_id, page, limit)
+        if built is None:
+            return None
+        detail, version = built
+        cache_detail(post_id, page, limit, detail, version)
+
+    post_response = dict(detail)
+    if current_user:
+        post_response["is_liked"], post_response["is_saved"] = (await execute(
+            db,
+            select(
+                exists().where(Like.user_id == current_user.id, Like.post_id == post_id),
+                exists().where(UserSavedPosts.user_id == current_user.id, UserSavedPosts.saved_post_id == post_id),
+            )
+        )).one()
+    return post_response
+
+
+async def _build_post_detail(db: Session, post_id: int, page: int, limit: int) -> Optional[tuple]:
+    """(detail, detail_version it was built from)"""
     offset = (page - 1) * limit
     
-    post_query = (
-        db.query(Post)
+    post_query = (await execute(
+        db,
+        select(Post)
         .options(
             joinedload(Post.author),
             joinedload(Post.hashtags),
         )
-        .filter(Post.id == post_id, Post.visibility == VisibilityEnum.public)
-        .first()
-    )
+        .where(Post.id == post_id, Post.visibility == VisibilityEnum.public)
+    )).unique().scalars().first()
 
     if not post_query:
         return None
 
-    # Fetch total likes count and calculate pagination metadata for likes
-    total_likes_count = db.query(func.count(Like.id)).filter(Like.post_id == post_id).scalar()
+    # Totals come from the write-time counters on the post
+    total_likes_count = post_query.likes_count or 0
     total_likes_pages = max(1, math.ceil(total_likes_count / limit))
 
     # Fetch paginated likes
-    likes_query = (
-        db.query(Like)
+    likes_query = (await execute(
+        db,
+        select(Like)
         .options(joinedload(Like.user))
-        .filter(Like.post_id == post_id)
+        .where(Like.post_id == post_id)
         .order_by(desc(Like.created_at))
         .limit(limit)
         .offset(offset)
-        .all()
-    )
+    )).scalars().all()
 
-    # Fetch total comments count and calculate pagination metadata for comments
-    total_comments_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post_id).scalar()
+    total_comments_count = post_query.comments_count or 0
     total_comments_pages = max(1, math.ceil(total_comments_count / limit))
 
     # Fetch paginated comments
-    comments_query = (
-        db.query(Comment)
+    comments_query = (await execute(
+        db,
+        select(Comment)
         .options(joinedload(Comment.user))
-        .filter(Comment.post_id == post_id)
+        .where(Comment.post_id == post_id)
         .order_by(desc(Comment.created_at))
         .limit(limit)
         .offset(offset)
-        .all()
-    )
+    )).scalars().all()
     
-    # Determine is_liked and is_saved for the current user
-    is_liked = False
-    is_saved = False
-    if current_user:
-        is_liked = db.query(Like).filter(Like.user_id == current_user.id, Like.post_id == post_id).first() is not None
-        is_saved = db.query(UserSavedPosts).filter(UserSavedPosts.user_id == current_user.id, UserSavedPosts.saved_post_id == post_id).first() is not None
-
     # Construct response with metadata
     post_response = {
         "id": post_query.id,
@@ -353,11 +358,15 @@ async def get_post_from_post_id_svc(db: Session, current_user: User, post_id: in
         "views_count": post_query.views_count,
         "category_of_content": post_query.category_of_content,
         "media_type": post_query.media_type,
+        "thumbnail": post_query.thumbnail,
+        "playlist_url": post_query.playlist_url,
+        "media_renditions": post_query.media_renditions,
+        "processing_status": post_query.processing_status.value,
         "report_count": post_query.report_count,
         "created_at": post_query.created_at,
         "hashtags": [tag.name for tag in post_query.hashtags],
-        "is_liked": is_liked,
-        "is_saved": is_saved,
+        "is_liked": False,  # viewer flags, filled in per request
+        "is_saved": False,
         
         # Likes metadata and list of likes
         "likes": {
@@ -403,85 +412,89 @@ async def get_post_from_post_id_svc(db: Session, current_user: User, post_id: in
         }
     }
 
-    return post_response
+    return post_response, post_query.detail_version
 
 
 # delete post svc
 async def delete_post_svc(db: Session, post_id: int):
     post = db.query(Post).filter(Post.id == post_id).first()
+    await remove_post(db, post_id)
+    await count_post_hashtags(db, post, -1)
     db.delete(post)
     db.commit()
+    invalidate_post_detail(post_id)
+    invalidate_post_header(post_id)
+    invalidate_author_counts(post.author_id)
 
 
 # like post
 async def like_post_svc(db: Session, post_id: int, username: str):
-    # Fetch the post object (not just a dictionary) from the database
-    post = db.query(Post).filter(Post.id == post_id).first()
+    # Only the author and media are needed, served from the header cache
+    post = await get_post_header(db, post_id)
 
     if not post:
         raise HTTPException(status_code=404, detail="Post not found")
 
     # Fetch the user object using the username
-    user = db.query(User).filter(User.username == username).first()
+    user = (await execute(db, select(User).where(User.username == username))).scalars().first()
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
     # Check if the user has already liked the post
-    existing_like = db.query(Like).filter(Like.post_id == post_id, Like.user_id == user.id).first()
+    existing_like = (await execute(db, select(Like).where(Like.post_id == post_id, Like.user_id == user.id))).scalars().first()
 
     if existing_like:
         return {"message": "You have already liked this post."}
 
     # If not liked, add the like
-    post.liked_by_users.append(user)
+    await execute(db, post_likes.insert().values(user_id=user.id, post_id=post_id))
     new_like = Like(post_id=post_id, user_id=user.id)
     db.add(new_like)
-    post.likes_count += 1
+    await bump_post_counter(db, post_id, "likes_count", 1)
 
     # Add like activity
     like_activity = Activity(
-        username=post.author.username,
+        username=post.author_username,
         liked_post_id=post_id,
         username_like=username,
         liked_media=post.media,
     )
     db.add(like_activity)
 
-    db.commit()
+    await commit(db)
+    invalidate_post_detail(post_id, counters_only=True)
+    invalidate_like_counts(post_id, user.id)
     return {"message": "Post liked successfully."}
 
 
 # unlike post
 async def unlike_post_svc(db: Session, post_id: int, username: str):
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await get_post_header(db, post_id)
     if not post:
         return False, "Invalid post_id"
 
-    user = db.query(User).filter(User.username == username).first()
+    user = (await execute(db, select(User).where(User.username == username))).scalars().first()
     if not user:
         return False, "Invalid username"
 
     # Check if user liked the post
-    if user not in post.liked_by_users:
+    existing_like = (await execute(
+        db, select(Like).where(Like.post_id == post.id, Like.user_id == user.id)
+    )).scalars().first()
+    if not existing_like:
         return False, "Already not liked"
 
-    # Remove from 'post_likes'
-    post.liked_by_users.remove(user)
-
-    # Delete the corresponding 'Like' entry
-    existing_like = (
-        db.query(Like)
-        .filter_by(post_id=post.id, user_id=user.id)
-        .first()
-    )
-    if existing_like:
-        db.delete(existing_like)
+    # Remove from 'post_likes' and delete the corresponding 'Like' entry
+    await execute(db, post_likes.delete().where(post_likes.c.post_id == post.id, post_likes.c.user_id == user.id))
+    await delete_object(db, existing_like)
 
-    # Decrement the likes_count safely
-    post.likes_count = max(post.likes_count - 1, 0)
+    # Decrement the likes_count atomically (never below zero)
+    await bump_post_counter(db, post.id, "likes_count", -1)
 
-    db.commit()
+    await commit(db)
+    invalidate_post_detail(post_id, counters_only=True)
+    invalidate_like_counts(post_id, user.id)
     return True, "Unliked successfully"
 
 
@@ -497,63 +510,89 @@ async def liked_users_post_svc(db: Session, post_id: int) -> list[UserSchema]:
 
 # Commenting on the post
 async def comment_on_post_svc(db: Session, post_id: int, user_id: int, content: str):
-    post = db.query(Post).filter(Post.id == post_id).first()
+    post = await get_post_header(db, post_id)
     if not post:
         return False, "invalid post_id"
 
-    user = db.query(User).filter(User.id == user_id).first()
+    user = (await execute(db, select(User).where(User.id == user_id))).scalars().first()
     if not user:
         return False, "invalid user_id"
 
     # Create the comment
     comment = Comment(content=content, post_id=post_id, user_id=user_id, created_at=datetime.now())
     db.add(comment)
-    post.comments_count += 1
+    await bump_post_counter(db, post_id, "comments_count", 1)
 
     # Add like activity
     comment_activity = Activity(
-        username=post.author.username,
+        username=post.author_username,
         commented_post_id=post_id,
         username_like=user.username,
         liked_media=post.media,
     )
     db.add(comment_activity)
-    db.commit()
+    await bump_detail_version(db, post_id)
+    await commit(db)
+    invalidate_post_detail(post_id)
+    invalidate_comment_counts(post_id)
 
     return True, "comment added"
 
 async def delete_comments_svc(db: Session, post_id: int, user_id: int, comment_ids: Union[int, list[int]]) -> int:
     # Ensure the post belongs to the current user
-    post = db.query(Post).filter(Post.id == post_id, Post.author_id == user_id).first()
-    if not post:
+    post = await get_post_header(db, post_id)
+    if not post or post.author_id != user_id:
         raise Exception("Post not found or you're not the owner")
 
     # Normalize comment_ids to list
     if isinstance(comment_ids, int):
         comment_ids = [comment_ids]
 
-    comments = db.query(Comment).filter(
+    comments = (await execute(db, select(Comment).where(
         Comment.post_id == post_id,
         Comment.id.in_(comment_ids)
-    ).all()
+    ))).scalars().all()
 
     if not comments:
         raise Exception("No matching comments found")
 
     for comment in comments:
-        db.delete(comment)
+        await delete_object(db, comment)
+    await bump_post_counter(db, post_id, "comments_count", -len(comments))
+    await bump_detail_version(db, post_id)
 
-    db.commit()
+    await commit(db)
+    invalidate_post_detail(post_id)
+    invalidate_comment_counts(post_id)
     return len(comments) 
 
 
 # Get comments for a post
-async def get_comments_for_post_svc(db: Session, post_id: int, page: int, limit: int):
+async def get_comments_for_post_svc(
+    db: Session, post_id: int, page: int, limit: int, cursor: Optional[str] = None,
+    count: CountModeEnum = CountModeEnum.estimate,
+):
+    if cursor is not None:
+        comments_query = (
+            db.query(Comment)
+            .options(joinedload(Comment.user))
+            .filter(Comment.post_id == post_id)
+        )
+        if cursor:
+            comments_query = comments_query.filter(keyset_filter(Comment.created_at, Comment.id, cursor))
+        comments = comments_query.order_by(*keyset_order(Comment.created_at, Comment.id)).limit(limit + 1).all()
+        comments, next_cursor, has_more = keyset_page(comments, limit, lambda comment: (comment.created_at, comment.id))
+        return cursor_response(limit, next_cursor, has_more, [_comment_item(comment) for comment in comments], "comments")
+
     offset = (page - 1) * limit
 
     # Get total count of comments
-    total_count = db.query(func.count(Comment.id)).filter(Comment.post_id == post_id).scalar()
-    total_pages = math.ceil(total_count / limit) if total_count > 0 else 1
+    total_count = await count_provider.count(
+        "post_comments", post_id,
+        db.query(func.count(Comment.id)).filter(Comment.post_id == post_id).scalar,
+        count,
+    )
+    total_pages = max(1, page_count(total_count, limit)) if total_count is not None else None
 
     # Get paginated comments
     comments = (
@@ -571,25 +610,29 @@ async def get_comments_for_post_svc(db: Session, post_id: int, page: int, limit:
         "total_pages": total_pages,
         "page": page,
         "limit": limit,
-        "comments": [
-            {
-                "comment_id": comment.id,
-                "content": comment.content,
-                "user_id": comment.user.id,
-                "username": comment.user.username,
-                "profile_pic": comment.user.profile_pic,
-                "created_at": comment.created_at
-            }
-            for comment in comments
-        ]
+        "comments": [_comment_item(comment) for comment in comments]
     }
 
-async def get_likes_for_post_svc(db: Session, post_id: int, page: int, limit: int):
+def _comment_item(comment: Comment) -> dict:
+    return {
+        "comment_id": comment.id,
+        "content": comment.content,
+        "user_id": comment.user.id,
+        "username": comment.user.username,
+        "profile_pic": comment.user.profile_pic,
+        "created_at": comment.created_at
+    }
+
+async def get_likes_for_post_svc(db: Session, post_id: int, page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate):
     offset = (page - 1) * limit
 
     # Get total count of likes
-    total_count = db.query(func.count(Like.id)).filter(Like.post_id == post_id).scalar()
-    total_pages = math.ceil(total_count / limit) if total_count > 0 else 1
+    total_count = await count_provider.count(
+        "post_likes", post_id,
+        db.query(func.count(Like.id)).filter(Like.post_id == post_id).scalar,
+        count,
+    )
+    total_pages = max(1, page_count(total_count, limit)) if total_count is not None else None
 
     # Get paginated likes
     likes = (
@@ -648,9 +691,10 @@ async def save_post_svc(db: Session, user_id: int, post_id: int):
         visibility=post.visibility,
     )
     db.add(saved_post)
-    if post and post.save_count is not None and post.save_count > 0:
-        post.save_count += 1
+    await bump_post_counter(db, post.id, "save_count", 1)
     db.commit()
+    invalidate_post_detail(post.id, counters_only=True)
+    invalidate_save_counts(user_id)
     db.refresh(saved_post)
 
     return {"message": "Post saved successfully"}
@@ -667,40 +711,22 @@ async def unsave_post_svc(db: Session, user_id: int, post_id: int):
     # Delete the saved post entry
     db.delete(saved_post)
     # Decrement save_count for the related post
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if post and post.save_count is not None and post.save_count > 0:
-        post.save_count -= 1
-        db.add(post)
+    await bump_post_counter(db, post_id, "save_count", -1)
     
     db.commit()
+    invalidate_post_detail(post_id, counters_only=True)
+    invalidate_save_counts(user_id)
 
     return {"message": "Post unsaved successfully"}
 
-async def get_saved_posts_svc(db: Session, user_id: int, page: int, limit: int):
-    offset = (page - 1) * limit
-    total_count = (
-        db.query(UserSavedPosts)
-        .filter(UserSavedPosts.user_id == user_id)
-        .count()
-    )
-    liked_post_ids = set(
-        db.query(Like.post_id)
-        .filter(Like.user_id == user_id)
-        .all()
-    )
-    liked_post_ids = {pid[0] for pid in liked_post_ids}
-
-    # Saved post_ids (optional since you're already filtering from saved)
-    saved_post_ids = set(
-        db.query(UserSavedPosts.saved_post_id)
-        .filter(UserSavedPosts.user_id == user_id)
-        .all()
-    )
-    saved_post_ids = {pid[0] for pid in saved_post_ids}
-
-    saved_posts = (
+async def get_saved_posts_svc(
+    db: Session, user_id: int, page: int, limit: int, cursor: Optional[str] = None,
+    count: CountModeEnum = CountModeEnum.estimate,
+):
+    saved_query = (
         db.query(
             UserSavedPosts.id.label("saved_post_id"),
+            UserSavedPosts.created_at.label("saved_at"),
             Post.id.label("post_id"),
             Post.content,
             Post.media,
@@ -713,6 +739,8 @@ async def get_saved_posts_svc(db: Session, user_id: int, page: int, limit: int):
             Post.views_count,
             Post.report_count,
             Post.thumbnail,
+            Post.playlist_url,
+            Post.media_renditions,
             Post.category_of_content,
             Post.media_type,
             Post.share_count,
@@ -720,6 +748,24 @@ async def get_saved_posts_svc(db: Session, user_id: int, page: int, limit: int):
         )
         .join(Post, UserSavedPosts.saved_post_id == Post.id)
         .filter(UserSavedPosts.user_id == user_id)
+    )
+
+    if cursor is not None:
+        if cursor:
+            saved_query = saved_query.filter(keyset_filter(UserSavedPosts.created_at, UserSavedPosts.id, cursor))
+        saved_posts = saved_query.order_by(*keyset_order(UserSavedPosts.created_at, UserSavedPosts.id)).limit(limit + 1).all()
+        saved_posts, next_cursor, has_more = keyset_page(saved_posts, limit, lambda row: (row.saved_at, row.saved_post_id))
+        return cursor_response(limit, next_cursor, has_more, _saved_post_items(db, user_id, saved_posts))
+
+    offset = (page - 1) * limit
+    total_count = await count_provider.count(
+        "saved_posts", user_id,
+        db.query(UserSavedPosts).filter(UserSavedPosts.user_id == user_id).count,
+        count,
+    )
+
+    saved_posts = (
+        saved_query
         .order_by(desc(UserSavedPosts.created_at))
         .offset(offset).limit(limit)
         .all()
@@ -729,15 +775,27 @@ async def get_saved_posts_svc(db: Session, user_id: int, page: int, limit: int):
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,  # To calculate total pages
-        "data": [
-            {**dict(row._mapping),
-            "is_liked": row.post_id in liked_post_ids,
-            "is_saved": row.post_id in saved_post_ids,
-    }
-                  for row in saved_posts],
+        "total_pages": page_count(total_count, limit),
+        "data": _saved_post_items(db, user_id, saved_posts),
     }
 
+def _saved_post_items(db: Session, user_id: int, saved_posts) -> list[dict]:
+    # Liked flags only for the posts on this page
+    post_ids = [row.post_id for row in saved_posts]
+    liked_post_ids = set()
+    if post_ids:
+        liked_post_ids = {
+            pid[0] for pid in db.query(Like.post_id).filter(Like.user_id == user_id, Like.post_id.in_(post_ids)).all()
+        }
+
+    return [
+        {**dict(row._mapping),
+        "is_liked": row.post_id in liked_post_ids,
+        "is_saved": True,
+        }
+        for row in saved_posts
+    ]
+
 async def share_post_svc(db: Session, sender_user_id: int, request: SharePostRequest):
     """Shares a post with multiple users, prevents duplicates, and updates share count."""
     print("DEBUG - request data:")
@@ -773,9 +831,10 @@ async def share_post_svc(db: Session, sender_user_id: int, request: SharePostReq
             shared_count += 1
 
         # Step 3: Update post's share count (only increment by newly shared)
-        post.share_count += shared_count
+        await bump_post_counter(db, post.id, "share_count", shared_count)
 
         db.commit()
+        invalidate_post_detail(post.id, counters_only=True)
         return {"message": f"Post shared with {shared_count} user(s)"}
 
     except SQLAlchemyError as e:
@@ -802,11 +861,10 @@ async def unsend_share_svc(db: Session, sender_user_id: int, post_id: int, recei
     db.delete(shared_post)
 
     # Decrease share count of the post
-    post = db.query(Post).filter(Post.id == post_id).first()
-    if post and post.share_count > 0:
-        post.share_count -= 1
+    await bump_post_counter(db, post_id, "share_count", -1)
 
     db.commit()
+    invalidate_post_detail(post_id, counters_only=True)
 
     return {"message": "Share undone successfully."}
 
@@ -819,48 +877,11 @@ async def get_received_posts_svc(db: Session, user_id: int):
         return db.query(UserSharedPosts).filter(UserSharedPosts.receiver_user_id == user_id).all()
 
 async def serialize_posts(posts, db: Session, current_user: User):
-    result = []
-    for post in posts:
-        post_dict = post.__dict__.copy()
-
-        # Get author username
-        username = db.query(User.username).filter(User.id == post.author_id).scalar()
-        post_dict["username"] = username
-
-        # Get hashtags
-        hashtags = (
-            db.query(Hashtag)
-            .join(post_hashtags)
-            .filter(post_hashtags.c.post_id == post.id)
-            .all()
-        )
-        post_dict["hashtags"] = [tag.name for tag in hashtags]
-
-        # Is liked
-        liked = (
-            db.query(Like)
-            .filter(Like.user_id == current_user.id, Like.post_id == post.id)
-            .first()
-        )
-        post_dict["is_liked"] = liked is not None
-
-        # Is saved
-        saved = (
-            db.query(UserSavedPosts)
-            .filter(UserSavedPosts.user_id == current_user.id, UserSavedPosts.saved_post_id == post.id)
-            .first()
-        )
-        post_dict["is_saved"] = saved is not None
+    return await hydrate_posts(db, posts, current_user.id if current_user else None)
 
-        # Update likes and comment counts
-        post.update_likes_and_comments_count(db)
-
-        result.append(post_dict)
-    return result
-
-async def get_public_posts_svc(db: Session, current_user: User, page: int, limit: int):
+async def get_public_posts_svc(db: Session, current_user: User, page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate):
     query = db.query(Post).filter(Post.visibility == "public", Post.author_id == current_user.id).order_by(desc(Post.created_at))
-    total_count = query.count()
+    total_count = await count_provider.count("public_posts", current_user.id, query.count, count)
 
     posts = query.offset((page - 1) * limit).limit(limit).all()
     data = await serialize_posts(posts, db, current_user)
@@ -869,14 +890,14 @@ async def get_public_posts_svc(db: Session, current_user: User, page: int, limit
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,
+        "total_pages": page_count(total_count, limit),
         "data": data,
     }
 
 
-async def get_private_posts_svc(db: Session, current_user: User, page: int, limit: int):
+async def get_private_posts_svc(db: Session, current_user: User, page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate):
     query = db.query(Post).filter(Post.author_id == current_user.id, Post.visibility == "private").order_by(desc(Post.created_at))
-    total_count = query.count()
+    total_count = await count_provider.count("private_posts", current_user.id, query.count, count)
 
     posts = query.offset((page - 1) * limit).limit(limit).all()
     data = await serialize_posts(posts, db, current_user)
@@ -885,18 +906,18 @@ async def get_private_posts_svc(db: Session, current_user: User, page: int, limi
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,
+        "total_pages": page_count(total_count, limit),
         "data": data,
     }
 
 
-async def get_friends_posts_svc(db: Session, current_user: User, page: int, limit: int):
+async def get_friends_posts_svc(db: Session, current_user: User, page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate):
     following_ids = [
         f.following_id for f in db.query(Follow).filter(Follow.follower_id == current_user.id)
     ]
 
     query = db.query(Post).filter(Post.author_id.in_(following_ids), Post.visibility == "friends").order_by(desc(Post.created_at))
-    total_count = query.count()
+    total_count = await count_provider.count("friends_posts", current_user.id, query.count, count)
 
     posts = query.offset((page - 1) * limit).limit(limit).all()
     data = await serialize_posts(posts, db, current_user)
@@ -905,12 +926,15 @@ async def get_friends_posts_svc(db: Session, current_user: User, page: int, limi
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,
+        "total_pages": page_count(total_count, limit),
         "data": data,
     }
 
 
-async def get_posts_by_visibility_svc(db: Session, current_user: User, visibility: str, page: int, limit: int):
+async def get_posts_by_visibility_svc(
+    db: Session, current_user: User, visibility: str, page: int, limit: int,
+    count: CountModeEnum = CountModeEnum.estimate,
+):
     try:
         query = db.query(Post)
 
@@ -929,7 +953,10 @@ async def get_posts_by_visibility_svc(db: Session, current_user: User, visibilit
         else:
             return None
 
-        total_count = query.count()
+        # "public" here is every public post, so the count is shared across viewers
+        visibility = VisibilityEnum(visibility).value
+        context = (visibility, None if visibility == "public" else current_user.id)
+        total_count = await count_provider.count("visibility_posts", context, query.count, count)
         posts = query.offset((page - 1) * limit).limit(limit).all()
         data = await serialize_posts(posts, db, current_user)
 
@@ -937,7 +964,7 @@ async def get_posts_by_visibility_svc(db: Session, current_user: User, visibilit
             "total_count": total_count,
             "page": page,
             "limit": limit,
-            "total_pages": (total_count + limit - 1) // limit,
+            "total_pages": page_count(total_count, limit),
             "data": data,
         }
 
@@ -945,85 +972,56 @@ async def get_posts_by_visibility_svc(db: Session, current_user: User, visibilit
         print(f"Database error: {e}")
         return None
 
-async def get_following_posts_svc(db: Session, user_id: int, page: int, limit: int):
-    total_count = (
-        db.query(Post)
-        .join(Follow, Follow.following_id == Post.author_id)
-        .filter(Follow.follower_id == user_id)
-        .filter((Post.visibility != "private") | (Post.author_id == user_id))  # Exclude private unless it's the user's post
-        .count()
-    )
+async def get_following_posts_svc(
+    db: Session, user_id: int, page: int, limit: int, cursor: Optional[str] = None,
+    count: CountModeEnum = CountModeEnum.estimate,
+):
+    # Served from the materialized home timeline, newest first
+    if cursor is not None:
+        timeline_query = timeline_page_query(user_id)
+        if cursor:
+            timeline_query = timeline_query.where(keyset_filter(HomeTimeline.created_at, HomeTimeline.post_id, cursor))
+        else:
+            await prepare_timeline(db, user_id)
+        rows = (await execute(db, timeline_query.limit(limit + 1))).all()
+        rows, next_cursor, has_more = keyset_page(rows, limit, lambda row: (row.created_at, row.post_id))
+        data = await hydrate_post_ids(db, [row.post_id for row in rows], user_id)
+        return cursor_response(limit, next_cursor, has_more, data)
+
+    if page == 1:
+        await prepare_timeline(db, user_id)
+    async def count_timeline():
+        return (await execute(db, timeline_count_query(user_id))).scalar() or 0
+
+    total_count = await count_provider.count("home_timeline", user_id, count_timeline, count)
 
     offset = (page - 1) * limit
-    if offset >= total_count:
+    if past_last_page(total_count, offset, count):
         return {
             "total_count": total_count,
             "page": page,
             "limit": limit,
-            "total_pages": (total_count + limit - 1) // limit,
+            "total_pages": page_count(total_count, limit),
             "data": [],
         }
 
-    posts = (
-        db.query(Post, User.username)
-        .join(User, Post.author_id == User.id)
-        .join(Follow, Follow.following_id == Post.author_id)
-        .filter(Follow.follower_id == user_id)
-        .filter((Post.visibility != "private") | (Post.author_id == user_id))  # Exclude private unless it's the user's post
-        .order_by(desc(Post.created_at))
-        .offset(offset)
-        .limit(limit)
-        .all()
-    )
-
-    result = []
-    for post, username in posts:
-        post_dict = post.__dict__.copy()  # Get all fields dynamically
-        post_dict["username"] = username
-        post_dict["hashtags"] = [hashtag.name for hashtag in post.hashtags] if post.hashtags else []
-
-        # Compute dynamic flags
-        post_dict["is_liked"] = db.query(Like).filter(Like.user_id == user_id, Like.post_id == post.id).first() is not None
-        post_dict["is_saved"] = db.query(UserSavedPosts).filter(UserSavedPosts.user_id == user_id, UserSavedPosts.saved_post_id== post.id).first() is not None
-
-        result.append(post_dict)
+    rows = (await execute(db, timeline_page_query(user_id, offset, limit))).all()
+    result = await hydrate_post_ids(db, [row.post_id for row in rows], user_id)
 
     return {
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,
+        "total_pages": page_count(total_count, limit),
         "data": result,
     }  
 
 async def search_hashtags_svc(query: str, db: Session, page: int, limit: int):
     offset = (page - 1) * limit
 
-    total_matching_hashtags = (
-        db.query(func.count(func.distinct(Hashtag.id)))
-        .join(post_hashtags, Hashtag.id == post_hashtags.c.hashtag_id)
-        .join(Post, Post.id == post_hashtags.c.post_id)
-        .filter(Hashtag.name.ilike(f"%{query}%"))
-        .filter(Post.visibility == VisibilityEnum.public)
-        .scalar()
-    )
-    total_pages = math.ceil(total_matching_hashtags / limit) if total_matching_hashtags > 0 else 0 
-    
-    hashtags = (
-        db.query(
-            Hashtag.name,
-            func.count(post_hashtags.c.post_id).label("post_count")
-        )
-        .join(post_hashtags, Hashtag.id == post_hashtags.c.hashtag_id)
-        .join(Post, Post.id == post_hashtags.c.post_id)
-        .filter(Hashtag.name.ilike(f"%{query}%"))
-        .filter(Post.visibility == VisibilityEnum.public)
-        .group_by(Hashtag.name)
-        .order_by(func.count(post_hashtags.c.post_id).desc())
-        .limit(limit)
-        .offset(offset)
-        .all()
-    )
+    # Prefix match on the in-memory index, ranked by public post count
+    total_matching_hashtags, hashtags = search_hashtags(db, query, offset, limit)
+    total_pages = math.ceil(total_matching_hashtags / limit) if total_matching_hashtags > 0 else 0
 
     return {
         "metadata": {
@@ -1033,40 +1031,13 @@ async def search_hashtags_svc(query: str, db: Session, page: int, limit: int):
             "limit": limit                  
             },
         "items": [
-            {"hashtag": hashtag.name, "post_count": hashtag.post_count} for hashtag in hashtags
+            {"hashtag": name, "post_count": post_count} for name, post_count in hashtags
         ]
     }
  
 async def search_users_svc(query: str, db: Session, current_user: User, page: int, limit: int):
     offset = (page - 1) * limit
 
-    # Total matching users count
-    total_count = (
-        db.query(User.id)
-        .filter(User.username.ilike(f"%{query}%"))
-        .count()
-    )
-    total_pages = max(1, math.ceil(total_count / limit))
-
-    # Get user details along with follower count
-    users = (
-        db.query(
-            User.id,
-            User.username,
-            User.profile_pic,
-            User.name,
-            User.bio,
-            func.count(Follow.follower_id).label("followers_count")
-        )
-        .outerjoin(Follow, Follow.following_id == User.id)
-        .filter(User.username.ilike(f"%{query}%"))
-        .group_by(User.id, User.username, User.profile_pic, User.name, User.bio)
-        .order_by(func.count(Follow.follower_id).desc())
-        .limit(limit)
-        .offset(offset)
-        .all()
-    )
-
     # Get all user IDs the current user is following
     following_ids = set(
         row[0] for row in db.query(Follow.following_id)
@@ -1074,6 +1045,12 @@ async def search_users_svc(query: str, db: Session, current_user: User, page: in
         .all()
     )
 
+    # Substring / prefix match on usernames and names from the in-memory index,
+    # ranked by followers_count with a boost for people the viewer follows
+    user_index.ensure_loaded(db)
+    total_count, users = user_index.search(query, offset, limit, following_ids)
+    total_pages = max(1, math.ceil(total_count / limit))
+
     return {
         "metadata": {
             "total_count": total_count,
@@ -1098,22 +1075,26 @@ async def search_users_svc(query: str, db: Session, current_user: User, page: in
 
     
 
-async def get_user_liked_posts_svc(db: Session, user_id: int, page: int, limit: int) -> dict:
+async def get_user_liked_posts_svc(
+    db: Session, user_id: int, page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate
+) -> dict:
     # Correct count using post_likes
-    total_count = (
+    total_count = await count_provider.count(
+        "liked_posts", user_id,
         db.query(func.count(Post.id))
         .join(post_likes, Post.id == post_likes.c.post_id)
         .filter(post_likes.c.user_id == user_id)
-        .scalar()
+        .scalar,
+        count,
     )
 
     offset = (page - 1) * limit
-    if offset >= total_count:
+    if past_last_page(total_count, offset, count):
         return {
             "total_count": total_count,
             "page": page,
             "limit": limit,
-            "total_pages": (total_count + limit - 1) // limit,
+            "total_pages": page_count(total_count, limit),
             "data": [],
         }
 
@@ -1128,32 +1109,12 @@ async def get_user_liked_posts_svc(db: Session, user_id: int, page: int, limit:
         .all()
     )
 
-    result = []
-    for post in liked_posts:
-        post_dict = post.__dict__.copy()
-
-        # Related data
-        post_dict["username"] = post.author.username if post.author else None
-        post_dict["hashtags"] = [hashtag.name for hashtag in post.hashtags] if post.hashtags else []
-
-        # Update counts
-        post.update_likes_and_comments_count(db)
-
-        # Since this is liked posts, this is always true
-        post_dict["is_liked"] = True
-
-        # Saved status
-        post_dict["is_saved"] = db.query(UserSavedPosts).filter(
-            UserSavedPosts.user_id == user_id,
-            UserSavedPosts.saved_post_id == post.id
-        ).first() is not None
-
-        result.append(post_dict)
+    result = await hydrate_posts(db, liked_posts, user_id)
 
     return {
         "total_count": total_count,
         "page": page,
         "limit": limit,
-        "total_pages": (total_count + limit - 1) // limit,
+        "total_pages": page_count(total_count, limit),
         "data": result,
     }
@@ -0,0 +1,204 @@
+import os
+from typing import Optional
+from datetime import datetime, timezone
+from sqlalchemy import delete, exists, func, select, update
+from sqlalchemy.orm import Session
+from ..models.post import Post, HomeTimeline, VisibilityEnum
+from ..models.user import Follow, User
+from ..database import execute, commit
+
+
+# Fan-out-on-write home timelines.
+# create_post pushes the post id into every follower's timeline, so reading
+# the following feed is a bounded range scan on (user_id, created_at).
+# Timelines are rebuilt once from the follow graph on first read; users have
+# timeline_materialized_at set by that rebuild only, so rows fanned out into
+# a timeline before then don't count as a built timeline.
+# Trimming happens on the write side (fan-out, backfill), so reading a
+# built timeline never writes.
+
+# Max posts kept per timeline; older entries are trimmed away
+TIMELINE_MAX_LENGTH = int(os.getenv("TIMELINE_MAX_LENGTH", 800))
+# How many recent posts of a newly followed account are backfilled
+TIMELINE_BACKFILL = int(os.getenv("TIMELINE_BACKFILL", 100))
+# Fan-outs trim the followers' timelines once every this many posts, so a
+# timeline can run this far past TIMELINE_MAX_LENGTH before it's cut back
+TIMELINE_TRIM_EVERY = int(os.getenv("TIMELINE_TRIM_EVERY", 20))
+
+
+def _is_private(post: Post) -> bool:
+    return VisibilityEnum(post.visibility) == VisibilityEnum.private
+
+
+# push a new post into the timelines of the author's followers
+async def fan_out_post(db: Session, post: Post):
+    if _is_private(post):
+        return
+
+    followers = (
+        select(Follow.follower_id, Post.id, Post.author_id, Post.created_at)
+        .join(Post, Post.author_id == Follow.following_id)
+        .where(Post.id == post.id)
+        .distinct()
+    )
+    await execute(
+        db,
+        HomeTimeline.__table__.insert().from_select(
+            ["user_id", "post_id", "author_id", "created_at"], followers
+        )
+    )
+    # trimming every follower on every post would rank all their timelines
+    # each time, so only every TIMELINE_TRIM_EVERY-th post pays for it
+    if post.id % TIMELINE_TRIM_EVERY == 0:
+        await trim_follower_timelines(db, post.author_id)
+
+
+# copy the recent posts of a newly followed account into the follower's timeline
+async def backfill_follow(db: Session, follower_id: int, following_id: int):
+    already = exists().where(HomeTimeline.user_id == follower_id, HomeTimeline.post_id == Post.id)
+    recent_posts = (
+        select(Follow.follower_id, Post.id, Post.author_id, Post.created_at)
+        .join(Post, Post.author_id == Follow.following_id)
+        .where(
+            Follow.follower_id == follower_id,
+            Follow.following_id == following_id,
+            Post.visibility != VisibilityEnum.private,
+            ~already,
+        )
+        .order_by(Post.created_at.desc())
+        .limit(TIMELINE_BACKFILL)
+    )
+    await execute(
+        db,
+        HomeTimeline.__table__.insert().from_select(
+            ["user_id", "post_id", "author_id", "created_at"], recent_posts
+        )
+    )
+    await trim_timeline(db, follower_id)
+
+
+async def remove_follow(db: Session, follower_id: int, following_id: int):
+    await execute(
+        db,
+        delete(HomeTimeline).where(
+            HomeTimeline.user_id == follower_id, HomeTimeline.author_id == following_id
+        )
+    )
+
+
+async def remove_post(db: Session, post_id: int):
+    await execute(db, delete(HomeTimeline).where(HomeTimeline.post_id == post_id))
+
+
+# keep timelines in sync when a post's visibility is edited
+async def sync_post_visibility(db: Session, post: Post, old_visibility):
+    was_private = VisibilityEnum(old_visibility) == VisibilityEnum.private
+    if _is_private(post) and not was_private:
+        await remove_post(db, post.id)
+    elif was_private and not _is_private(post):
+        await fan_out_post(db, post)
+
+
+# rebuild a timeline from the follow graph (first read after rollout, repairs)
+async def rebuild_timeline(db: Session, user_id: int):
+    await execute(db, delete(HomeTimeline).where(HomeTimeline.user_id == user_id))
+    recent_posts = (
+        select(Follow.follower_id, Post.id, Post.author_id, Post.created_at)
+        .join(Post, Post.author_id == Follow.following_id)
+        .where(Follow.follower_id == user_id, Post.visibility != VisibilityEnum.private)
+        .distinct()
+        .order_by(Post.created_at.desc())
+        .limit(TIMELINE_MAX_LENGTH)
+    )
+    await execute(
+        db,
+        HomeTimeline.__table__.insert().from_select(
+            ["user_id", "post_id", "author_id", "created_at"], recent_posts
+        )
+    )
+
+
+# drop everything past TIMELINE_MAX_LENGTH (an index seek + a tail delete)
+async def trim_timeline(db: Session, user_id: int):
+    cutoff = (await execute(
+        db,
+        select(HomeTimeline.created_at)
+        .where(HomeTimeline.user_id == user_id)
+        .order_by(HomeTimeline.created_at.desc(), HomeTimeline.post_id.desc())
+        .offset(TIMELINE_MAX_LENGTH - 1)
+        .limit(1)
+    )).scalar()
+    if cutoff is not None:
+        await execute(
+            db,
+            delete(HomeTimeline).where(
+                HomeTimeline.user_id == user_id, HomeTimeline.created_at < cutoff
+            )
+        )
+
+
+# drop everything past TIMELINE_MAX_LENGTH from the timelines of an author's
+# followers in one statement (a ranked scan of those timelines)
+async def trim_follower_timelines(db: Session, author_id: int):
+    followers = select(Follow.follower_id).where(Follow.following_id == author_id)
+    ranked = (
+        select(
+            HomeTimeline.user_id,
+            HomeTimeline.post_id,
+            func.row_number().over(
+                partition_by=HomeTimeline.user_id,
+                order_by=(HomeTimeline.created_at.desc(), HomeTimeline.post_id.desc()),
+            ).label("position"),
+        )
+        .where(HomeTimeline.user_id.in_(followers))
+        .subquery()
+    )
+    overflow = exists().where(
+        ranked.c.user_id == HomeTimeline.user_id,
+        ranked.c.post_id == HomeTimeline.post_id,
+        ranked.c.position > TIMELINE_MAX_LENGTH,
+    )
+    await execute(db, delete(HomeTimeline).where(HomeTimeline.user_id.in_(followers), overflow))
+
+
+# run on first-page reads: build a timeline that was never materialized.
+# Built timelines are kept trimmed by the writers, so this is a plain read
+# for them and only the first read ever writes.
+async def prepare_timeline(db: Session, user_id: int):
+    materialized_at = (await execute(
+        db, select(User.timeline_materialized_at).where(User.id == user_id)
+    )).scalar()
+    if materialized_at is not None:
+        return
+
+    # claiming the flag first means concurrent first reads rebuild only once
+    claimed = (await execute(
+        db,
+        update(User)
+        .where(User.id == user_id, User.timeline_materialized_at.is_(None))
+        .values(timeline_materialized_at=datetime.now(timezone.utc))
+    )).rowcount
+    if claimed:
+        await rebuild_timeline(db, user_id)
+    await commit(db)
+
+
+def timeline_count_query(user_id: int):
+    return select(func.count()).select_from(HomeTimeline).where(HomeTimeline.user_id == user_id)
+
+
+async def timeline_count(db: Session, user_id: int) -> int:
+    return (await execute(db, timeline_count_query(user_id))).scalar() or 0
+
+
+def timeline_page_query(user_id: int, offset: Optional[int] = None, limit: Optional[int] = None):
+    query = (
+        select(HomeTimeline.post_id, HomeTimeline.created_at)
+        .where(HomeTimeline.user_id == user_id)
+        .order_by(HomeTimeline.created_at.desc(), HomeTimeline.post_id.desc())
+    )
+    if offset:
+        query = query.offset(offset)
+    if limit is not None:
+        query = query.limit(limit)
+    return query
@@ -2,10 +2,13 @@ import os
 import re
 from typing import List, Optional
 from fastapi import APIRouter, Depends, status, HTTPException, UploadFile, Form
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
 from datetime import timedelta
-from ..database import get_db
+from ..database import get_db, get_async_db, execute
+from ..pagination import CountModeEnum
 from .schemas import PostCreate, SavePostRequest, SharePostRequest, MediaInteractionRequest, PostUpdate, CommentDeleteRequest, PostResponse
 from .service import (
     create_post_svc,
@@ -39,10 +42,19 @@ from .service import (
     delete_comments_svc
 )
 from ..profile.service import get_followers_svc
-from ..auth.service import get_current_user, existing_user, get_user_from_user_id, send_notification_to_user, get_user_by_username, optional_current_user
+from .timeline import sync_post_visibility
+from ..auth.service import get_current_user, get_current_user_async, existing_user, get_user_from_user_id, send_notification_to_user, get_user_by_username, optional_current_user
 from ..auth.schemas import UserIdRequest
-from ..azure_blob import upload_to_azure_blob, upload_and_compress
+from ..azure_blob import upload_to_azure_blob, publish_image, primary_urls, upload_raw_video
+from ..uploads import spool_upload
+from ..media_index import find_media, register_media
 from ..models.post import VisibilityEnum, MediaInteraction, Post
+from .enums import FeedModeEnum, ProcessingStatusEnum
+from .processing import video_pipeline, VideoJob
+from .hashtags import sync_hashtag_visibility
+from .detail_cache import invalidate_post_detail
+from .headers import get_post_header, invalidate_post_header
+from .list_counts import invalidate_author_counts
 from ..models.user import UserDevice, User
 from ..notification_service import send_push_notification
 
@@ -90,24 +102,58 @@ async def create_post(
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="You are not authorized."
         )
-    file_url = None
-    if file:
-        try:
-            file_url, media_type, thumbnail_url = await upload_and_compress(file,user.username,str(user.id))
-        except ValueError as e:
-            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
-        
-    post = PostCreate(
-        content=content,
-        location=location,
-        visibility=visibility,
-        category_of_content=category_of_content,
-        media_type=media_type,
-        thumbnail=thumbnail_url
-    )
+    try:
+        upload = await spool_upload(file)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+    thumbnail_url = None
+    playlist_url = None
+    renditions = None
+    processing = False
+    media_type = upload.media_type
+    try:
+        # the same bytes were posted before, reuse what they were turned into
+        media = await find_media(db, upload.sha256)
+        if media:
+            file_url, thumbnail_url, playlist_url = media.media_url, media.thumbnail_url, media.playlist_url
+            renditions = media.media_renditions
+        elif media_type == "image":
+            renditions, output_sha256 = await publish_image(upload)
+            file_url, thumbnail_url = primary_urls(renditions)
+            await register_media(db, upload.sha256, output_sha256, "image", upload.size, file_url, thumbnail_url, media_renditions=renditions)
+        else:
+            # Videos are transcoded in the background (post/processing.py), the
+            # post points at the raw upload until it is ready
+            file_url = await upload_raw_video(upload)
+            processing = True
+
+        post = PostCreate(
+            content=content,
+            location=location,
+            visibility=visibility,
+            category_of_content=category_of_content,
+            media_type=media_type,
+            thumbnail=thumbnail_url,
+            media_renditions=renditions,
+            playlist_url=playlist_url,
+            media_sha256=upload.sha256,
+            processing_status=ProcessingStatusEnum.processing if processing else ProcessingStatusEnum.ready,
+        )
 
-    # Create the post with the file URL (if any)
-    return await create_post_svc(db, post, current_user.id, file_url)
+        # Create the post with the file URL. A raw video left behind by a failure
+        # here is content-addressed, a retry of the upload picks it up again.
+        db_post = await create_post_svc(db, post, current_user.id, file_url)
+    except BaseException:
+        upload.cleanup()
+        raise
+
+    if processing:
+        # the pipeline owns the spooled file from here
+        video_pipeline.submit(VideoJob(db_post.id, file_url, upload.path, upload.size, upload.extension, upload.sha256))
+    else:
+        upload.cleanup()
+    return db_post
 
     # Fetch followers of the user
     # followers = await get_followers_svc(db, current_user.id)
@@ -140,15 +186,45 @@ async def edit_post(
     if not post:
         raise HTTPException(status_code=404, detail="Post not found or not yours")
 
+    old_visibility = post.visibility
     for key, value in updates.dict(exclude_unset=True).items():
         setattr(post, key, value)
 
+    await sync_post_visibility(db, post, old_visibility)
+    await sync_hashtag_visibility(db, post, old_visibility)
+    post.detail_version = Post.detail_version + 1
     db.commit()
+    invalidate_post_detail(post_id)
+    invalidate_post_header(post_id)
+    if post.visibility != old_visibility:
+        invalidate_author_counts(current_user.id)
     db.refresh(post)
     return post
 
+@router.get("/status/{post_id}", status_code=status.HTTP_200_OK)
+async def get_post_processing_status(post_id: int, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
+    row = (await execute(
+        db,
+        select(Post.processing_status, Post.processing_attempts, Post.processing_error, Post.processing_progress, Post.media, Post.thumbnail, Post.playlist_url)
+        .where(Post.id == post_id, Post.author_id == current_user.id)
+    )).first()
+    if not row:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found or not yours")
+    processing_status, attempts, error, progress, media, thumbnail, playlist_url = row
+    return {
+        "post_id": post_id,
+        "status": processing_status.value,
+        "attempts": attempts,
+        "progress": (progress or 0.0) if processing_status == ProcessingStatusEnum.processing else None,
+        "error": error if processing_status == ProcessingStatusEnum.failed else None,
+        "media": media if processing_status == ProcessingStatusEnum.ready else None,
+        "thumbnail": thumbnail,
+        "playlist_url": playlist_url,
+    }
+
+
 @router.get("/user")
-async def get_current_user_posts(page: int, limit: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_current_user_posts(page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     # verify the token
     user = current_user
     if not user:
@@ -156,12 +232,12 @@ async def get_current_user_posts(page: int, limit: int, db: Session = Depends(ge
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found."
         )
-    posts = await get_user_posts_svc(db, user.id, current_user, page, limit)
+    posts = await get_user_posts_svc(db, user.id, current_user, page, limit, count)
     return posts
 
 
 @router.get("/userposts")
-async def get_user_posts_by_username(page: int, limit: int, request: UserRequest, db: Session = Depends(get_db), current_user: Optional[User] =Depends(optional_current_user)):
+async def get_user_posts_by_username(page: int, limit: int, request: UserRequest, count: CountModeEnum = CountModeEnum.estimate, db: Session = Depends(get_db), current_user: Optional[User] =Depends(optional_current_user)):
     # verify token
     user = await existing_user(db, request.username)
     if not user:
@@ -169,7 +245,7 @@ async def get_user_posts_by_username(page: int, limit: int, request: UserRequest
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found."
         )
-    posts = await get_user_posts_svc(db, user.id, current_user, page, limit)
+    posts = await get_user_posts_svc(db, user.id, current_user, page, limit, count)
     return posts
 
 @router.post("/savepost", status_code=status.HTTP_201_CREATED)
@@ -181,13 +257,13 @@ async def unsave_post(request: SavePostRequest, db: Session = Depends(get_db), c
     return await unsave_post_svc(db, current_user.id, request.post_id)
 
 @router.get("/savedposts", status_code=status.HTTP_200_OK)
-async def get_saved_posts(page: int, limit: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+async def get_saved_posts(limit: int, page: int = 1, cursor: Optional[str] = None, count: CountModeEnum = CountModeEnum.estimate, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
     user = current_user
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="You are not authorized."
         )
-    saved_posts = await get_saved_posts_svc(db, user.id, page, limit)
+    saved_posts = await get_saved_posts_svc(db, user.id, page, limit, cursor, count)
     return saved_posts
 
 @router.post("/sharepost")
@@ -248,19 +324,26 @@ async def get_posts_from_hashtag(
     request: HashtagRequest,  # Request body
     page: int,  
     limit: int,
+    count: CountModeEnum = CountModeEnum.estimate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user),  # Get current logged-in user
 ):
     hashtag_name = request.hashtag  # Extract the hashtag name from the request body
-    return await get_posts_from_hashtag_svc(current_user, db, page, limit, hashtag_name)
+    return await get_posts_from_hashtag_svc(current_user, db, page, limit, hashtag_name, count)
 
 
 
+# Pass `cursor` (empty for the first page) to switch to keyset pagination:
+# the response then carries `next_cursor` / `has_more` instead of page totals.
+# In page mode `count=none` skips the total COUNT, `count=exact` bypasses its cache.
+# `mode=for_you` serves the engagement-ranked feed instead (page mode only, a cursor is
+# rejected; no hashtag filter).
 @router.get("/feed")
 async def get_random_posts(
-    page: int, limit: int, hashtag: str = None, db: Session = Depends(get_db), current_user=Depends(get_current_user)
+    limit: int, page: int = 1, hashtag: str = None, cursor: Optional[str] = None, count: CountModeEnum = CountModeEnum.estimate,
+    mode: FeedModeEnum = FeedModeEnum.latest, db: AsyncSession = Depends(get_async_db), current_user=Depends(get_current_user_async)
 ):
-    return await get_random_posts_svc(current_user, db, page, limit, hashtag)
+    return await get_random_posts_svc(current_user, db, page, limit, hashtag, cursor, count, mode)
 
 
 @router.delete("/", status_code=status.HTTP_204_NO_CONTENT)
@@ -273,8 +356,10 @@ async def delete_post(request: PostRequest, db: Session = Depends(get_db), curre
             detail="You are not authorized to delete this post.",
         )
 
-    post = await get_post_from_post_id_svc(db, user, request.post_id)
-    if post and post["author_id"] != user.id:
+    post = await get_post_header(db, request.post_id)
+    if not post:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Post not found")
+    if post.author_id != user.id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="You are not authorized to delete this post.",
@@ -284,16 +369,16 @@ async def delete_post(request: PostRequest, db: Session = Depends(get_db), curre
 
 
 @router.post("/like", status_code=status.HTTP_200_OK)
-async def like_post(request: PostRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def like_post(request: PostRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
     # Perform the like action
     res = await like_post_svc(db, request.post_id, current_user.username)
     
     # Get the post and notify the post owner (if it's not the liker themselves)
-    post = await get_post_from_post_id_svc(db, current_user, request.post_id)
+    post = await get_post_header(db, request.post_id)
     
-    if post and post["author_id"] != current_user.id:
+    if post and post.author_id != current_user.id:
         # Get all devices of the post owner
-        receiver_devices = db.query(UserDevice).filter(UserDevice.user_id == post["author_id"]).all()
+        receiver_devices = (await execute(db, select(UserDevice).where(UserDevice.user_id == post.author_id))).scalars().all()
 
         for device in receiver_devices:
             if device.notify_likes:
@@ -310,22 +395,22 @@ async def like_post(request: PostRequest, db: Session = Depends(get_db), current
     return {"message": "Liked the post"}
 
 @router.post("/unlike", status_code=status.HTTP_200_OK)
-async def unlike_post(request: PostRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def unlike_post(request: PostRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
     res, detail = await unlike_post_svc(db, request.post_id, current_user.username)
     if res == False:
         raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=detail)
     return {"message": "Unliked the post"}
 
 @router.get("/postlikes")
-async def get_likes_for_post(page: int, limit: int, request: PostRequest, db: Session = Depends(get_db)):
-    likes = await get_likes_for_post_svc(db, request.post_id, page, limit)
+async def get_likes_for_post(page: int, limit: int, request: PostRequest, count: CountModeEnum = CountModeEnum.estimate, db: Session = Depends(get_db)):
+    likes = await get_likes_for_post_svc(db, request.post_id, page, limit, count)
     if not likes:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No likes found")
     
     return likes
  
 @router.get("/", status_code=status.HTTP_200_OK)
-async def get_post(request: PostRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def get_post(request: PostRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
     db_post = await get_post_from_post_id_svc(db, current_user, request.post_id)
     if not db_post:
         raise HTTPException(
@@ -338,8 +423,8 @@ async def get_post(request: PostRequest, db: Session = Depends(get_db), current_
 @router.post("/comment", status_code=status.HTTP_201_CREATED)
 async def comment_on_post(
     request: CommentRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     # Verify token
     user = current_user
@@ -353,13 +438,13 @@ async def comment_on_post(
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
 
     # Notify post owner (if not commenting on own post)
-    post = await get_post_from_post_id_svc(db, user, request.post_id)
-    if post and post["author_id"] != current_user.id:
+    post = await get_post_header(db, request.post_id)
+    if post and post.author_id != current_user.id:
         # Fetch devices of post owner where notify_comments = True
-        devices_to_notify = db.query(UserDevice).filter(
-            UserDevice.user_id == post["author_id"],
+        devices_to_notify = (await execute(db, select(UserDevice).where(
+            UserDevice.user_id == post.author_id,
             UserDevice.notify_comments == True
-        ).all()
+        ))).scalars().all()
 
         for device in devices_to_notify:
             if device.device_token and device.platform:
@@ -378,8 +463,8 @@ async def comment_on_post(
 @router.delete("/delete", status_code=status.HTTP_200_OK)
 async def delete_comments(
     request: CommentDeleteRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     user = current_user
     if not user:
@@ -388,8 +473,8 @@ async def delete_comments(
             detail="You are not authorized to delete comments.",
         )
 
-    post = await get_post_from_post_id_svc(db, user, request.post_id)
-    if post and post["author_id"] != user.id:
+    post = await get_post_header(db, request.post_id)
+    if post and post.author_id != user.id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="You are not authorized to delete comments on this post.",
@@ -406,12 +491,14 @@ async def delete_comments(
 
 @router.get("/postcomments")
 async def get_comments_for_post(
-    page: int,
     limit: int,
     request: PostRequest, 
+    page: int = 1,
+    cursor: Optional[str] = None,
+    count: CountModeEnum = CountModeEnum.estimate,
     db: Session = Depends(get_db)
 ):
-    comments = await get_comments_for_post_svc(db, request.post_id, page, limit)
+    comments = await get_comments_for_post_svc(db, request.post_id, page, limit, cursor, count)
     if not comments:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="No comments found")
     
@@ -420,8 +507,8 @@ async def get_comments_for_post(
 
 # Get public posts
 @router.get("/public", status_code=status.HTTP_200_OK)
-async def get_public_posts(page: int, limit: int, db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
-    posts = await get_public_posts_svc(db, current_user, page, limit)
+async def get_public_posts(page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate, db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
+    posts = await get_public_posts_svc(db, current_user, page, limit, count)
     if not posts:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No public posts found."
@@ -430,8 +517,8 @@ async def get_public_posts(page: int, limit: int, db: Session = Depends(get_db),
 
 # Get private posts (only visible to uuser)
 @router.get("/private", status_code=status.HTTP_200_OK)
-async def get_private_posts(page: int, limit: int, db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
-    posts = await get_private_posts_svc(db, current_user, page, limit)
+async def get_private_posts(page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate, db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
+    posts = await get_private_posts_svc(db, current_user, page, limit, count)
     if not posts:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="No private posts found."
@@ -440,8 +527,8 @@ async def get_private_posts(page: int, limit: int, db: Session = Depends(get_db)
 
 # get visible only to friends posts
 @router.get("/friends", status_code=status.HTTP_200_OK)
-async def get_friends_posts(page: int, limit: int, db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
-    posts = await get_friends_posts_svc(db, current_user, page, limit)
+async def get_friends_posts(page: int, limit: int, count: CountModeEnum = CountModeEnum.estimate, db: Session = Depends(get_db),current_user: User = Depends(get_current_user)):
+    posts = await get_friends_posts_svc(db, current_user, page, limit, count)
 
     if not posts:
         raise HTTPException(
@@ -452,8 +539,8 @@ async def get_friends_posts(page: int, limit: int, db: Session = Depends(get_db)
 
 # get posts by visibility
 @router.get("/posts", status_code=status.HTTP_200_OK)
-async def get_posts_by_visibility(page: int, limit: int, visibility: VisibilityEnum, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
-    posts = await get_posts_by_visibility_svc(db, current_user, visibility, page, limit)
+async def get_posts_by_visibility(page: int, limit: int, visibility: VisibilityEnum, count: CountModeEnum = CountModeEnum.estimate, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+    posts = await get_posts_by_visibility_svc(db, current_user, visibility, page, limit, count)
 
     if not posts:
         raise HTTPException(
@@ -466,9 +553,9 @@ async def get_posts_by_visibility(page: int, limit: int, visibility: VisibilityE
 #get following users posts
 @router.get("/followingposts")
 async def get_following_posts(
-    page: int , limit: int , db: Session = Depends(get_db), user=Depends(get_current_user)
+    limit: int, page: int = 1, cursor: Optional[str] = None, count: CountModeEnum = CountModeEnum.estimate, db: AsyncSession = Depends(get_async_db), user=Depends(get_current_user_async)
 ):
-    return await get_following_posts_svc(db, user.id, page, limit)
+    return await get_following_posts_svc(db, user.id, page, limit, cursor, count)
 
 @router.get("/search/hashtags")
 async def search_hashtags(page: int,limit: int, query: str, db: Session = Depends(get_db)):
@@ -482,6 +569,7 @@ async def search_users(page: int ,limit: int, query: str, db: Session = Depends(
 async def get_current_user_liked_posts(
     page: int,
     limit: int,
+    count: CountModeEnum = CountModeEnum.estimate,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -492,7 +580,7 @@ async def get_current_user_liked_posts(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="You are not authorized."
         )
-    posts = await get_user_liked_posts_svc(db, user.id, page, limit)
+    posts = await get_user_liked_posts_svc(db, user.id, page, limit, count)
     return posts
 
 @router.post("/log-media-interactions")
@@ -513,7 +601,8 @@ async def log_interaction(
         post_id=interaction.post_id,
         watched_time=interaction.watched_time,
         media_type=interaction.media_type,
-        video_length=interaction.video_length
+        video_length=interaction.video_length,
+        skipped=interaction.skipped,
     )
     
     db.add(media_log)
@@ -1,10 +1,32 @@
 from fastapi import HTTPException
+from sqlalchemy import func, select, update
 from sqlalchemy.orm import Session
 
 from ..models.user import User, Follow
 from ..models.activity import Activity
 from .schemas import FollowersList, FollowingList, Profile
-from ..auth.service import get_user_from_user_id, existing_user
+from ..auth.service import get_user_from_user_id, get_user_by_username, existing_user
+from ..post.timeline import backfill_follow, remove_follow
+from ..post.list_counts import invalidate_follow_counts
+from .user_index import user_index
+from ..database import execute, commit, flush, rollback, delete_object
+
+
+# follow/unfollow run on both the sync and the async session
+async def _get_follow(db, follower_id: int, following_id: int):
+    return (await execute(
+        db, select(Follow).where(Follow.follower_id == follower_id, Follow.following_id == following_id)
+    )).scalars().first()
+
+
+# recount both sides of the follow edge and store them on the users
+async def _update_follow_counts(db, follower_id: int, following_id: int) -> int:
+    follower_count = (await execute(db, select(func.count()).select_from(Follow).where(Follow.follower_id == follower_id))).scalar()
+    following_count = (await execute(db, select(func.count()).select_from(Follow).where(Follow.following_id == following_id))).scalar()
+
+    await execute(db, update(User).where(User.id == follower_id).values(following_count=follower_count))
+    await execute(db, update(User).where(User.id == following_id).values(followers_count=following_count))
+    return following_count
 
 
 # follow
@@ -13,16 +35,13 @@ async def follow_svc(db: Session, follower: str, following: str):
         raise HTTPException(status_code=400, detail="You cannot follow yourself.")
 
     # ✅ Get session-bound user objects
-    db_follower = db.query(User).filter(User.username == follower).first()
-    db_following = db.query(User).filter(User.username == following).first()
+    db_follower = await get_user_by_username(db, follower)
+    db_following = await get_user_by_username(db, following)
 
     if not db_follower or not db_following:
         raise HTTPException(status_code=404, detail="User not found")
 
-    existing = db.query(Follow).filter_by(
-        follower_id=db_follower.id,
-        following_id=db_following.id
-    ).first()
+    existing = await _get_follow(db, db_follower.id, db_following.id)
 
     if existing:
         return {"message": "Already following"}
@@ -31,21 +50,21 @@ async def follow_svc(db: Session, follower: str, following: str):
         # ✅ Create follow
         follow = Follow(follower_id=db_follower.id, following_id=db_following.id)
         db.add(follow)
-        db.flush()
+        await flush(db)
 
         # ✅ Recalculate counts from fresh DB values
-        follower_count = db.query(Follow).filter(Follow.follower_id == db_follower.id).count()
-        following_count = db.query(Follow).filter(Follow.following_id == db_following.id).count()
+        following_count = await _update_follow_counts(db, db_follower.id, db_following.id)
 
-        # ✅ Force SQLAlchemy to detect changes
-        db.query(User).filter(User.id == db_follower.id).update({"following_count": follower_count})
-        db.query(User).filter(User.id == db_following.id).update({"followers_count": following_count})
+        # ✅ Pull their recent posts into the follower's home timeline
+        await backfill_follow(db, db_follower.id, db_following.id)
 
-        db.commit()
+        await commit(db)
+        user_index.set_followers_count(db_following.id, following_count)
+        invalidate_follow_counts(db_follower.id)
         return {"message": "Followed successfully"}
 
     except Exception as e:
-        db.rollback()
+        await rollback(db)
         raise HTTPException(status_code=500, detail=f"Follow failed: {e}")
 
 
@@ -54,37 +73,34 @@ async def unfollow_svc(db: Session, follower: str, following: str):
     if follower == following:
         raise HTTPException(status_code=400, detail="You cannot unfollow yourself.")
 
-    db_follower = db.query(User).filter(User.username == follower).first()
-    db_following = db.query(User).filter(User.username == following).first()
+    db_follower = await get_user_by_username(db, follower)
+    db_following = await get_user_by_username(db, following)
 
     if not db_follower or not db_following:
         raise HTTPException(status_code=404, detail="User not found")
 
-    existing = db.query(Follow).filter_by(
-        follower_id=db_follower.id,
-        following_id=db_following.id
-    ).first()
+    existing = await _get_follow(db, db_follower.id, db_following.id)
 
     if not existing:
         raise HTTPException(status_code=400, detail="You are not following this user.")
 
     try:
-        db.delete(existing)
-        db.flush()
+        await delete_object(db, existing)
+        await flush(db)
 
         # ✅ Recalculate counts
-        follower_count = db.query(Follow).filter(Follow.follower_id == db_follower.id).count()
-        following_count = db.query(Follow).filter(Follow.following_id == db_following.id).count()
+        following_count = await _update_follow_counts(db, db_follower.id, db_following.id)
 
-        # ✅ Update directly in DB (ensures update is detected)
-        db.query(User).filter(User.id == db_follower.id).update({"following_count": follower_count})
-        db.query(User).filter(User.id == db_following.id).update({"followers_count": following_count})
+        # ✅ Drop their posts from the follower's home timeline
+        await remove_follow(db, db_follower.id, db_following.id)
 
-        db.commit()
+        await commit(db)
+        user_index.set_followers_count(db_following.id, following_count)
+        invalidate_follow_counts(db_follower.id)
         return {"message": "Unfollowed successfully"}
 
     except Exception as e:
-        db.rollback()
+        await rollback(db)
         raise HTTPException(status_code=500, detail=f"Unfollow failed: {e}")
 
 
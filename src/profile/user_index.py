@@ -0,0 +1,153 @@
+import bisect
+import math
+import os
+import threading
+import time
+from typing import Iterable, Optional
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+from ..models.user import User
+
+
+# In-memory user search index over usernames and display names.
+# Queries of 3+ characters intersect trigram posting sets (substring match),
+# shorter ones bisect a sorted term list (prefix match). Results are ranked
+# by the stored followers_count, with a boost for accounts the viewer follows.
+
+# Reload from the users table after this many seconds, so changes made by
+# other worker processes show up
+USER_INDEX_TTL = float(os.getenv("USER_INDEX_TTL", 600))
+
+FOLLOWING_BOOST = 3.0
+PREFIX_BOOST = 1.0
+EXACT_BOOST = 5.0
+
+
+class UserDoc:
+    __slots__ = ("id", "username", "name", "profile_pic", "bio", "followers_count")
+
+    def __init__(self, id, username, name, profile_pic, bio, followers_count):
+        self.id = id
+        self.username = username or ""
+        self.name = name or ""
+        self.profile_pic = profile_pic
+        self.bio = bio
+        self.followers_count = followers_count or 0
+
+    def terms(self) -> set:
+        """Lowercased username, full name and each word of the name."""
+        terms = {self.username.lower(), self.name.lower()}
+        terms.update(self.name.lower().split())
+        terms.discard("")
+        return terms
+
+
+def _trigrams(text: str) -> set:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class UserSearchIndex:
+    def __init__(self, ttl: float = USER_INDEX_TTL):
+        self.ttl = ttl
+        self._docs = {}
+        self._grams = {}
+        self._terms = []  # sorted (term, user_id)
+        self._loaded_at = None
+        self._lock = threading.RLock()
+
+    def load(self, db: Session):
+        rows = db.execute(
+            select(User.id, User.username, User.name, User.profile_pic, User.bio, User.followers_count)
+        ).all()
+        with self._lock:
+            self._docs, self._grams, self._terms = {}, {}, []
+            for row in rows:
+                self._add(UserDoc(*row), sort=False)
+            self._terms.sort()
+            self._loaded_at = time.monotonic()
+
+    def ensure_loaded(self, db: Session):
+        if self._loaded_at is None or time.monotonic() - self._loaded_at > self.ttl:
+            self.load(db)
+
+    def _add(self, doc: UserDoc, sort: bool = True):
+        self._docs[doc.id] = doc
+        for term in doc.terms():
+            for gram in _trigrams(term):
+                self._grams.setdefault(gram, set()).add(doc.id)
+            if sort:
+                bisect.insort(self._terms, (term, doc.id))
+            else:
+                self._terms.append((term, doc.id))
+
+    def _remove(self, user_id: int):
+        doc = self._docs.pop(user_id, None)
+        if doc is None:
+            return
+        for term in doc.terms():
+            for gram in _trigrams(term):
+                ids = self._grams.get(gram)
+                if ids is not None:
+                    ids.discard(user_id)
+                    if not ids:
+                        del self._grams[gram]
+            index = bisect.bisect_left(self._terms, (term, user_id))
+            if index < len(self._terms) and self._terms[index] == (term, user_id):
+                del self._terms[index]
+
+    def upsert(self, user: User):
+        with self._lock:
+            if self._loaded_at is None:
+                return  # picked up by the first load
+            self._remove(user.id)
+            self._add(UserDoc(user.id, user.username, user.name, user.profile_pic, user.bio, user.followers_count))
+
+    def remove(self, user_id: int):
+        with self._lock:
+            self._remove(user_id)
+
+    def set_followers_count(self, user_id: int, followers_count: int):
+        with self._lock:
+            doc = self._docs.get(user_id)
+            if doc is not None:
+                doc.followers_count = followers_count or 0
+
+    def _candidates(self, query: str) -> Iterable[int]:
+        if len(query) >= 3:
+            postings = [self._grams.get(gram) for gram in _trigrams(query)]
+            if not all(postings):
+                return ()
+            postings.sort(key=len)
+            ids = set(postings[0]).intersection(*postings[1:])
+            # trigrams can match out of order, confirm the substring
+            return [
+                user_id for user_id in ids
+                if any(query in term for term in self._docs[user_id].terms())
+            ]
+        lo = bisect.bisect_left(self._terms, (query,))
+        hi = bisect.bisect_left(self._terms, (query + "\uffff",))
+        return {user_id for _, user_id in self._terms[lo:hi]}
+
+    def search(self, query: str, offset: int, limit: int, following_ids: Optional[set] = None) -> tuple:
+        """Returns (total matches, [UserDoc, ...]) for one page."""
+        query = query.strip().lstrip("@").lower()
+        following_ids = following_ids or set()
+        with self._lock:
+            matches = [self._docs[user_id] for user_id in self._candidates(query)]
+
+        def score(doc: UserDoc) -> float:
+            username = doc.username.lower()
+            value = math.log1p(doc.followers_count)
+            if doc.id in following_ids:
+                value += FOLLOWING_BOOST
+            if username == query:
+                value += EXACT_BOOST
+            elif username.startswith(query):
+                value += PREFIX_BOOST
+            return value
+
+        matches.sort(key=lambda doc: (-score(doc), doc.username))
+        return len(matches), matches[offset:offset + limit]
+
+
+user_index = UserSearchIndex()
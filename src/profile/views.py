@@ -1,8 +1,10 @@
 from fastapi import APIRouter, status, Depends, HTTPException, Query
 from typing import List
+from sqlalchemy import select, exists
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from pydantic import BaseModel
-from ..database import get_db
+from ..database import get_db, get_async_db, execute
 from src.models.user import BlockedUsers
 from .schemas import Profile, FollowersList, FollowingList, SuggestedUser,SuggestedUserResponse
 from .service import (
@@ -14,7 +16,7 @@ from .service import (
     existing_user,
     get_suggested_users_svc,
 )
-from ..auth.service import get_current_user, get_user_by_username, send_notification_to_user
+from ..auth.service import get_current_user, get_current_user_async, get_user_by_username, send_notification_to_user
 from ..models.user import User, UserDevice, Follow
 from ..notification_service import send_push_notification
 from ..auth.enums import AccountTypeEnum
@@ -29,11 +31,11 @@ class ProfileRequest(BaseModel):
 router = APIRouter(prefix="/profile", tags=["profile"])
 
 @router.get("/user")
-async def profile(request: ProfileRequest, db: Session = Depends(get_db)):
+async def profile(request: ProfileRequest, db: AsyncSession = Depends(get_async_db)):
     # ✅ Fetch both users at once
-    db_users = db.query(User).filter(
+    db_users = (await execute(db, select(User).where(
         User.username.in_([request.username, request.requesting_username])
-    ).all()
+    ))).scalars().all()
 
     user_map = {u.username: u for u in db_users}
     db_user = user_map.get(request.username)
@@ -42,27 +44,12 @@ async def profile(request: ProfileRequest, db: Session = Depends(get_db)):
     if not db_user or not requesting_user:
         raise HTTPException(status_code=404, detail="User(s) not found")
 
-    # ✅ Check if following
-    is_following = db.query(Follow).filter(
-        Follow.follower_id == requesting_user.id,
-        Follow.following_id == db_user.id
-    ).first() is not None
-
-    # ✅ Check if blocked
-    is_blocked = db.query(BlockedUsers).filter(
-        BlockedUsers.blocker_id == requesting_user.id,
-        BlockedUsers.blocked_id == db_user.id
-    ).first() is not None
-
-    # ✅ Always calculate this before returning anything
-    target_followers_subq = db.query(Follow.follower_id).filter(
-        Follow.following_id == db_user.id
-    ).subquery()
-
-    suggested_follower_count = db.query(Follow).filter(
-        Follow.follower_id == requesting_user.id,
-        Follow.following_id.in_(target_followers_subq)
-    ).count()
+    # ✅ Check if following / blocked
+    is_following, is_blocked = (await execute(db, select(
+        exists().where(Follow.follower_id == requesting_user.id, Follow.following_id == db_user.id),
+        exists().where(BlockedUsers.blocker_id == requesting_user.id, BlockedUsers.blocked_id == db_user.id),
+    ))).one()
+    is_following, is_blocked = bool(is_following), bool(is_blocked)
 
     # ✅ If same user (viewing own profile)
     if requesting_user.id == db_user.id:
@@ -97,8 +84,8 @@ async def profile(request: ProfileRequest, db: Session = Depends(get_db)):
 @router.post("/follow", status_code=status.HTTP_200_OK)
 async def follow(
     request: UserRequest,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    current_user: User = Depends(get_current_user_async)
 ):
     db_user = current_user
     if not db_user:
@@ -115,10 +102,10 @@ async def follow(
         followed_user = await get_user_by_username(db, request.username)
 
         # Fetch devices of followed user that allow follow notifications
-        devices = db.query(UserDevice).filter(
+        devices = (await execute(db, select(UserDevice).where(
             UserDevice.user_id == followed_user.id,
             UserDevice.notify_follow == True  # assuming this is the correct column name
-        ).all()
+        ))).scalars().all()
 
         for device in devices:
             if device.device_token and device.platform:
@@ -136,7 +123,7 @@ async def follow(
 
 
 @router.post("/unfollow", status_code=status.HTTP_200_OK)
-async def follow(request: UserRequest, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
+async def follow(request: UserRequest, db: AsyncSession = Depends(get_async_db), current_user: User = Depends(get_current_user_async)):
     db_user = current_user
     if not db_user:
         raise HTTPException(
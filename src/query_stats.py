@@ -0,0 +1,140 @@
+import os
+import re
+import time
+from collections import Counter as ShapeCounter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+from fastapi import Request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .metrics import Histogram
+
+
+# Per-request SQL stats: statement count, DB time and how often each
+# statement shape repeated (the N+1 signal), collected from engine events
+# for both the sync and the async engine.
+#
+# QUERY_STATS_DEBUG=true adds X-DB-* response headers and logs requests
+# where one shape ran N_PLUS_ONE_THRESHOLD times or more.
+
+QUERY_STATS_DEBUG = os.getenv("QUERY_STATS_DEBUG", "false").lower() == "true"
+N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", 5))
+
+queries_per_request = Histogram(
+    "db_queries_per_request",
+    "SQL statements executed per HTTP request",
+    buckets=(1, 2, 4, 6, 8, 12, 16, 24, 32, 64, 128),
+)
+db_time_per_request = Histogram(
+    "db_time_per_request_seconds",
+    "Time spent in SQL statements per HTTP request",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5),
+)
+
+
+class QueryStats:
+    def __init__(self, parent: Optional["QueryStats"] = None):
+        self.parent = parent
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = ShapeCounter()
+
+    def record(self, statement: str, duration: float):
+        shape = statement_shape(statement)
+        stats = self
+        while stats is not None:
+            stats.count += 1
+            stats.duration += duration
+            stats.shapes[shape] += 1
+            stats = stats.parent
+
+    def repeated(self, threshold: int = 2) -> list:
+        """(shape, times) for the shapes that ran at least `threshold` times, worst first."""
+        return [(shape, times) for shape, times in self.shapes.most_common() if times >= threshold]
+
+    def report(self) -> str:
+        lines = [f"{self.count} queries in {self.duration * 1000:.1f} ms"]
+        for shape, times in self.shapes.most_common():
+            lines.append(f"  {times}x {shape}")
+        return "\n".join(lines)
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar("query_stats", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_PARAM = r"(?:\?|\$\d+|%\(\w+\)s|:\w+|\d+)"
+_PARAM_LIST = re.compile(rf"\(\s*{_PARAM}(?:\s*,\s*{_PARAM})*\s*\)")
+
+
+def statement_shape(statement: str) -> str:
+    """Statement text with whitespace and IN (...) lists collapsed."""
+    return _PARAM_LIST.sub("(?)", _WHITESPACE.sub(" ", statement).strip())
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("query_started")
+    if stats is not None and started:
+        stats.record(statement, time.perf_counter() - started.pop())
+
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(exception_context):
+    started = exception_context.connection.info.get("query_started") if exception_context.connection is not None else None
+    if started:
+        started.pop()
+
+
+@contextmanager
+def capture_queries():
+    """Collect the statements run inside the block (nested captures all see them)."""
+    stats = QueryStats(parent=_current.get())
+    token = _current.set(stats)
+    try:
+        yield stats
+    finally:
+        _current.reset(token)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, max_repeats: Optional[int] = None):
+    """
+    Fail if the block runs more than `max_queries` statements, or (with
+    `max_repeats`) any one statement shape more than that many times.
+
+        with assert_query_budget(6):
+            await client.get("/v1/posts/feed", params={"limit": 10})
+    """
+    with capture_queries() as stats:
+        yield stats
+    if stats.count > max_queries:
+        raise AssertionError(f"Query budget exceeded: {stats.count} > {max_queries}\n{stats.report()}")
+    if max_repeats is not None and stats.repeated(max_repeats + 1):
+        raise AssertionError(f"Statement repeated more than {max_repeats} times (N+1?)\n{stats.report()}")
+
+
+# HTTP middleware, registered in main.py
+async def query_stats_middleware(request: Request, call_next):
+    with capture_queries() as stats:
+        response = await call_next(request)
+
+    queries_per_request.observe(stats.count)
+    db_time_per_request.observe(stats.duration)
+
+    if QUERY_STATS_DEBUG:
+        repeated = stats.repeated(N_PLUS_ONE_THRESHOLD)
+        response.headers["X-DB-Queries"] = str(stats.count)
+        response.headers["X-DB-Time-Ms"] = f"{stats.duration * 1000:.1f}"
+        response.headers["X-DB-Max-Repeats"] = str(max(stats.shapes.values(), default=0))
+        if repeated:
+            shape, times = repeated[0]
+            print(f"Possible N+1 on {request.method} {request.url.path}: {times}x {shape[:200]} ({stats.count} queries total)")
+    return response
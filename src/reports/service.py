@@ -5,6 +5,8 @@ from ..models.report import ReportPost, ReportUser, ReportComment, ReportReason
 from ..models.post import Comment, Post
 from ..models.user import User
 from .enums import ReportReasonEnum
+from ..post.counters import bump_post_counter
+from ..post.detail_cache import invalidate_post_detail
 
 async def report_post_svc(post_id: int, reported_by: int, reason: str, description: str, db: Session):
     try:
@@ -34,11 +36,10 @@ async def report_post_svc(post_id: int, reported_by: int, reason: str, descripti
             description=description
         )
         db.add(report)
-        post = db.query(Post).filter(Post.id == post_id).first()
-        if post:
-            post.report_count = (post.report_count or 0) + 1
+        await bump_post_counter(db, post_id, "report_count", 1)
 
         db.commit()
+        invalidate_post_detail(post_id, counters_only=True)
 
     except HTTPException as e:  # Catch HTTPException separately
         raise e  # Re-raise the HTTPException with the specific message
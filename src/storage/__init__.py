@@ -0,0 +1,42 @@
+import os
+from dotenv import load_dotenv
+from .base import Storage
+from .local import LocalStorage
+
+load_dotenv()
+
+# STORAGE_BACKEND=azure (default) or local. The local backend needs no
+# credentials and is what the benchmarks use.
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "azure")
+LOCAL_STORAGE_ROOT = os.getenv("LOCAL_STORAGE_ROOT", "media")
+LOCAL_STORAGE_URL = os.getenv("LOCAL_STORAGE_URL")
+
+AZURE_CONNECTION_STRING = os.getenv(
+    "AZURE_CONNECTION_STRING",
+    "DefaultEndpointsProtocol=https;AccountName=vreelsstorage;AccountKey=YkdFdR/UTuWKJnB4nmYJPV+NaqgsP9Vy3LVHIJ2R6m10jWM4v2a141Fh0HA+95BNs5PH6k/OTO2X+AStlUmb6Q==;EndpointSuffix=core.windows.net"
+)
+CDN_BASE_URL = os.getenv("CDN_BASE_URL", "https://vreelspostscdn-fmedgweqdkc6fah5.z01.azurefd.net")
+# Blob uploads go out in blocks of BLOB_BLOCK_SIZE, BLOB_UPLOAD_CONCURRENCY at a time
+BLOB_BLOCK_SIZE = int(os.getenv("BLOB_BLOCK_SIZE", 4 * 1024 * 1024))
+BLOB_UPLOAD_CONCURRENCY = int(os.getenv("BLOB_UPLOAD_CONCURRENCY", 2))
+# open connections kept to the storage account
+BLOB_POOL_SIZE = int(os.getenv("BLOB_POOL_SIZE", 32))
+
+
+def create_storage(backend: str = STORAGE_BACKEND) -> Storage:
+    if backend == "local":
+        return LocalStorage(LOCAL_STORAGE_ROOT, LOCAL_STORAGE_URL)
+    if backend == "azure":
+        # the async SDK pulls in aiohttp, only import it when it's used
+        from .azure import AzureStorage
+        return AzureStorage(
+            AZURE_CONNECTION_STRING,
+            cdn_base_url=CDN_BASE_URL,
+            block_size=BLOB_BLOCK_SIZE,
+            upload_concurrency=BLOB_UPLOAD_CONCURRENCY,
+            pool_size=BLOB_POOL_SIZE,
+        )
+    raise ValueError(f"Unknown STORAGE_BACKEND: {backend}")
+
+
+storage = create_storage()
@@ -0,0 +1,99 @@
+import asyncio
+from typing import BinaryIO, Optional
+import aiohttp
+from azure.core.exceptions import ResourceNotFoundError
+from azure.core.pipeline.transport import AioHttpTransport
+from azure.storage.blob import ContentSettings
+from azure.storage.blob.aio import BlobServiceClient
+from .base import Storage
+
+
+class AzureStorage(Storage):
+    """
+    Azure Blob Storage through the async SDK. One BlobServiceClient per event
+    loop, sharing an aiohttp session whose connector keeps up to `pool_size`
+    connections open, so uploads don't pay a TLS handshake each and never
+    block the loop.
+    """
+
+    def __init__(self, connection_string: str, cdn_base_url: Optional[str] = None, block_size: int = 4 * 1024 * 1024,
+                 upload_concurrency: int = 2, pool_size: int = 32):
+        self.connection_string = connection_string
+        settings = dict(part.split("=", 1) for part in connection_string.split(";") if "=" in part)
+        self.account_name = settings.get("AccountName", "")
+        self.endpoint = settings.get("BlobEndpoint") or f"https://{self.account_name}.blob.{settings.get('EndpointSuffix', 'core.windows.net')}"
+        self.cdn_base_url = cdn_base_url
+        self.block_size = block_size
+        self.upload_concurrency = upload_concurrency
+        self.pool_size = pool_size
+        self._clients = {}
+
+    async def _service(self) -> BlobServiceClient:
+        # aiohttp sessions belong to the loop they were made on
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            stale = list(self._clients.items())
+            session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=self.pool_size), trust_env=True)
+            client = BlobServiceClient.from_connection_string(
+                self.connection_string,
+                max_single_put_size=self.block_size,
+                max_block_size=self.block_size,
+                transport=AioHttpTransport(session=session, session_owner=True),
+            )
+            self._clients = {loop: client}
+            for old_loop, old_client in stale:
+                await self._close_client(old_loop, old_client)
+        return client
+
+    async def _close_client(self, loop, client: BlobServiceClient):
+        try:
+            if loop.is_running() and loop is not asyncio.get_running_loop():
+                # still running in another thread, close it there
+                asyncio.run_coroutine_threadsafe(client.close(), loop)
+            else:
+                await client.close()
+        except Exception as e:
+            print(f"Azure storage: closing a blob client failed: {e}")
+
+    async def _blob(self, container: str, name: str):
+        return (await self._service()).get_blob_client(container, name)
+
+    async def put_stream(self, container: str, name: str, stream: BinaryIO, length: Optional[int] = None, content_type: Optional[str] = None):
+        # read and sent in blocks of block_size, upload_concurrency at a time
+        blob = await self._blob(container, name)
+        await blob.upload_blob(
+            stream, overwrite=True, length=length, max_concurrency=self.upload_concurrency,
+            content_settings=ContentSettings(content_type=content_type) if content_type else None,
+        )
+
+    async def get_to_path(self, container: str, name: str, path: str):
+        blob = await self._blob(container, name)
+        downloader = await blob.download_blob(max_concurrency=self.upload_concurrency)
+        with open(path, "wb") as f:
+            await downloader.readinto(f)
+
+    async def delete(self, container: str, name: str):
+        blob = await self._blob(container, name)
+        try:
+            await blob.delete_blob()
+        except ResourceNotFoundError:
+            pass
+
+    async def delete_prefix(self, container: str, prefix: str):
+        container_client = (await self._service()).get_container_client(container)
+        async for blob in container_client.list_blobs(name_starts_with=prefix):
+            await self.delete(container, blob.name)
+
+    async def exists(self, container: str, name: str) -> bool:
+        blob = await self._blob(container, name)
+        return await blob.exists()
+
+    def url_for(self, container: str, name: str, cdn: bool = False) -> str:
+        base = self.cdn_base_url if cdn and self.cdn_base_url else self.endpoint
+        return f"{base}/{container}/{name}"
+
+    async def close(self):
+        clients, self._clients = self._clients, {}
+        for loop, client in clients.items():
+            await self._close_client(loop, client)
@@ -0,0 +1,50 @@
+import os
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Optional
+from urllib.parse import urlparse, unquote
+
+
+class Storage(ABC):
+    """
+    Object storage the media code writes through (see azure_blob.py). Objects
+    are addressed as (container, name); url_for / parse_url convert to and from
+    the URLs stored on posts and users. All I/O methods are coroutines.
+    """
+
+    @abstractmethod
+    async def put_stream(self, container: str, name: str, stream: BinaryIO, length: Optional[int] = None, content_type: Optional[str] = None):
+        """Store a binary file-like object, replacing what was there."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get_to_path(self, container: str, name: str, path: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete(self, container: str, name: str):
+        """Missing objects are ignored."""
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_prefix(self, container: str, prefix: str):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def exists(self, container: str, name: str) -> bool:
+        raise NotImplementedError
+
+    @abstractmethod
+    def url_for(self, container: str, name: str, cdn: bool = False) -> str:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+    async def put_file(self, container: str, name: str, path: str, content_type: Optional[str] = None):
+        with open(path, "rb") as data:
+            await self.put_stream(container, name, data, length=os.path.getsize(path), content_type=content_type)
+
+    def parse_url(self, url: str) -> tuple:
+        """(container, name) from a url made by url_for."""
+        container, _, name = unquote(urlparse(url).path).lstrip("/").partition("/")
+        return container, name
@@ -0,0 +1,81 @@
+import asyncio
+import os
+import shutil
+import tempfile
+from typing import BinaryIO, Optional
+from .base import Storage
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class LocalStorage(Storage):
+    """
+    Objects as files under root/<container>/<name>, for local runs, tests and
+    benchmarks. Writes go to a temp file that is renamed into place, so an
+    object exists only once it is complete (like a committed blob).
+    """
+
+    def __init__(self, root: str, base_url: Optional[str] = None):
+        self.root = os.path.abspath(root)
+        self.base_url = (base_url or f"file://{self.root}").rstrip("/")
+        os.makedirs(self.root, exist_ok=True)
+
+    def _path(self, container: str, name: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, container, name))
+        if not path.startswith(self.root + os.sep):
+            raise ValueError(f"Invalid object name: {container}/{name}")
+        return path
+
+    def _write(self, path: str, stream: BinaryIO):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".upload_")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                shutil.copyfileobj(stream, f, CHUNK_SIZE)
+            os.replace(temp, path)
+        except BaseException:
+            os.remove(temp)
+            raise
+
+    def _remove(self, path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    async def put_stream(self, container: str, name: str, stream: BinaryIO, length: Optional[int] = None, content_type: Optional[str] = None):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._write, self._path(container, name), stream)
+
+    async def get_to_path(self, container: str, name: str, path: str):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, shutil.copyfile, self._path(container, name), path)
+
+    async def delete(self, container: str, name: str):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self._remove, self._path(container, name))
+
+    async def delete_prefix(self, container: str, prefix: str):
+        directory = os.path.join(self.root, container)
+
+        def remove_matching():
+            for root, _, names in os.walk(directory):
+                for file_name in names:
+                    path = os.path.join(root, file_name)
+                    if os.path.relpath(path, directory).replace(os.sep, "/").startswith(prefix):
+                        self._remove(path)
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, remove_matching)
+
+    async def exists(self, container: str, name: str) -> bool:
+        return os.path.isfile(self._path(container, name))
+
+    def url_for(self, container: str, name: str, cdn: bool = False) -> str:
+        return f"{self.base_url}/{container}/{name}"
+
+    def parse_url(self, url: str) -> tuple:
+        if url.startswith(self.base_url + "/"):
+            container, _, name = url[len(self.base_url) + 1:].partition("/")
+            return container, name
+        return super().parse_url(url)
@@ -0,0 +1,315 @@
+import asyncio
+import os
+import re
+import time
+from collections import deque
+from typing import Callable, Optional
+from .metrics import Gauge, Histogram
+
+
+# ffmpeg runner on asyncio subprocesses. Every app worker (WEB_CONCURRENCY,
+# the gunicorn worker count) transcodes, so each one gets its share of the
+# host's cores: a semaphore caps how many ffmpeg processes it runs at once
+# (TRANSCODE_CONCURRENCY) and encodes get the share divided by the runs
+# active or queued when they start (ENCODE_THREADS in the args), so a lone
+# transcode uses the whole share and a busy box queues transcodes instead of
+# oversubscribing the cores. TRANSCODE_THREADS pins the thread count instead.
+# Progress comes from `-progress pipe:1`; stderr is drained for the duration
+# and error output.
+
+FFMPEG = os.getenv("FFMPEG_PATH") or r"C:\ffmpeg\ffmpeg-7.1.1-essentials_build\bin\ffmpeg.exe"
+CPU_COUNT = os.cpu_count() or 1
+APP_WORKERS = max(1, int(os.getenv("WEB_CONCURRENCY", 3)))
+CPU_SHARE = max(1, CPU_COUNT // APP_WORKERS)
+TRANSCODE_CONCURRENCY = int(os.getenv("TRANSCODE_CONCURRENCY", CPU_SHARE))
+TRANSCODE_THREADS = int(os.getenv("TRANSCODE_THREADS", 0))
+TRANSCODE_TIMEOUT = float(os.getenv("TRANSCODE_TIMEOUT", 15 * 60))
+
+transcodes_active = Gauge("transcodes_active", "ffmpeg processes running")
+transcodes_waiting = Gauge("transcodes_waiting", "ffmpeg runs waiting for a slot")
+transcode_seconds = Histogram(
+    "transcode_seconds",
+    "Wall time of ffmpeg runs by result",
+    buckets=(0.5, 1, 5, 10, 30, 60, 120, 300, 600, 900),
+)
+
+_DURATION = re.compile(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)")
+
+_semaphores = {}
+_running = 0
+_waiting = 0
+
+# placeholder for the -threads value, filled in by run_ffmpeg once the run has a slot
+ENCODE_THREADS = "<encode-threads>"
+
+
+class TranscodeError(Exception):
+    pass
+
+
+def _slots() -> asyncio.Semaphore:
+    # one per event loop, asyncio primitives can't be shared across loops
+    loop = asyncio.get_running_loop()
+    if loop not in _semaphores:
+        _semaphores.clear()
+        _semaphores[loop] = asyncio.Semaphore(max(1, TRANSCODE_CONCURRENCY))
+    return _semaphores[loop]
+
+
+async def _read_progress(stream, duration: list, on_progress: Optional[Callable]):
+    fields = {}
+    async for raw in stream:
+        key, _, value = raw.decode(errors="replace").strip().partition("=")
+        fields[key] = value
+        if key != "progress":
+            continue
+        # one block per update, ends with progress=continue|end
+        if on_progress and duration[0]:
+            try:
+                done = int(fields.get("out_time_us") or fields.get("out_time_ms") or 0) / 1_000_000
+            except ValueError:
+                done = 0.0
+            on_progress(min(1.0, done / duration[0]), fields.get("speed", "").strip())
+        fields = {}
+
+
+async def _read_stderr(stream, duration: list, tail: deque):
+    async for raw in stream:
+        line = raw.decode(errors="replace").rstrip()
+        tail.append(line)
+        if not duration[0]:
+            match = _DURATION.search(line)
+            if match:
+                hours, minutes, seconds = match.groups()
+                duration[0] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+async def run_ffmpeg(
+    args: list,
+    timeout: float = TRANSCODE_TIMEOUT,
+    on_progress: Optional[Callable[[float, str], None]] = None,
+    outputs: tuple = (),
+):
+    """
+    Run `ffmpeg <args>` once a slot is free. Raises TranscodeError on a non-zero
+    exit or after `timeout` seconds; the process is killed and `outputs`
+    (partial output files) are removed on any failure or cancellation.
+    on_progress(fraction, speed) is called as ffmpeg reports progress.
+    """
+    global _running, _waiting
+    slots = _slots()
+    transcodes_waiting.inc()
+    _waiting += 1
+    try:
+        await slots.acquire()
+    finally:
+        transcodes_waiting.dec()
+        _waiting -= 1
+
+    _running += 1
+    # split the share between the runs going now and the ones about to start
+    threads = str(TRANSCODE_THREADS or max(1, CPU_SHARE // min(max(1, TRANSCODE_CONCURRENCY), _running + _waiting)))
+    args = [threads if arg == ENCODE_THREADS else arg for arg in args]
+
+    started = time.perf_counter()
+    transcodes_active.inc()
+    process = None
+    result = "error"
+    try:
+        process = await asyncio.create_subprocess_exec(
+            FFMPEG, "-hide_banner", "-nostdin", "-nostats", "-progress", "pipe:1", *args,
+            stdin=asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        duration, tail = [0.0], deque(maxlen=20)
+        readers = asyncio.gather(
+            _read_progress(process.stdout, duration, on_progress),
+            _read_stderr(process.stderr, duration, tail),
+        )
+        try:
+            await asyncio.wait_for(asyncio.shield(readers), timeout)
+            await process.wait()
+        except asyncio.TimeoutError:
+            result = "timeout"
+            raise TranscodeError(f"ffmpeg timed out after {timeout:.0f}s")
+        finally:
+            if process.returncode is None:
+                process.kill()
+                await process.wait()
+            readers.cancel()
+            await asyncio.gather(readers, return_exceptions=True)
+
+        if process.returncode != 0:
+            raise TranscodeError(f"ffmpeg exited with {process.returncode}: " + " | ".join(list(tail)[-3:]))
+        result = "ok"
+    except BaseException:
+        for path in outputs:
+            if path and os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        transcodes_active.dec()
+        transcode_seconds.observe(time.perf_counter() - started, result=result)
+        _running -= 1
+        slots.release()
+
+
+class MediaInfo:
+    def __init__(self, duration: float = 0.0, width: int = 0, height: int = 0, has_audio: bool = False):
+        self.duration = duration
+        self.width = width  # as displayed, after rotation
+        self.height = height
+        self.has_audio = has_audio
+
+
+_VIDEO_SIZE = re.compile(r"Stream #\d+:\d+.*?: Video: .*?(\d{2,5})x(\d{2,5})")
+_ROTATION = re.compile(r"rotation of (-?\d+(?:\.\d+)?) degrees")
+
+
+async def probe(path: str, timeout: float = 30) -> MediaInfo:
+    """Duration, display size and audio presence from ffmpeg's input banner (no ffprobe needed)."""
+    process = await asyncio.create_subprocess_exec(
+        FFMPEG, "-hide_banner", "-nostdin", "-i", path,
+        stdin=asyncio.subprocess.DEVNULL,
+        stdout=asyncio.subprocess.DEVNULL,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        # exits non-zero ("At least one output file must be specified"), that's expected
+        _, stderr = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise TranscodeError(f"ffmpeg probe timed out after {timeout:.0f}s")
+    banner = stderr.decode(errors="replace")
+
+    info = MediaInfo(has_audio=": Audio: " in banner)
+    match = _DURATION.search(banner)
+    if match:
+        hours, minutes, seconds = match.groups()
+        info.duration = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    match = _VIDEO_SIZE.search(banner)
+    if not match:
+        raise TranscodeError("No video stream found")
+    info.width, info.height = int(match.group(1)), int(match.group(2))
+    match = _ROTATION.search(banner)
+    if match and round(abs(float(match.group(1)))) % 180 == 90:
+        # ffmpeg autorotates, so the filters see the displayed size
+        info.width, info.height = info.height, info.width
+    return info
+
+
+THUMBNAIL_OFFSET_RATIO = float(os.getenv("THUMBNAIL_OFFSET_RATIO", 0.2))
+
+
+def thumbnail_offset(info: MediaInfo) -> float:
+    """Seek point for the poster frame, relative to the duration so short clips work too."""
+    if not info.duration:
+        return 0.0
+    return round(max(0.0, min(info.duration * THUMBNAIL_OFFSET_RATIO, info.duration - 0.5)), 3)
+
+
+async def extract_frame(video_path: str, out_path: str, offset: float, timeout: float = 60):
+    """
+    One frame as a high quality JPEG. -ss before -i with -noaccurate_seek
+    jumps to the keyframe at or before `offset` and stops after decoding it,
+    so the cost doesn't depend on the video length or the offset.
+    """
+    await run_ffmpeg(
+        ["-y", "-ss", str(offset), "-noaccurate_seek", "-i", video_path,
+         "-map", "0:v:0", "-frames:v", "1", "-q:v", "2", out_path],
+        timeout=timeout,
+        outputs=(out_path,),
+    )
+
+
+# HLS ladder. Rungs are named after the short side so portrait video gets the
+# same ladder; rungs above the source are skipped (never upscale).
+class Rung:
+    def __init__(self, size: int, video_bitrate: str, audio_bitrate: str):
+        self.size = size
+        self.name = f"{size}p"
+        self.video_bitrate = video_bitrate
+        self.audio_bitrate = audio_bitrate
+
+
+def _parse_ladder(spec: str) -> list:
+    # "240:400k:64k,480:1200k:96k,720:2800k:128k"
+    rungs = []
+    for item in spec.split(","):
+        size, video_bitrate, audio_bitrate = item.strip().split(":")
+        rungs.append(Rung(int(size), video_bitrate, audio_bitrate))
+    return sorted(rungs, key=lambda rung: rung.size)
+
+
+HLS_LADDER = _parse_ladder(os.getenv("HLS_LADDER", "240:400k:64k,480:1200k:96k,720:2800k:128k"))
+HLS_SEGMENT_SECONDS = int(os.getenv("HLS_SEGMENT_SECONDS", 4))
+HLS_PRESET = os.getenv("HLS_PRESET", "veryfast")
+HLS_CRF = os.getenv("HLS_CRF", "23")
+
+
+def ladder_for(info: MediaInfo) -> list:
+    short_side = min(info.width, info.height)
+    rungs = [rung for rung in HLS_LADDER if rung.size <= short_side]
+    return rungs or HLS_LADDER[:1]
+
+
+def _bufsize(bitrate: str) -> str:
+    # two seconds of buffer at the cap
+    number = float(bitrate.rstrip("kKmM"))
+    unit = bitrate[-1] if bitrate[-1] in "kKmM" else ""
+    return f"{number * 2:g}{unit}"
+
+
+def hls_ladder_args(input_path: str, out_dir: str, mp4_path: str, info: MediaInfo, rungs: list) -> list:
+    """
+    One ffmpeg run, one decode: every rung goes to an HLS variant under
+    out_dir/<rung>/ (plus out_dir/master.m3u8) and the top rung is also
+    written as a faststart MP4 for clients without HLS.
+    """
+    portrait = info.height > info.width
+    branches = len(rungs) + 1
+    graph = [f"[0:v]split={branches}" + "".join(f"[v{i}]" for i in range(branches))]
+    for i, rung in enumerate(rungs + [rungs[-1]]):
+        scale = f"scale={rung.size}:-2" if portrait else f"scale=-2:{rung.size}"
+        graph.append(f"[v{i}]{scale},format=yuv420p[s{i}]")
+
+    keyframes = ["-force_key_frames", f"expr:gte(t,n_forced*{HLS_SEGMENT_SECONDS})", "-sc_threshold", "0"]
+    args = ["-y", "-i", input_path, "-filter_complex", ";".join(graph)]
+
+    # HLS output
+    stream_map = []
+    for i, rung in enumerate(rungs):
+        args += ["-map", f"[s{i}]"]
+        if info.has_audio:
+            args += ["-map", "0:a:0"]
+        args += [f"-maxrate:v:{i}", rung.video_bitrate, f"-bufsize:v:{i}", _bufsize(rung.video_bitrate)]
+        if info.has_audio:
+            args += [f"-b:a:{i}", rung.audio_bitrate]
+        stream_map.append(f"v:{i},a:{i},name:{rung.name}" if info.has_audio else f"v:{i},name:{rung.name}")
+    args += [
+        "-c:v", "libx264", "-preset", HLS_PRESET, "-crf", HLS_CRF, "-threads", ENCODE_THREADS, *keyframes,
+        "-c:a", "aac", "-ac", "2",
+        "-f", "hls",
+        "-hls_time", str(HLS_SEGMENT_SECONDS),
+        "-hls_playlist_type", "vod",
+        "-hls_flags", "independent_segments",
+        "-hls_segment_filename", os.path.join(out_dir, "%v", "seg_%03d.ts"),
+        "-master_pl_name", "master.m3u8",
+        "-var_stream_map", " ".join(stream_map),
+        os.path.join(out_dir, "%v", "index.m3u8"),
+    ]
+
+    # MP4 fallback at the top rung
+    top = rungs[-1]
+    args += ["-map", f"[s{len(rungs)}]"]
+    if info.has_audio:
+        args += ["-map", "0:a:0", "-c:a", "aac", "-ac", "2", "-b:a", top.audio_bitrate]
+    args += [
+        "-c:v", "libx264", "-preset", HLS_PRESET, "-crf", HLS_CRF, "-threads", ENCODE_THREADS,
+        "-maxrate", top.video_bitrate, "-bufsize", _bufsize(top.video_bitrate),
+        "-movflags", "+faststart",
+        mp4_path,
+    ]
+    return args
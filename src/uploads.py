@@ -0,0 +1,147 @@
+import asyncio
+import hashlib
+import os
+import tempfile
+from typing import Optional
+from fastapi import Request, UploadFile
+from fastapi.responses import JSONResponse
+
+
+# Uploads are copied to a temp file in fixed-size chunks, so an upload costs
+# one chunk of memory whatever its size. The type comes from the magic bytes
+# of the first chunk, not from the filename, and the size limit is enforced
+# while copying so an oversized upload stops at the limit instead of at EOF.
+# The SHA-256 of the raw bytes is computed on the way through (media_index.py
+# uses it to find uploads we've already processed). Writing and hashing run in
+# the default executor, overlapped with reading the next chunk, so a large
+# upload doesn't hold the event loop for a chunk's worth of disk I/O at a time.
+
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", 1024 * 1024))
+MAX_IMAGE_BYTES = int(os.getenv("MAX_IMAGE_BYTES", 20 * 1024 * 1024))
+MAX_VIDEO_BYTES = int(os.getenv("MAX_VIDEO_BYTES", 500 * 1024 * 1024))
+# whole multipart body, checked from Content-Length before the form is parsed
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", MAX_VIDEO_BYTES + 1024 * 1024))
+
+# ISO-BMFF brands that are still images (HEIC/AVIF), not video
+_IMAGE_BRANDS = {b"heic", b"heix", b"hevc", b"hevx", b"mif1", b"msf1", b"avif", b"avis"}
+
+
+def sniff_media(head: bytes) -> Optional[tuple]:
+    """(media_type, extension) from the first bytes of a file, None if unrecognised."""
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image", "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image", "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "image", "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image", "webp"
+    if head[:4] in (b"II*\x00", b"MM\x00*"):
+        return "image", "tiff"
+    if head.startswith(b"BM"):
+        return "image", "bmp"
+    if head[4:8] == b"ftyp":
+        brand = head[8:12]
+        if brand in _IMAGE_BRANDS:
+            return None
+        return "video", "mov" if brand == b"qt  " else "mp4"
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video", "webm" if b"webm" in head[:64] else "mkv"
+    if head[:4] == b"RIFF" and head[8:12] == b"AVI ":
+        return "video", "avi"
+    if head.startswith(b"\x30\x26\xb2\x75\x8e\x66\xcf\x11"):
+        return "video", "wmv"
+    if head.startswith(b"FLV"):
+        return "video", "flv"
+    return None
+
+
+class SpooledUpload:
+    """An upload copied to disk. Remove the file with cleanup() (or use as a context manager)."""
+
+    def __init__(self, path: str, media_type: str, extension: str, size: int, filename: str, sha256: str = ""):
+        self.path = path
+        self.media_type = media_type
+        self.extension = extension
+        self.size = size
+        self.filename = filename
+        self.sha256 = sha256
+
+    def cleanup(self):
+        if self.path and os.path.exists(self.path):
+            os.remove(self.path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.cleanup()
+
+
+async def spool_upload(file: UploadFile, allowed: tuple = ("image", "video")) -> SpooledUpload:
+    """
+    Stream `file` to a temp file chunk by chunk. Raises ValueError for an
+    unrecognised type, a type not in `allowed`, or a file over its size limit.
+    """
+    head = await file.read(UPLOAD_CHUNK_SIZE)
+    sniffed = sniff_media(head)
+    if not sniffed or sniffed[0] not in allowed:
+        raise ValueError("Unsupported file type. Please upload an image or a video.")
+    media_type, extension = sniffed
+    limit = MAX_IMAGE_BYTES if media_type == "image" else MAX_VIDEO_BYTES
+
+    loop = asyncio.get_running_loop()
+    temp = tempfile.NamedTemporaryFile(delete=False, suffix=f".{extension}")
+    size = 0
+    digest = hashlib.sha256()
+
+    def write(chunk: bytes):
+        digest.update(chunk)
+        temp.write(chunk)
+
+    pending = None
+    try:
+        chunk = head
+        while chunk:
+            size += len(chunk)
+            if size > limit:
+                raise ValueError(f"File too large. The limit for {media_type}s is {limit // (1024 * 1024)} MB.")
+            # one write in flight at a time, so the chunks land in order
+            if pending:
+                await pending
+            pending = loop.run_in_executor(None, write, chunk)
+            chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if pending:
+            await pending
+        temp.close()
+    except BaseException:
+        if pending:
+            # let the write finish before closing the file under it
+            await asyncio.gather(pending, return_exceptions=True)
+        temp.close()
+        os.remove(temp.name)
+        raise
+
+    return SpooledUpload(temp.name, media_type, extension, size, file.filename or "", digest.hexdigest())
+
+
+def file_sha256(path: str) -> str:
+    """SHA-256 of a file on disk, read in UPLOAD_CHUNK_SIZE chunks. Blocking, run it in an executor."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+# HTTP middleware, registered in main.py. Rejects oversized multipart bodies
+# from the Content-Length header before starlette parses (and spools) the form.
+async def upload_size_limit_middleware(request: Request, call_next):
+    content_type = request.headers.get("content-type", "")
+    length = request.headers.get("content-length")
+    if content_type.startswith("multipart/form-data") and length and length.isdigit() and int(length) > MAX_UPLOAD_BYTES:
+        return JSONResponse(
+            status_code=413,
+            content={"detail": f"Upload too large. The limit is {MAX_UPLOAD_BYTES // (1024 * 1024)} MB."},
+        )
+    return await call_next(request)
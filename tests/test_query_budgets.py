@@ -0,0 +1,79 @@
+"""
+Query budgets for the hot read endpoints, against a small seeded SQLite db
+through the real app (httpx ASGI transport). A failure prints every
+statement the request ran; raise a budget only when the extra query is
+intended.
+"""
+import asyncio
+import os
+import tempfile
+import pytest
+
+# before anything imports src.database
+from benchmarks.run import parse_args, configure_environment
+
+DB_PATH = os.path.join(tempfile.gettempdir(), "vreels_query_budgets.db")
+configure_environment(parse_args(["--database-url", f"sqlite:///{DB_PATH}"]))
+
+import httpx
+from src.database import engine, async_engine, SessionLocal
+from src.datagen import DataScale, generate
+from src.auth.service import create_access_token
+from src.models.post import Post, VisibilityEnum
+from src.query_stats import assert_query_budget
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    generate(engine, DataScale(users=30, follows_per_user=10, posts_per_user=5, likes_per_post=4, comments_per_post=2,
+                               interactions_per_post=3, hashtags=20, seed=1), reset=True, log=lambda line: None)
+    db = SessionLocal()
+    try:
+        post_id = db.query(Post.id).filter(Post.visibility == VisibilityEnum.public).order_by(Post.id).first()[0]
+    finally:
+        db.close()
+    yield post_id
+    engine.dispose()
+    os.remove(DB_PATH)
+
+
+def call(requests):
+    """Runs `requests(client, headers)` against the app as user1."""
+    from main import app
+
+    async def run():
+        headers = {"Authorization": f"Bearer {await create_access_token('user1', 1)}"}
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+                return await requests(client, headers)
+        finally:
+            # aiosqlite connections belong to this loop
+            await async_engine.dispose()
+
+    return asyncio.run(run())
+
+
+def test_feed_query_budget(seeded):
+    async def requests(client, headers):
+        await client.get("/v1/posts/feed", params={"limit": 10}, headers=headers)  # warm the caches
+        with assert_query_budget(6, max_repeats=1):
+            response = await client.get("/v1/posts/feed", params={"limit": 10, "page": 2}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["data"]
+
+    call(requests)
+
+
+def test_post_detail_query_budget(seeded):
+    async def requests(client, headers):
+        with assert_query_budget(5, max_repeats=1):
+            response = await client.request("GET", "/v1/posts/", json={"post_id": seeded}, headers=headers)
+        assert response.status_code == 200
+        assert response.json()["id"] == seeded
+
+        # cached: current user, the version check and the viewer's flags
+        with assert_query_budget(3, max_repeats=1):
+            response = await client.request("GET", "/v1/posts/", json={"post_id": seeded}, headers=headers)
+        assert response.status_code == 200
+
+    call(requests)